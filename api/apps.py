@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+from django.utils.text import gettext_lazy as _
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+    verbose_name = _("api")
@@ -0,0 +1,175 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+from categories.models import Category, Brand
+from products.models import Product, Discount
+
+
+# ids or slugs accepted by a single batched lookup
+MAX_BATCH_SIZE = 100
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _param_list(params, name):
+    return [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+
+
+class CatalogResource:
+    """
+    A model served read-only by the API. `fields` maps every field name of the API to
+    the values() lookup it reads, `default_fields` are sent when the client selects none.
+    Related objects are sent as ids, so a row only changes when its own updated_at does.
+    """
+
+    def __init__(self, get_queryset, fields, default_fields, slug_lookup=True, image_fields=()):
+        self.get_queryset = get_queryset
+        self.fields = fields
+        self.default_fields = default_fields
+        self.slug_lookup = slug_lookup
+        self.image_fields = image_fields
+
+    def select_fields(self, params):
+        fields = _param_list(params, 'fields') or self.default_fields
+        unknown = [field for field in fields if field not in self.fields]
+        if unknown:
+            raise ValidationError(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.fields)}.')
+        return list(dict.fromkeys(fields))
+
+    def page(self, params):
+        """The CatalogPage the query parameters ask for: a batch of ids or slugs, or a page after a cursor."""
+        fields = self.select_fields(params)
+        queryset = self.get_queryset().order_by('pk')
+        ids, slugs = _param_list(params, 'ids'), _param_list(params, 'slugs')
+        if slugs and not self.slug_lookup:
+            raise ValidationError('This resource has no slugs, look it up by ids.')
+        if ids or slugs:
+            if len(ids) + len(slugs) > MAX_BATCH_SIZE:
+                raise ValidationError(f'At most {MAX_BATCH_SIZE} ids and slugs per request.')
+            if not all(pk.isdigit() for pk in ids):
+                raise ValidationError('ids must be integers.')
+            lookup = Q(pk__in=ids) if ids else Q()
+            if slugs:
+                lookup |= Q(slug__in=slugs)
+            queryset = queryset.filter(lookup)
+            return CatalogPage(self, fields, self._rows(queryset, fields), has_next=False)
+
+        try:
+            limit = min(int(params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            after = int(params.get('after', 0))
+        except ValueError:
+            raise ValidationError('limit and after must be integers.')
+        if limit < 1:
+            raise ValidationError('limit must be positive.')
+        rows = self._rows(queryset.filter(pk__gt=after)[:limit + 1], fields)
+        return CatalogPage(self, fields, rows[:limit], has_next=len(rows) > limit)
+
+    def _rows(self, queryset, fields):
+        lookups = {field: self.fields[field] for field in fields}
+        rows = list(queryset.values(*dict.fromkeys(['pk', 'updated_at', *lookups.values()])))
+        for row in rows:
+            for field in self.image_fields:
+                lookup = lookups.get(field)
+                if lookup and row[lookup]:
+                    row[lookup] = default_storage.url(row[lookup])
+        return rows
+
+
+class CatalogPage:
+    def __init__(self, resource, fields, rows, has_next):
+        self.resource = resource
+        self.fields = fields
+        self.rows = rows
+        self.has_next = has_next
+
+    @property
+    def next_cursor(self):
+        return self.rows[-1]['pk'] if self.has_next else None
+
+    @property
+    def etag(self):
+        """
+        Strong validator of the page: the same fields of the same rows at the same updated_at
+        always serialize to the same bytes.
+        """
+        digest = hashlib.md5(','.join(self.fields).encode())
+        for row in self.rows:
+            digest.update(f"|{row['pk']}:{row['updated_at'].isoformat()}".encode())
+        digest.update(f'|next:{self.next_cursor}'.encode())
+        return f'"{digest.hexdigest()}"'
+
+    def results(self):
+        return [
+            {field: row[self.resource.fields[field]] for field in self.fields}
+            for row in self.rows
+        ]
+
+
+CATALOG_RESOURCES = {
+    'products': CatalogResource(
+        Product.objects.active,
+        fields={
+            'id': 'pk',
+            'slug': 'slug',
+            'name': 'name',
+            'short_description': 'short_description',
+            'description': 'description',
+            'category': 'category_id',
+            'brand': 'brand_id',
+            'discount': 'discount_id',
+            'main_image': 'main_image',
+            'price': 'price',
+            'effective_price': 'effective_price',
+            'stock': 'stock',
+            'status': 'status',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        default_fields=['id', 'slug', 'name', 'category', 'brand', 'main_image', 'price', 'effective_price',
+                        'stock', 'status', 'updated_at'],
+        image_fields=['main_image'],
+    ),
+    'categories': CatalogResource(
+        Category.objects.all,
+        fields={
+            'id': 'pk',
+            'slug': 'slug',
+            'name': 'name',
+            'parent': 'parent_id',
+            'image': 'image',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        default_fields=['id', 'slug', 'name', 'parent', 'image', 'updated_at'],
+        image_fields=['image'],
+    ),
+    'brands': CatalogResource(
+        Brand.objects.all,
+        fields={
+            'id': 'pk',
+            'slug': 'slug',
+            'name': 'name',
+            'description': 'description',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        default_fields=['id', 'slug', 'name', 'description', 'updated_at'],
+    ),
+    'discounts': CatalogResource(
+        Discount.objects.all,
+        fields={
+            'id': 'pk',
+            'value': 'value',
+            'is_active': 'is_active',
+            'start_date': 'start_date',
+            'expire_date': 'expire_date',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        default_fields=['id', 'value', 'is_active', 'start_date', 'expire_date', 'updated_at'],
+        slug_lookup=False,
+    ),
+}
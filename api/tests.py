@@ -0,0 +1,81 @@
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.shortcuts import reverse
+from django.utils import timezone
+
+from categories.models import Category, Brand
+from products.models import Product, Discount
+
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='phones', slug='phones', image='categories/phones.jpg')
+        self.brand = Brand.objects.create(name='acme', slug='acme', description='acme')
+        self.products = [
+            Product.objects.create(category=self.category, brand=self.brand, name=f'phone {number}',
+                                   main_image='products/phone.jpg', price=100 * number, stock=number)
+            for number in range(1, 4)
+        ]
+        self.url = reverse('api-catalog', args=['products'])
+
+    def test_batched_lookup_with_field_selection(self):
+        first, _second, third = self.products
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'ids': f'{first.pk}', 'slugs': third.slug, 'fields': 'id,price,main_image'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.json(), {'results': [
+            {'id': first.pk, 'price': 100, 'main_image': '/media/products/phone.jpg'},
+            {'id': third.pk, 'price': 300, 'main_image': '/media/products/phone.jpg'},
+        ], 'next': None})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,secret'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-catalog', args=['discounts']), {'slugs': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-catalog', args=['users'])).status_code, 404)
+
+    def test_cursor_pagination(self):
+        response = self.client.get(self.url, {'limit': 2, 'fields': 'id'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [product.pk for product in self.products[:2]])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.json(), {'results': [{'id': self.products[2].pk}], 'next': None})
+
+    def test_revalidation(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # a deactivated row leaves the page without touching the updated_at of the others
+        self.assertNotIn('Last-Modified', response)
+        self.products[1].is_active = False
+        self.products[1].save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # a running discount changes the effective price, and with it the validators
+        discount = Discount.objects.create(value=10, start_date=timezone.now() - timezone.timedelta(days=1))
+        self.products[0].discount = discount
+        self.products[0].save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['effective_price'], 90)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        discount.value = 20
+        discount.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['effective_price'], 80)
+
+    def test_other_resources(self):
+        response = self.client.get(reverse('api-catalog', args=['brands']), {'slugs': 'acme'})
+        self.assertEqual(response.json()['results'][0]['name'], 'acme')
+        response = self.client.get(reverse('api-catalog', args=['categories']), {'fields': 'slug,image'})
+        self.assertEqual(response.json()['results'], [{'slug': 'phones', 'image': '/media/categories/phones.jpg'}])
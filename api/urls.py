@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('<str:resource>/', views.catalog_view, name='api-catalog'),
+]
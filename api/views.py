@@ -0,0 +1,37 @@
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+
+from .services.catalog import CATALOG_RESOURCES
+
+
+@require_GET
+def catalog_view(request, resource):
+    """
+    Read-only listing of a catalog resource: ?ids= / ?slugs= for a batch, ?after= / ?limit= to page
+    through everything, ?fields= to pick the fields. Unchanged pages revalidate with a 304.
+    """
+    if resource not in CATALOG_RESOURCES:
+        raise Http404('Unknown resource')
+    try:
+        page = CATALOG_RESOURCES[resource].page(request.GET)
+    except ValidationError as error:
+        return JsonResponse({'error': ' '.join(error.messages)}, status=400)
+
+    # no Last-Modified: rows deactivated or deleted since leave no date behind, only the
+    # ETag, which covers the ids of the page, notices them
+    etag = page.etag
+    # the validator only needs the rows that were fetched anyway, a 304 skips serializing them
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        next_url = None
+        if page.has_next:
+            params = request.GET.copy()
+            params['after'] = page.next_cursor
+            next_url = request.build_absolute_uri(f'?{params.urlencode()}')
+        response = JsonResponse({'results': page.results(), 'next': next_url})
+    response['ETag'] = etag
+    # clients and proxies may keep the response but have to revalidate it every time
+    patch_cache_control(response, no_cache=True)
+    return response
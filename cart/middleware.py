@@ -0,0 +1,12 @@
+class CartStorageMiddleware:
+    """Write the guest cart a request changed to the response, e.g. its signed cookie."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        storage = getattr(request, '_guest_cart_storage', None)
+        if storage is not None:
+            storage.save(response)
+        return response
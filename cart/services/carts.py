@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from products.services.catalog_cache import get_catalog_version
+from .storage import get_cart_storage
+
+
+CART_SUMMARY_TIMEOUT = 60 * 60
+
+
+CartLine = namedtuple('CartLine', [
+    'id', 'product_id', 'name', 'url', 'image_url', 'color', 'size',
+    'quantity', 'unit_price', 'final_price', 'org_total',
+])
+CartSummary = namedtuple('CartSummary', ['lines', 'count', 'org_total', 'final_price', 'discount'])
+
+
+def summarize_cart(items):
+    """Lines and totals of cart items in one pass, the price of every product is worked out once."""
+    lines = []
+    for item in items:
+        product = item.product
+        unit_price = product.get_final_price()
+        lines.append(CartLine(
+            id=item.id,
+            product_id=product.pk,
+            name=product.name,
+            url=product.get_absolute_url(),
+            image_url=product.main_image.url if product.main_image else '',
+            color=item.color,
+            size=item.size,
+            quantity=item.quantity,
+            unit_price=unit_price,
+            final_price=unit_price * item.quantity,
+            org_total=product.price * item.quantity,
+        ))
+    org_total = sum(line.org_total for line in lines)
+    final_price = sum(line.final_price for line in lines)
+    return CartSummary(tuple(lines), len(lines), org_total, final_price, org_total - final_price)
+
+
+def summary_timeout(items, now=None):
+    """Seconds the summary of the items stays right: until the first discount among them starts or stops."""
+    now = now or timezone.now()
+    timeout = CART_SUMMARY_TIMEOUT
+    for item in items:
+        changes_at = item.product.price_changes_at
+        if changes_at is not None:
+            timeout = min(timeout, max(int((changes_at - now).total_seconds()), 1))
+    return timeout
+
+
+def load_cart_summary(storage):
+    """
+    Summary of the cart of a storage from the cache. Worked out again only once the cart
+    changed (part of its key) or the catalog did, which covers every price change.
+    """
+    key = storage.summary_key()
+    if key is None:
+        return summarize_cart(storage.items())
+    key = f'cart_summary:{get_catalog_version()}:{key}'
+    summary = cache.get(key)
+    if summary is None:
+        items = list(storage.items())
+        summary = summarize_cart(items)
+        cache.set(key, summary, summary_timeout(items))
+    return summary
+
+
+def get_cart_summary(request):
+    """Summary of the visitor's cart, read at most once per request. Never creates a cart or a session."""
+    summary = getattr(request, '_cart_summary', None)
+    if summary is None:
+        summary = request._cart_summary = load_cart_summary(get_cart_storage(request))
+    return summary
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import secrets
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from products.models import Product
+from ..models import Cart, CartItem
+
+
+DEFAULT_GUEST_STORAGE = 'cart.services.storage.SignedCookieCartStorage'
+
+GUEST_CART_COOKIE = 'cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+# a signed cookie has to stay under the 4KB browsers keep, the oldest lines give way first
+MAX_GUEST_CART_LINES = 30
+
+CART_VERSION_KEY = 'cart_version:{}'
+
+GuestCartItem = namedtuple('GuestCartItem', ['id', 'product', 'quantity', 'color', 'size'])
+
+
+def get_cart_storage(request):
+    """Where the cart of the visitor lives: the database for users, the guest storage for everyone else."""
+    if request.user.is_authenticated:
+        return DatabaseCartStorage(request.user)
+    return get_guest_cart_storage(request)
+
+
+def get_guest_cart_storage(request):
+    """The guest cart of the request, shared by its views and templates and saved by CartStorageMiddleware."""
+    storage = getattr(request, '_guest_cart_storage', None)
+    if storage is None:
+        storage_class = import_string(getattr(settings, 'CART_GUEST_STORAGE', DEFAULT_GUEST_STORAGE))
+        storage = request._guest_cart_storage = storage_class(request)
+    return storage
+
+
+def get_cart_version(user_id):
+    """Version of the cart of a user, bumped by the cart signals whenever its items change."""
+    key = CART_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cart_version(user_id):
+    try:
+        cache.incr(CART_VERSION_KEY.format(user_id))
+    except ValueError:
+        pass
+
+
+class BaseCartStorage:
+    def summary_key(self):
+        """Part of the cache key of the cart summary that changes with the cart, None to not cache it."""
+        return None
+
+    def items(self):
+        """Lines of the cart, each with an `id`, its `product` and `quantity`, `color` and `size`."""
+        raise NotImplementedError
+
+    def add(self, product, quantity, color=None, size=None):
+        raise NotImplementedError
+
+    def remove(self, item_id):
+        """Drop a line of the cart, False if it has no such line."""
+        raise NotImplementedError
+
+    def update(self, quantities):
+        """Set {item_id: quantity} on the lines, dropping those set to zero. Returns (updated, deleted)."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Empty the cart, False if there was nothing to empty."""
+        raise NotImplementedError
+
+    def save(self, response):
+        """Write what changed during the request, for storages that live in the response."""
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    """Cart and CartItem rows of a user."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def summary_key(self):
+        return f'user:{self.user.pk}:{get_cart_version(self.user.pk)}'
+
+    def items(self):
+        return (CartItem.objects.filter(cart__user=self.user)
+                .select_related('product', 'product__discount')
+                .order_by('pk'))
+
+    def add(self, product, quantity, color=None, size=None):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        item, created = CartItem.objects.get_or_create(cart=cart, product=product, color=color, size=size)
+        if created:
+            item.quantity = quantity
+        else:
+            item.quantity += quantity
+        item.save()
+
+    def merge(self, items):
+        """Add the lines of another cart, e.g. the one kept before logging in."""
+        for item in items:
+            self.add(item.product, item.quantity, item.color, item.size)
+
+    def remove(self, item_id):
+        try:
+            deleted, _ = CartItem.objects.filter(pk=item_id, cart__user=self.user).delete()
+        except ValueError:
+            return False
+        return deleted > 0
+
+    def update(self, quantities):
+        updated = deleted = 0
+        for item in self.items().filter(pk__in=[pk for pk in quantities if str(pk).isdigit()]):
+            quantity = quantities[str(item.pk)]
+            if quantity <= 0:
+                item.delete()
+                deleted += 1
+            else:
+                item.quantity = quantity
+                item.save(update_fields=['quantity'])
+                updated += 1
+        return updated, deleted
+
+    def clear(self):
+        deleted, _ = Cart.objects.filter(user=self.user).delete()
+        return deleted > 0
+
+
+def guest_item_id(product_id, color, size):
+    """Id of a guest cart line, stable across requests as long as the line is in the cart."""
+    return hashlib.md5(f'{product_id}|{color or ""}|{size or ""}'.encode()).hexdigest()[:10]
+
+
+class GuestCartStorage(BaseCartStorage):
+    """
+    Cart of a visitor who isn't logged in, kept out of the database as a compact
+    [[product_id, quantity, color, size], ...] list. It becomes CartItem rows when
+    the visitor logs in, see cart.signals.merge_cart_with_user.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._lines = None
+        self._items = None
+        self.changed = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def persist(self, response):
+        raise NotImplementedError
+
+    def summary_key(self):
+        # the lines are at hand, the key follows them without anything to invalidate
+        if not self.lines:
+            return None
+        return 'guest:' + hashlib.md5(json.dumps(self.lines).encode()).hexdigest()
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.load() or []
+        return self._lines
+
+    def _changed(self, lines):
+        self._lines = lines[-MAX_GUEST_CART_LINES:]
+        self._items = None
+        self.changed = True
+
+    def items(self):
+        if self._items is None:
+            products = Product.objects.select_related('discount').in_bulk({line[0] for line in self.lines}) if self.lines else {}
+            self._items = [
+                GuestCartItem(guest_item_id(product_id, color, size), products[product_id], quantity, color, size)
+                for product_id, quantity, color, size in self.lines
+                if product_id in products
+            ]
+        return self._items
+
+    def add(self, product, quantity, color=None, size=None):
+        lines = [list(line) for line in self.lines]
+        for line in lines:
+            if line[0] == product.pk and line[2] == color and line[3] == size:
+                line[1] += quantity
+                break
+        else:
+            lines.append([product.pk, quantity, color, size])
+        self._changed(lines)
+
+    def remove(self, item_id):
+        lines = [line for line in self.lines if guest_item_id(line[0], line[2], line[3]) != item_id]
+        if len(lines) == len(self.lines):
+            return False
+        self._changed(lines)
+        return True
+
+    def update(self, quantities):
+        updated = deleted = 0
+        lines = []
+        for product_id, quantity, color, size in self.lines:
+            new_quantity = quantities.get(guest_item_id(product_id, color, size))
+            if new_quantity is not None and new_quantity <= 0:
+                deleted += 1
+                continue
+            if new_quantity is not None:
+                quantity = new_quantity
+                updated += 1
+            lines.append([product_id, quantity, color, size])
+        if updated or deleted:
+            self._changed(lines)
+        return updated, deleted
+
+    def clear(self):
+        if not self.lines:
+            return False
+        self._changed([])
+        return True
+
+    def save(self, response):
+        if self.changed:
+            self.persist(response)
+            self.changed = False
+
+
+class SignedCookieCartStorage(GuestCartStorage):
+    """The whole guest cart in a signed cookie, so it costs the server nothing to keep."""
+    salt = 'cart.guest.cookie'
+
+    def load(self):
+        value = self.request.COOKIES.get(GUEST_CART_COOKIE)
+        if not value:
+            return []
+        try:
+            return signing.loads(value, salt=self.salt, max_age=GUEST_CART_MAX_AGE)
+        except signing.BadSignature:
+            return []
+
+    def persist(self, response):
+        if not self.lines:
+            response.delete_cookie(GUEST_CART_COOKIE)
+            return
+        response.set_cookie(
+            GUEST_CART_COOKIE,
+            signing.dumps(self.lines, salt=self.salt, compress=True),
+            max_age=GUEST_CART_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+class CacheCartStorage(GuestCartStorage):
+    """The guest cart in the cache under a random id, the signed cookie only carries the id."""
+    salt = 'cart.guest.cache'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.get_signed_cookie(
+            GUEST_CART_COOKIE, default=None, salt=self.salt, max_age=GUEST_CART_MAX_AGE)
+
+    def cache_key(self):
+        return f'guest_cart:{self.cart_id}'
+
+    def load(self):
+        return cache.get(self.cache_key()) if self.cart_id else []
+
+    def persist(self, response):
+        if not self.lines:
+            if self.cart_id:
+                cache.delete(self.cache_key())
+            response.delete_cookie(GUEST_CART_COOKIE)
+            return
+        if not self.cart_id:
+            self.cart_id = secrets.token_urlsafe(16)
+        cache.set(self.cache_key(), self.lines, GUEST_CART_MAX_AGE)
+        response.set_signed_cookie(
+            GUEST_CART_COOKIE,
+            self.cart_id,
+            salt=self.salt,
+            max_age=GUEST_CART_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
@@ -1,14 +1,45 @@
 # carts/signals.py
 
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
-from .models import Cart
+from .models import Cart, CartItem
+from .services.storage import DatabaseCartStorage, bump_cart_version, get_guest_cart_storage
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def invalidate_cart_item_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # items loaded through their cart, e.g. cart.items.all().delete() at checkout, already know it
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user', flat=True).first()
+    if user_id:
+        bump_cart_version(user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def invalidate_cart_summary(sender, instance, **kwargs):
+    if instance.user_id:
+        bump_cart_version(instance.user_id)
 
 
 @receiver(user_logged_in)
 def merge_cart_with_user(sender, request, user, **kwargs):
+    if request is None:
+        return
+    # the guest cart only becomes rows now, the middleware drops its cookie on the way out
+    guest_storage = get_guest_cart_storage(request)
+    guest_items = guest_storage.items()
+    if guest_items:
+        DatabaseCartStorage(user).merge(guest_items)
+        guest_storage.clear()
+
+    # carts guests kept in the database before the guest storages
     session_key = request.session.get('old_session_key')
     if not session_key:
         return
@@ -1,11 +1,18 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.shortcuts import reverse
 
 from categories.models import Category
 from products.models import Product, Discount
 from .models import Cart, CartItem
+from .services.carts import get_cart_summary, summary_timeout
+from .services.storage import GUEST_CART_COOKIE, DatabaseCartStorage
 
 class CartViewTest(TestCase):
     def setUp(self):
@@ -71,14 +78,12 @@ class CartViewTest(TestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 302)
-        session_key = self.client.session.session_key
-        self.assertIsNotNone(session_key)
-        cart = Cart.objects.get(session_key=self.client.session.session_key)
-        cart_item = CartItem.objects.get(cart=cart, product=self.product)
-        self.assertEqual(cart_item.quantity, 3)
-        self.assertEqual(cart_item.quantity, 3)
-        self.assertEqual(cart_item.color, 'Blue')
-        self.assertEqual(cart_item.size, '38')
+        self.assertIn(GUEST_CART_COOKIE, response.cookies)
+        self.assertFalse(Cart.objects.filter(user__isnull=True).exists())
+        line, = self.client.get(reverse('home')).context['cart_summary'].lines
+        self.assertEqual(line.quantity, 3)
+        self.assertEqual(line.color, 'Blue')
+        self.assertEqual(line.size, '38')
 
     def test_add_to_cart_invalid_form(self):
         self.client.login(username='test_user124', password='123pass')
@@ -118,3 +123,147 @@ class CartViewTest(TestCase):
 
         self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
         self.assertEqual(response.status_code, 302)
+
+
+class CartSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', password='123pass')
+        discount = Discount.objects.create(value=10, start_date=timezone.now() - timezone.timedelta(days=1))
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.products = [
+            Product.objects.create(category=category, name='first', main_image='product.jpg', price=100, discount=discount),
+            Product.objects.create(category=category, name='second', main_image='product.jpg', price=250),
+        ]
+
+    def test_guest_pages_create_no_session_or_cart(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cart_summary'].count, 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+
+    def test_summary_is_worked_out_once_per_request(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2, color='Red')
+        CartItem.objects.create(cart=cart, product=self.products[1], quantity=1)
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        with self.assertNumQueries(1):
+            summary = get_cart_summary(request)
+            self.assertIs(get_cart_summary(request), summary)
+        self.assertEqual((summary.count, summary.org_total, summary.final_price, summary.discount), (2, 450, 430, 20))
+        self.assertEqual([(line.name, line.quantity, line.final_price) for line in summary.lines], [
+            ('first', 2, 180), ('second', 1, 250),
+        ])
+
+        self.client.login(username='buyer', password='123pass')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, reverse('cart-remove', args=[summary.lines[0].id]))
+
+    def summary(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return get_cart_summary(request)
+
+    def test_summary_is_cached_until_the_cart_or_a_price_changes(self):
+        storage = DatabaseCartStorage(self.user)
+        storage.add(self.products[0], 2)
+        self.assertEqual(self.summary().final_price, 180)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary().final_price, 180)
+
+        storage.add(self.products[1], 1)
+        self.assertEqual(self.summary().final_price, 430)
+
+        self.products[1].price = 300
+        self.products[1].save()
+        self.assertEqual(self.summary().final_price, 480)
+
+        storage.remove(self.summary().lines[0].id)
+        self.assertEqual(self.summary().final_price, 300)
+        storage.clear()
+        self.assertEqual(self.summary().count, 0)
+
+    def test_emptying_a_cart_looks_its_user_up_once(self):
+        storage = DatabaseCartStorage(self.user)
+        storage.add(self.products[0], 1)
+        storage.add(self.products[1], 1)
+        self.assertEqual(self.summary().count, 2)
+        cart = Cart.objects.get(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            cart.items.all().delete()
+        self.assertFalse([query for query in queries if 'FROM "cart_cart"' in query['sql']])
+        self.assertEqual(self.summary().count, 0)
+
+    def test_summary_expires_with_a_discount(self):
+        self.products[0].discount.expire_date = timezone.now() + timezone.timedelta(minutes=10)
+        self.products[0].discount.save()
+        self.products[0].refresh_from_db()
+        DatabaseCartStorage(self.user).add(self.products[0], 1)
+        self.assertLessEqual(summary_timeout(DatabaseCartStorage(self.user).items()), 600)
+
+
+class GuestCartStorageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', password='123pass')
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.products = [
+            Product.objects.create(category=category, name=name, main_image='product.jpg', price=price)
+            for name, price in (('first', 100), ('second', 250))
+        ]
+
+    def add(self, product, quantity, color=''):
+        return self.client.post(reverse('cart-add', args=[product.id]), {'quantity': quantity, 'color': color})
+
+    def summary(self):
+        return self.client.get(reverse('home')).context['cart_summary']
+
+    def check_guest_cart(self):
+        self.add(self.products[0], 1)
+        self.add(self.products[0], 2)
+        self.add(self.products[1], 1, color='Red')
+        self.add(self.products[1], 1)
+        summary = self.summary()
+        self.assertEqual([(line.name, line.quantity, line.color) for line in summary.lines], [
+            ('first', 3, ''), ('second', 1, 'Red'), ('second', 1, ''),
+        ])
+        self.assertEqual(summary.final_price, 800)
+
+        first, red, plain = summary.lines
+        self.client.post(reverse('cart-update'), {f'quantity_{first.id}': 5, f'quantity_{plain.id}': 0})
+        self.assertEqual(self.client.post(reverse('cart-remove', args=[red.id])).status_code, 302)
+        self.assertEqual(self.client.post(reverse('cart-remove', args=[red.id])).status_code, 404)
+        self.assertEqual([(line.name, line.quantity) for line in self.summary().lines], [('first', 5)])
+
+        self.client.post(reverse('cart-delete'))
+        self.assertEqual(self.summary().count, 0)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_signed_cookie_storage(self):
+        self.check_guest_cart()
+
+    @override_settings(CART_GUEST_STORAGE='cart.services.storage.CacheCartStorage')
+    def test_cache_storage(self):
+        self.check_guest_cart()
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.add(self.products[0], 1)
+        self.client.cookies[GUEST_CART_COOKIE] = self.client.cookies[GUEST_CART_COOKIE].value + 'x'
+        self.assertEqual(self.summary().count, 0)
+
+    def test_login_moves_the_guest_cart_into_the_database(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1, color='', size='')
+        self.add(self.products[0], 2)
+        self.add(self.products[1], 1)
+
+        response = self.client.post(reverse('login'), {'username': 'buyer', 'password': '123pass'})
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+        self.assertEqual(sorted(cart.items.values_list('product__name', 'quantity')), [('first', 3), ('second', 1)])
+        self.client.logout()
+        self.assertEqual(self.summary().count, 0)
@@ -3,6 +3,7 @@ from django.contrib import messages
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.text import gettext_lazy as gt
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, reverse
 
 
@@ -11,29 +12,29 @@ from orders.models import Address
 from orders.forms import OrderForm, AddressForm
 from .models import Cart, CartItem
 from .forms import AddToCartForm
+from .services.storage import get_cart_storage
 
 
 class CartDetailView(LoginRequiredMixin, generic.DetailView):
     template_name = 'cart/cart_detail.html'
     context_object_name = 'cart'
+    def get_queryset(self):
+        return Cart.objects.select_related('user').prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product', 'product__discount'))
+        ).filter(user=self.request.user)
+
     def get_object(self, queryset=None):
-        if self.request.user.is_authenticated:
-            cart, _ = Cart.objects.select_related('user').prefetch_related(
-                Prefetch('items', queryset=CartItem.objects.select_related('product', 'product__discount'))
-            ).get_or_create(user=self.request.user)
-        else:
-            if not self.request.session.session_key:
-                self.request.session.create()
-            session_key = self.request.session.session_key
-            cart, _ = Cart.objects.prefetch_related(
-                Prefetch('items', queryset=CartItem.objects.select_related('product', 'product__discount'))
-            ).get_or_create(session_key=session_key)
+        # guests keep their cart in the guest storage, this page is for logged in users only
+        cart, _ = self.get_queryset().get_or_create(user=self.request.user)
         return cart
 
+    def get_user_addresses(self):
+        return Address.objects.filter(user=self.request.user).order_by('-created_at')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
-            'user_addresses': Address.objects.filter(user=self.request.user).order_by('-created_at'),
+            'user_addresses': self.get_user_addresses(),
             'order_form': OrderForm(),
             'address_form': AddressForm(),
         })
@@ -53,79 +54,41 @@ class AddToCartView(generic.View):
         color = form.cleaned_data['color']
         size = form.cleaned_data['size']
 
-        if request.user.is_authenticated:
-            cart, _ = Cart.objects.get_or_create(user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key)
-
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product, color=color, size=size)
-        if created:
-            cart_item.quantity = quantity
-        else:
-            cart_item.quantity += quantity
-        cart_item.save()
+        get_cart_storage(request).add(product, quantity, color, size)
         messages.success(request, gt("Product successfully added to the cart ✅"))
-        request.session['old_session_key'] = request.session.session_key
         return redirect('product-detail', slug=product.slug)
 
 
 class CartItemRemove(generic.View):
     def post(self, request, *args, **kwargs):
         item_id = kwargs.get('item_id')
-        if request.user.is_authenticated:
-            cart = get_object_or_404(Cart, user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart = get_object_or_404(Cart, session_key=request.session.session_key)
-        item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        item.delete()
+        if not get_cart_storage(request).remove(item_id):
+            raise Http404
         return redirect('cart-detail')
 
 
 class CartDelete(generic.View):
     def post(self, request):
-        if request.user.is_authenticated:
-            cart = get_object_or_404(Cart, user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart = get_object_or_404(Cart, session_key=request.session.session_key)
-        cart.delete()
+        if not get_cart_storage(request).clear():
+            raise Http404
         messages.success(request, 'ایتم های سبد شما با موفقیت حدف شد✅ ')
         return redirect('cart-detail')
 
 
 class CartUpdateView(generic.View):
     def post(self, request, *args, **kwargs):
-        # گرفتن cart
-        if request.user.is_authenticated:
-            cart = get_object_or_404(Cart, user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart = get_object_or_404(Cart, session_key=request.session.session_key)
-
-        updated = 0
-        deleted = 0
+        storage = get_cart_storage(request)
 
-        for item in cart.items.all():
+        quantities = {}
+        for item in storage.items():
             qty = request.POST.get(f"quantity_{item.id}")
             if qty is None:
                 continue
             try:
-                qty = int(qty)
-                if qty <= 0:
-                    item.delete()
-                    deleted += 1
-                else:
-                    item.quantity = qty
-                    item.save(update_fields=["quantity"])
-                    updated += 1
+                quantities[str(item.id)] = int(qty)
             except (ValueError, TypeError):
                 continue
+        updated, deleted = storage.update(quantities)
 
         if updated or deleted:
             messages.success(request, "Cart has been updated ✅")
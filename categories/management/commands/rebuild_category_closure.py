@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from categories.models import CategoryClosure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the category closure table from the parent links of the categories.'
+
+    def handle(self, *args, **options):
+        rows = CategoryClosure.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{rows} category closure rows written.'))
@@ -1,6 +1,9 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils.text import gettext_lazy as _, slugify
 
+from .signals import subtree_moved
+
 
 class Category(models.Model):
     parent = models.ForeignKey(
@@ -27,16 +30,103 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError(_("A category can not be moved under itself or one of its children."))
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name, allow_unicode=True)
+        is_new = self._state.adding
+        if not is_new:
+            old_parent_id = Category.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
         super().save(*args, **kwargs)
+        if is_new:
+            CategoryClosure.objects.add_node(self)
+        elif old_parent_id != self.parent_id:
+            CategoryClosure.objects.move_subtree(self)
+            subtree_moved.send(sender=Category, category=self)
+
+    def get_descendant_ids(self):
+        """Ids of this category and every category under it, at any depth."""
+        return CategoryClosure.objects.filter(ancestor=self).values('descendant')
 
     class Meta:
         verbose_name = _("category")
         verbose_name_plural = _("categories")
 
 
+class CategoryClosureManager(models.Manager):
+    def add_node(self, category):
+        rows = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+        if category.parent_id:
+            rows += [
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+                for ancestor_id, depth in self.filter(descendant_id=category.parent_id)
+                .values_list('ancestor_id', 'depth')
+            ]
+        self.bulk_create(rows)
+
+    def move_subtree(self, category):
+        subtree = list(self.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _depth in subtree]
+        # cut the subtree loose from its old ancestors
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if category.parent_id:
+            ancestors = list(self.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth'))
+            self.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            ])
+
+    @transaction.atomic
+    def rebuild(self):
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        rows = []
+        for category_id in parents:
+            ancestor_id, depth = category_id, 0
+            while ancestor_id is not None and depth <= len(parents):
+                rows.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        self.all().delete()
+        self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class CategoryClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair of the category tree, including each category
+    paired with itself at depth 0, so a whole subtree is a single indexed lookup.
+    """
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+        verbose_name=_("ancestor"),
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+        verbose_name=_("descendant"),
+    )
+    depth = models.PositiveSmallIntegerField(_("depth"))
+
+    objects = CategoryClosureManager()
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        verbose_name = _("category closure")
+        verbose_name_plural = _("category closures")
+
+
 
 class Brand(models.Model):
     name = models.CharField(_("name"), max_length=155)
@@ -48,6 +138,7 @@ class Brand(models.Model):
     )
     description = models.CharField(_("description"), max_length=255)
     created_at = models.DateTimeField(_("created_at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated_at"), auto_now=True)
 
     def __str__(self):
         return self.name
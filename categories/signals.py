@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+
+# sent with `category` after a category and everything under it moved to another parent
+subtree_moved = Signal()
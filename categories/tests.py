@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.test import TestCase
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 
-from .models import Category, Brand
+from .models import Category, Brand, CategoryClosure
 
 
 class TestCategoryModel(TestCase):
@@ -47,4 +51,46 @@ class TestBrandModel(TestCase):
     def test_ordering_by_created_at(self):
         brand1 = Brand.objects.create(name='brand1')
         brand2 = Brand.objects.create(name='brand2')
-        self.assertGreater(brand2.created_at, brand1.created_at)
\ No newline at end of file
+        self.assertGreater(brand2.created_at, brand1.created_at)
+
+class TestCategoryClosure(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='root')
+        self.child = Category.objects.create(name='child', parent=self.root)
+        self.grandchild = Category.objects.create(name='grandchild', parent=self.child)
+        self.other = Category.objects.create(name='other')
+
+    def descendants(self, category):
+        return set(Category.objects.filter(id__in=category.get_descendant_ids()))
+
+    def test_descendants_at_any_depth(self):
+        self.assertEqual(self.descendants(self.root), {self.root, self.child, self.grandchild})
+        self.assertEqual(CategoryClosure.objects.get(ancestor=self.root, descendant=self.grandchild).depth, 2)
+
+    def test_move_subtree(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(self.descendants(self.root), {self.root})
+        self.assertEqual(self.descendants(self.other), {self.other, self.child, self.grandchild})
+
+    def test_move_to_root(self):
+        self.child.parent = None
+        self.child.save()
+        self.assertEqual(self.descendants(self.root), {self.root})
+        self.assertEqual(self.descendants(self.child), {self.child, self.grandchild})
+
+    def test_delete(self):
+        self.child.delete()
+        self.assertEqual(self.descendants(self.root), {self.root})
+        self.assertEqual(CategoryClosure.objects.count(), 2)
+
+    def test_can_not_move_under_descendant(self):
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+
+    def test_rebuild_command(self):
+        rows = set(CategoryClosure.objects.values_list('ancestor', 'descendant', 'depth'))
+        CategoryClosure.objects.all().delete()
+        call_command('rebuild_category_closure', stdout=StringIO())
+        self.assertEqual(set(CategoryClosure.objects.values_list('ancestor', 'descendant', 'depth')), rows)
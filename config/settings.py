@@ -32,6 +32,8 @@ INSTALLED_APPS = [
     'products',
     'cart',
     'orders',
+    'search',
+    'api',
 
     # third party apps
     'jalali_date',
@@ -44,6 +46,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.CartStorageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -71,6 +74,12 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
+# the cached reads are invalidated by versions every process has to see, so production needs a
+# shared cache: CACHE_URL=redis://127.0.0.1:6379/1 or pymemcache://127.0.0.1:11211 (check --deploy)
+CACHES = {
+    'default': env.dj_cache_url("CACHE_URL", default='locmem://'),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -123,5 +132,13 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+SEARCH_BACKEND = 'search.backends.DatabaseSearchBackend'
+
+# where carts of visitors who aren't logged in live, SignedCookieCartStorage or CacheCartStorage
+CART_GUEST_STORAGE = 'cart.services.storage.SignedCookieCartStorage'
+
+# paginate the product list by cursor instead of page number (no COUNT/OFFSET per page)
+PRODUCT_LIST_KEYSET_PAGINATION = env.bool("PRODUCT_LIST_KEYSET_PAGINATION", default=False)
+
 LOGIN_REDIRECT_URL = 'user-dashboard'
 LOGOUT_REDIRECT_URL = 'home'
@@ -10,6 +10,8 @@ urlpatterns = [
     path('', include('products.urls')),
     path('cart/', include('cart.urls')),
     path('checkout/', include('orders.urls')),
+    path('search/', include('search.urls')),
+    path('api/', include('api.urls')),
 ]
 
 if settings.DEBUG:
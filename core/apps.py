@@ -8,6 +8,7 @@ class CoreConfig(AppConfig):
     verbose_name = _("core")
 
     def ready(self):
+        from . import checks
         admin.site.site_header = _('Store Admin Panel')
         admin.site.site_title = _('Store Admin')
         admin.site.index_title = _('Welcome to the Store Admin Panel')
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The catalog, home, product page, suggestion and cart versions are bumped in one process
+    (a web worker or a management command) and read in all the others, through the cache.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'The default cache ({backend}) is not shared between processes.',
+            hint='Set CACHE_URL to a Redis or Memcached server, e.g. redis://127.0.0.1:6379/1.',
+            id='core.E001',
+        )]
+    return []
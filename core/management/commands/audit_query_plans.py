@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from core.services.query_audit import audit, regressions, sample_objects, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the querysets of the product managers and views and report full scans, '
+        'filesorts and missing indexes. Exits non-zero when findings appear that are not in the baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['text', 'json'], default='text')
+        parser.add_argument(
+            '--baseline',
+            help='JSON file of accepted findings ({"query name": ["kind:table", ...]}).',
+        )
+        parser.add_argument(
+            '--write-baseline',
+            action='store_true',
+            help='Accept the current findings by writing them to the --baseline file.',
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help=(
+                'Insert sample products first, so the planner has data to choose indexes for. '
+                'Their signals still run, use it against a development or CI database only. '
+                'The rows are rolled back after the audit.'
+            ),
+        )
+        parser.add_argument('--seed-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['write_baseline'] and not options['baseline']:
+            raise CommandError('--write-baseline needs --baseline.')
+
+        # seeded rows never outlive the audit
+        with transaction.atomic():
+            objects = seed_database(options['seed_size']) if options['seed'] else sample_objects()
+            report = audit(objects)
+            transaction.set_rollback(True)
+
+        if options['write_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump({entry['name']: entry['findings'] for entry in report}, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}."))
+            return
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+        new_findings = regressions(report, baseline)
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(
+                {'queries': report, 'regressions': new_findings},
+                cls=DjangoJSONEncoder,
+                indent=2,
+            ))
+        else:
+            for entry in report:
+                status = self.style.ERROR('REGRESSION') if entry['name'] in new_findings else 'ok'
+                self.stdout.write(f"{entry['name']}: {status} {', '.join(entry['findings'])}")
+
+        if new_findings:
+            raise CommandError(f'{len(new_findings)} querysets have new query plan findings.')
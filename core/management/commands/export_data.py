@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from core.services.exports import EXPORT_CHUNK_SIZE, EXPORT_WRITERS, export_lines
+from orders.models import Order
+from orders.services.exports import export_orders
+from products.models import Product
+from products.services.exports import export_products
+
+
+EXPORTS = {
+    'products': (Product, export_products),
+    'orders': (Order, export_orders),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream every product, or every order line, as CSV or JSONL to a file or stdout. '
+        'Rows are fetched in chunks, so the size of the export never matters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(EXPORT_WRITERS), default='csv')
+        parser.add_argument('--output', help='File to write to, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        model, exporter = EXPORTS[options['export']]
+        columns, rows = exporter(model.objects.all(), chunk_size=options['chunk_size'])
+        lines = export_lines(options['format'], columns, rows)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines:
+                output.write(line)
+                written += 1
+        if options['format'] == 'csv':
+            written -= 1
+        self.stdout.write(self.style.SUCCESS(f"{written} {options['export']} rows written to {options['output']}."))
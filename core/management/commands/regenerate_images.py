@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.services.image_regeneration import Checkpoint, image_sources, regenerate_images
+from core.services.images import IMAGE_FORMATS, IMAGE_PRESETS
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerate the image derivatives of every product, product gallery, category and banner image '
+        'over a pool of worker processes. With --checkpoint an interrupted run resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--preset', action='append', choices=list(IMAGE_PRESETS), dest='presets',
+                            help='Only regenerate this preset, can be repeated. All presets by default.')
+        parser.add_argument('--format', action='append', choices=list(IMAGE_FORMATS), dest='formats',
+                            help='Only regenerate this format, can be repeated. All formats by default.')
+        parser.add_argument('--force', action='store_true',
+                            help='Replace derivatives that already exist, e.g. after changing a preset.')
+        parser.add_argument('--checkpoint', help='JSON file to record progress in and resume from.')
+
+    def handle(self, *args, **options):
+        names = image_sources()
+        checkpoint = Checkpoint(options['checkpoint'])
+        if checkpoint.last_name:
+            self.stdout.write(f'Resuming after {checkpoint.last_name}.')
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} images')
+
+        report = regenerate_images(
+            names,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            presets=options['presets'],
+            formats=options['formats'],
+            force=options['force'],
+            checkpoint=checkpoint,
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+
+        for name, error in report['failures'].items():
+            self.stderr.write(self.style.ERROR(f'{name}: {error}'))
+        summary = (
+            f"{report['processed']} images processed ({report['skipped']} skipped), "
+            f"{report['written']} derivatives written in {report['elapsed']:.1f}s "
+            f"({report['images_per_second']:.1f} images/s), {len(report['failures'])} failed."
+        )
+        if report['failures']:
+            # keep the checkpoint so the failures can be looked at and retried
+            self.stdout.write(self.style.WARNING(summary))
+            return
+        checkpoint.remove()
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.db import connections, models
+
+from categories.models import Category
+from products.models import Product, ProductImage
+from ..models import BaseBanner
+from .images import generate_derivatives
+
+
+def image_models():
+    return [Product, ProductImage, Category, *BaseBanner.__subclasses__()]
+
+
+def image_sources():
+    """Sorted, distinct storage names of every image field of the catalog and the banners."""
+    names = set()
+    for model in image_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.ImageField):
+                names.update(
+                    model.objects.exclude(**{field.name: ''})
+                    .values_list(field.name, flat=True)
+                    .iterator(chunk_size=2000)
+                )
+    names.discard(None)
+    return sorted(names)
+
+
+def regenerate_image(name, presets=None, formats=None, force=False):
+    """(name, files written, error) of one image, safe to run in a worker process."""
+    try:
+        return name, generate_derivatives(name, presets, formats, force), None
+    except Exception as error:
+        return name, 0, f'{type(error).__name__}: {error}'
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Checkpoint:
+    """
+    Progress of a regeneration in a JSON file: the last image of the last finished batch
+    (images are processed in name order) and the failures so far.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.last_name = None
+        self.failures = {}
+        if path and os.path.exists(path):
+            with open(path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            self.last_name = state['last_name']
+            self.failures = state['failures']
+
+    def save(self):
+        if not self.path:
+            return
+        # write then rename, so an interruption never leaves a half written checkpoint
+        with open(f'{self.path}.tmp', 'w') as checkpoint_file:
+            json.dump({'last_name': self.last_name, 'failures': self.failures}, checkpoint_file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def regenerate_images(names, workers=1, batch_size=100, presets=None, formats=None, force=False,
+                      checkpoint=None, progress=None):
+    """
+    Regenerate the derivatives of `names` over a pool of `workers` processes, one batch at a time
+    so only `batch_size` images are ever in flight. Names up to the checkpoint are skipped,
+    except the ones that failed.
+    Returns a report dict with counts, failures and throughput.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    # failures of an earlier run are retried, unless the image was replaced or deleted since
+    known = set(names)
+    checkpoint.failures = {name: error for name, error in checkpoint.failures.items() if name in known}
+    pending = [
+        name for name in names
+        if checkpoint.last_name is None or name > checkpoint.last_name or name in checkpoint.failures
+    ]
+    report = {'skipped': len(names) - len(pending), 'processed': 0, 'written': 0}
+    started = time.monotonic()
+
+    regenerate = partial(regenerate_image, presets=presets, formats=formats, force=force)
+    pool = None
+    if workers > 1:
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for batch in _batches(pending, batch_size):
+            results = pool.map(regenerate, batch) if pool else map(regenerate, batch)
+            for name, written, error in results:
+                report['processed'] += 1
+                report['written'] += written
+                if error:
+                    checkpoint.failures[name] = error
+                else:
+                    checkpoint.failures.pop(name, None)
+            checkpoint.last_name = max(filter(None, [checkpoint.last_name, batch[-1]]))
+            checkpoint.save()
+            if progress:
+                progress(report['processed'], len(pending))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.monotonic() - started
+    report.update({
+        'failures': dict(checkpoint.failures),
+        'elapsed': elapsed,
+        'images_per_second': report['processed'] / elapsed if elapsed else 0,
+    })
+    return report
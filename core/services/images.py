@@ -0,0 +1,157 @@
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+
+# widths generated for every preset, the largest one is the fallback src
+IMAGE_PRESETS = {
+    'tile': (200, 400),
+    'gallery': (600, 900),
+    'zoom': (1200, 1800),
+    'banner': (800, 1600),
+}
+# format name: (Pillow format, content type, file extension, save options)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVES_DIR = 'derivatives'
+# how long a generating request holds the lock, in case it dies before letting go
+GENERATE_LOCK_TIMEOUT = 30
+
+
+def source_name(source):
+    """Storage name of an image field file, or of a media url as stored on the product cards."""
+    if not source:
+        return ''
+    name = getattr(source, 'name', source)
+    if name.startswith(settings.MEDIA_URL):
+        name = name[len(settings.MEDIA_URL):]
+    return name
+
+
+def _hash_key(name):
+    return f'image_source_hash:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def _ready_key(target):
+    return f'image_derivative_ready:{target}'
+
+
+def source_hash(name):
+    """
+    Content hash of a source image, remembered per name: the storage never overwrites
+    an uploaded file in place, a new upload always gets a new name.
+    """
+    digest = cache.get(_hash_key(name))
+    if digest is None:
+        sha = hashlib.sha256()
+        with default_storage.open(name) as source:
+            for chunk in source.chunks():
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        cache.set(_hash_key(name), digest, None)
+    return digest
+
+
+def derivative_name(digest, preset, width, fmt):
+    return f'{DERIVATIVES_DIR}/{digest[:2]}/{digest}-{preset}-{width}.{IMAGE_FORMATS[fmt][2]}'
+
+
+def render_derivative(source, width, fmt):
+    """The source image scaled down to `width` (never up) and encoded as `fmt`."""
+    pil_format, _content_type, _extension, options = IMAGE_FORMATS[fmt]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.Resampling.LANCZOS)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        output = io.BytesIO()
+        image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+def get_derivative(name, preset, width, fmt):
+    """
+    Storage name of the derivative, generated on first use. Only the request holding the lock
+    resizes the file, concurrent ones get None right away and ask the client to retry.
+    """
+    target = derivative_name(source_hash(name), preset, width, fmt)
+    if cache.get(_ready_key(target)) or default_storage.exists(target):
+        cache.set(_ready_key(target), True, None)
+        return target
+
+    lock = f'image_derivative_lock:{target}'
+    if not cache.add(lock, True, GENERATE_LOCK_TIMEOUT):
+        return None
+    try:
+        if not default_storage.exists(target):
+            with default_storage.open(name) as source:
+                default_storage.save(target, ContentFile(render_derivative(source, width, fmt)))
+    finally:
+        cache.delete(lock)
+    cache.set(_ready_key(target), True, None)
+    return target
+
+
+def generate_derivatives(name, presets=None, formats=None, force=False):
+    """
+    Write the derivatives of a source image for the given presets and formats (all by default),
+    replacing existing ones when `force` is set. Returns the number of files written.
+    """
+    with default_storage.open(name) as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+    cache.set(_hash_key(name), digest, None)
+    written = 0
+    for preset in presets or IMAGE_PRESETS:
+        for width in IMAGE_PRESETS[preset]:
+            for fmt in formats or IMAGE_FORMATS:
+                target = derivative_name(digest, preset, width, fmt)
+                if default_storage.exists(target):
+                    if not force:
+                        continue
+                    default_storage.delete(target)
+                default_storage.save(target, ContentFile(render_derivative(io.BytesIO(data), width, fmt)))
+                cache.set(_ready_key(target), True, None)
+                written += 1
+    return written
+
+
+def derivative_urls(source, preset, fmt='jpeg'):
+    """
+    [(width, url), ...] of the preset. Derivatives already generated are linked directly,
+    the others through the view that generates them on first request. No file is touched here.
+    """
+    name = source_name(source)
+    if not name:
+        return []
+    widths = IMAGE_PRESETS[preset]
+    digest = cache.get(_hash_key(name))
+    ready = {}
+    if digest:
+        targets = {width: derivative_name(digest, preset, width, fmt) for width in widths}
+        ready = cache.get_many([_ready_key(target) for target in targets.values()])
+    urls = []
+    for width in widths:
+        if digest and ready.get(_ready_key(targets[width])):
+            urls.append((width, default_storage.url(targets[width])))
+        else:
+            urls.append((width, reverse('image-derivative', args=[preset, width, fmt, name])))
+    return urls
+
+
+def srcset(source, preset, fmt='jpeg'):
+    return ', '.join(f'{url} {width}w' for width, url in derivative_urls(source, preset, fmt))
@@ -0,0 +1,285 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from cart.services.storage import DatabaseCartStorage
+from cart.views import CartDetailView
+from categories.models import Category, Brand
+from core.views import user_orders_queryset
+from orders.models import Order, Address
+from orders.views import OrderDetailView
+from products.models import Product, Discount, Comment
+from products.services.comments import COMMENTS_PER_PAGE, comments_queryset, replies_queryset
+from products.services.related_products import (
+    RELATED_PRODUCTS_LIMIT, fallback_related_products_queryset, related_products_queryset,
+)
+from products.views import ProductListView, ProductDetailView
+
+
+FULL_SCAN = 'full_scan'
+FILESORT = 'filesort'
+TEMPORARY = 'temporary'
+MISSING_INDEX = 'missing_index'
+
+SEED_PREFIX = 'query-audit'
+
+
+def seed_database(size=200):
+    """
+    Insert a small, realistic catalog so the planner has something to choose indexes for.
+    Meant to run inside a transaction that is rolled back afterwards.
+    """
+    now = timezone.now()
+    user = get_user_model().objects.create_user(
+        username=f'{SEED_PREFIX}-user',
+        email=f'{SEED_PREFIX}@example.com',
+        password=None,
+    )
+    root = Category.objects.create(name=f'{SEED_PREFIX} root', slug=f'{SEED_PREFIX}-root', image='seed.jpg')
+    children = [
+        Category.objects.create(name=f'{SEED_PREFIX} {index}', slug=f'{SEED_PREFIX}-{index}', parent=root, image='seed.jpg')
+        for index in range(5)
+    ]
+    brands = [
+        Brand.objects.create(name=f'{SEED_PREFIX} brand {index}', slug=f'{SEED_PREFIX}-brand-{index}', description='seed')
+        for index in range(5)
+    ]
+    products = []
+    for index in range(size):
+        discount = None
+        if index % 4 == 0:
+            discount = Discount.objects.create(
+                value=10 + index % 30,
+                start_date=now - timezone.timedelta(days=1),
+                expire_date=now + timezone.timedelta(days=1 + index % 7),
+            )
+        products.append(Product.objects.create(
+            category=children[index % len(children)],
+            brand=brands[index % len(brands)],
+            name=f'{SEED_PREFIX} product {index}',
+            slug=f'{SEED_PREFIX}-product-{index}',
+            main_image='seed.jpg',
+            short_description='seed product',
+            description='seed product description',
+            price=1000 * (index + 1),
+            discount=discount,
+            stock=index % 10,
+            total_sell=index % 13,
+            status=Product.ProductStatus.AVAILABLE,
+        ))
+    for product in products[:20]:
+        Comment.objects.create(
+            product=product,
+            user=user,
+            display_name='seed',
+            title='seed',
+            text='seed comment',
+            recommend=True,
+            status=Comment.CommentStatus.APPROVED,
+        )
+    address = Address.objects.create(user=user, full_name='seed', phone='0', city='seed', postal_code='0', full_address='seed')
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=products[0], quantity=1)
+    order = Order.objects.create(
+        user=user,
+        shipping_address=address,
+        subtotal=0,
+        discount_total=0,
+        shipping_total=0,
+        tax_total=0,
+        grand_total=0,
+    )
+    return {'user': user, 'product': products[0], 'category': root, 'brand': brands[0], 'cart': cart, 'order': order}
+
+
+def sample_objects():
+    """Objects to parametrize the audited querysets with when the database is not seeded."""
+    return {
+        'user': get_user_model().objects.order_by('pk').first(),
+        'product': Product.objects.order_by('pk').first(),
+        'category': Category.objects.order_by('pk').first(),
+        'brand': Brand.objects.order_by('pk').first(),
+        'cart': Cart.objects.order_by('pk').first(),
+        'order': Order.objects.order_by('pk').first(),
+    }
+
+
+def _view(view_class, path, user=None, params=None, **kwargs):
+    request = RequestFactory().get(path, params or {})
+    request.user = user or AnonymousUser()
+    view = view_class()
+    view.setup(request, **kwargs)
+    return view
+
+
+def _view_queryset(view_class, path, params=None, **kwargs):
+    return _view(view_class, path, params=params, **kwargs).get_queryset()
+
+
+def audited_querysets(objects):
+    """(name, queryset) pairs of every manager method and view queryset worth watching."""
+    product = objects['product']
+    category_slug = objects['category'].slug if objects['category'] else ''
+    brand_slug = objects['brand'].slug if objects['brand'] else ''
+    product_id = product.pk if product else 0
+    order_id = objects['order'].pk if objects['order'] else 0
+    search_term = product.name.split()[0] if product else 'x'
+
+    querysets = [
+        ('ProductManager.active', Product.objects.active()),
+        ('ProductManager.newest', Product.objects.newest()[:20]),
+        ('ProductManager.with_discount', Product.objects.with_discount()[:20]),
+        ('ProductManager.by_category', Product.objects.by_category(category_slug)[:20]),
+        ('ProductManager.by_brand', Product.objects.by_brand(brand_slug)[:20]),
+        ('ProductManager.search', Product.objects.search(search_term)[:20]),
+        ('ProductManager.most_expensive', Product.objects.most_expensive()[:20]),
+        ('ProductManager.cheapest', Product.objects.cheapest()[:20]),
+        ('CommentManager.active', Comment.objects.active().filter(product_id=product_id)),
+    ]
+
+    list_params = {
+        'default': {},
+        'newest': {'sort_query': 'newest'},
+        'best-sell': {'sort_query': 'best-sell'},
+        'most-expensive': {'sort_query': 'most-expensive'},
+        'cheapest': {'sort_query': 'cheapest'},
+        'discounted': {'sort_query': 'discounted'},
+        'category': {'category_slug': category_slug},
+        'brand': {'brand_slug': brand_slug},
+        'price-range': {'min_price': 1000, 'max_price': 50000},
+        'special': {'special': 'on'},
+        'search': {'q': search_term},
+    }
+    for name, params in list_params.items():
+        querysets.append((
+            f'ProductListView[{name}]',
+            _view_queryset(ProductListView, '/products/', params)[:20],
+        ))
+
+    slug = product.slug if product else ''
+    querysets.append(
+        ('ProductDetailView', _view_queryset(ProductDetailView, f'/products/{slug}/', slug=slug).filter(slug=slug)),
+    )
+    if product:
+        querysets += [
+            ('ProductDetailView.related_products', related_products_queryset(product)[:RELATED_PRODUCTS_LIMIT]),
+            ('ProductDetailView.related_products[fallback]',
+             fallback_related_products_queryset(product)[:RELATED_PRODUCTS_LIMIT]),
+            ('ProductDetailView.comments', comments_queryset(product)[:COMMENTS_PER_PAGE]),
+            ('ProductDetailView.comment_threads', replies_queryset(comments_queryset(product)[:COMMENTS_PER_PAGE])),
+        ]
+    # the views of the account pages only run for a logged in user
+    user = objects['user']
+    if user:
+        cart_view = _view(CartDetailView, '/cart/', user)
+        querysets += [
+            ('CartDetailView', cart_view.get_queryset()),
+            ('CartDetailView.user_addresses', cart_view.get_user_addresses()),
+            ('OrderDetailView', _view(OrderDetailView, '/checkout/order/', user).get_queryset().filter(pk=order_id)),
+            ('user_dashboard_view.user_orders', user_orders_queryset(user)),
+            ('cart_summary.items', DatabaseCartStorage(user).items()),
+        ]
+    return querysets
+
+
+def explain(queryset):
+    """Run EXPLAIN for the queryset and return (plan rows, findings)."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    analyzer = ANALYZERS.get(connection.vendor)
+    if analyzer is None:
+        raise CommandError(f'No query plan analyzer for {connection.vendor}.')
+    with connection.cursor() as cursor:
+        return analyzer(cursor, sql, params)
+
+
+def _analyze_mysql(cursor, sql, params):
+    cursor.execute(f'EXPLAIN {sql}', params)
+    columns = [column[0] for column in cursor.description]
+    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    findings = []
+    for row in plan:
+        table = row.get('table') or ''
+        extra = row.get('Extra') or ''
+        if row.get('type') == 'ALL':
+            findings.append((MISSING_INDEX if not row.get('possible_keys') else FULL_SCAN, table))
+        if 'Using filesort' in extra:
+            findings.append((FILESORT, table))
+        if 'Using temporary' in extra:
+            findings.append((TEMPORARY, table))
+    return plan, findings
+
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)')
+SQLITE_AUTOINDEX_RE = re.compile(r'AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX ON (\w+)')
+
+
+def _analyze_sqlite(cursor, sql, params):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    plan = [row[-1] for row in cursor.fetchall()]
+    findings = []
+    for detail in plan:
+        scan = SQLITE_SCAN_RE.match(detail)
+        if scan and 'INDEX' not in detail:
+            findings.append((FULL_SCAN, scan.group(1)))
+        autoindex = SQLITE_AUTOINDEX_RE.search(detail)
+        if autoindex:
+            findings.append((MISSING_INDEX, autoindex.group(1)))
+        if 'TEMP B-TREE FOR ORDER BY' in detail or 'TEMP B-TREE FOR RIGHT PART OF ORDER BY' in detail:
+            findings.append((FILESORT, ''))
+        elif 'TEMP B-TREE' in detail:
+            findings.append((TEMPORARY, ''))
+    return plan, findings
+
+
+def _analyze_postgresql(cursor, sql, params):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    findings = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            findings.append((FULL_SCAN, node.get('Relation Name', '')))
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            findings.append((FILESORT, ''))
+        nodes.extend(node.get('Plans', []))
+    return plan, findings
+
+
+ANALYZERS = {
+    'mysql': _analyze_mysql,
+    'sqlite': _analyze_sqlite,
+    'postgresql': _analyze_postgresql,
+}
+
+
+def audit(objects):
+    report = []
+    for name, queryset in audited_querysets(objects):
+        plan, findings = explain(queryset)
+        report.append({
+            'name': name,
+            'sql': str(queryset.query),
+            'plan': plan,
+            'findings': sorted({f'{kind}:{table}' if table else kind for kind, table in findings}),
+        })
+    return report
+
+
+def regressions(report, baseline):
+    """Findings of the report that are not accepted in the baseline ({name: [finding, ...]})."""
+    return {
+        entry['name']: new
+        for entry in report
+        if (new := sorted(set(entry['findings']) - set(baseline.get(entry['name'], []))))
+    }
@@ -0,0 +1,34 @@
+from django import template
+
+from core.services.images import derivative_urls, srcset
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(source, preset, fmt='jpeg'):
+    """`srcset` value with every width of the preset, e.g. <img srcset="{% image_srcset product.main_image 'tile' %}">."""
+    return srcset(source, preset, fmt)
+
+
+@register.simple_tag
+def image_url(source, preset, fmt='jpeg'):
+    """Url of the largest width of the preset."""
+    urls = derivative_urls(source, preset, fmt)
+    return urls[-1][1] if urls else ''
+
+
+@register.inclusion_tag('core/responsive_image.html')
+def responsive_image(source, preset, alt='', css_class='', sizes='', loading='lazy'):
+    """A <picture> with a WebP source and a JPEG fallback in every width of the preset."""
+    jpeg_urls = derivative_urls(source, preset, 'jpeg')
+    return {
+        'webp_srcset': srcset(source, preset, 'webp'),
+        'jpeg_srcset': ', '.join(f'{url} {width}w' for width, url in jpeg_urls),
+        'src': jpeg_urls[-1][1] if jpeg_urls else '',
+        'alt': alt,
+        'css_class': css_class,
+        'sizes': sizes,
+        'loading': loading,
+    }
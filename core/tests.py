@@ -1,5 +1,26 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.shortcuts import reverse
+from django.template import Context, Template
+from PIL import Image
+
+from categories.models import Category
+from products.models import Product
+from .checks import check_shared_cache
+from .models import SiteSettings, SliderBanners
+from .services import images
 
 CustomUser = get_user_model()
 
@@ -23,3 +44,174 @@ class CustomUserModelTest(TestCase):
         user.usable_password = False
         user.save()
         self.assertFalse(user.usable_password)
+
+
+class AuditQueryPlansCommandTest(TestCase):
+    def setUp(self):
+        self.baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+
+    def test_json_report(self):
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump({}, baseline_file)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('audit_query_plans', format='json', baseline=self.baseline, seed=True, stdout=out)
+        report = json.loads(out.getvalue())
+        names = [entry['name'] for entry in report['queries']]
+        self.assertIn('ProductManager.search', names)
+        self.assertIn('ProductListView[cheapest]', names)
+        self.assertTrue(report['regressions'])
+
+    def test_baseline_accepts_known_findings(self):
+        call_command('audit_query_plans', baseline=self.baseline, write_baseline=True, seed=True, stdout=StringIO())
+        call_command('audit_query_plans', baseline=self.baseline, seed=True, stdout=StringIO())
+
+    def test_seed_data_is_rolled_back(self):
+        call_command('audit_query_plans', baseline=self.baseline, write_baseline=True, seed=True, stdout=StringIO())
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_existing_data_is_audited_unless_seeding_is_asked_for(self):
+        CustomUser.objects.create_user(username='customer', password='password1234')
+        with mock.patch('core.management.commands.audit_query_plans.seed_database') as seed:
+            call_command('audit_query_plans', baseline=self.baseline, write_baseline=True, stdout=StringIO())
+        seed.assert_not_called()
+        with open(self.baseline) as baseline_file:
+            self.assertIn('CartDetailView', json.load(baseline_file))
+
+
+class ImageDerivativeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.name = default_storage.save('products/photo.png', ContentFile(self.png(1000, 500)))
+
+    def png(self, width, height):
+        output = BytesIO()
+        Image.new('RGBA', (width, height), (255, 0, 0, 128)).save(output, 'PNG')
+        return output.getvalue()
+
+    def test_derivative_generated_on_first_request(self):
+        url = reverse('image-derivative', args=['tile', 400, 'webp', self.name])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (400, 200)))
+
+        target = images.derivative_name(images.source_hash(self.name), 'tile', 400, 'webp')
+        self.assertTrue(default_storage.exists(target))
+        with mock.patch.object(images, 'render_derivative') as render:
+            self.assertEqual(images.get_derivative(self.name, 'tile', 400, 'webp'), target)
+        render.assert_not_called()
+
+    def test_srcset_links_generated_derivatives_directly(self):
+        lazy = images.srcset(self.name, 'tile')
+        self.assertIn(reverse('image-derivative', args=['tile', 200, 'jpeg', self.name]) + ' 200w', lazy)
+
+        images.get_derivative(self.name, 'tile', 200, 'jpeg')
+        srcset = images.srcset(f'/media/{self.name}', 'tile')
+        self.assertIn(default_storage.url(images.derivative_name(images.source_hash(self.name), 'tile', 200, 'jpeg')), srcset)
+        self.assertIn(reverse('image-derivative', args=['tile', 400, 'jpeg', self.name]) + ' 400w', srcset)
+
+    def test_responsive_image_tag(self):
+        html = Template("{% load image_tags %}{% responsive_image image 'gallery' alt='photo' %}").render(
+            Context({'image': self.name}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(' 900w', html)
+        self.assertEqual(Template("{% load image_tags %}{% responsive_image '' 'tile' %}").render(Context()).strip(), '')
+
+    def test_jpeg_flattens_transparency(self):
+        with Image.open(BytesIO(images.render_derivative(BytesIO(self.png(100, 100)), 200, 'jpeg'))) as image:
+            self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (100, 100)))
+
+    def test_concurrent_generation_asks_to_retry(self):
+        target = images.derivative_name(images.source_hash(self.name), 'tile', 200, 'jpeg')
+        cache.add(f'image_derivative_lock:{target}', True)
+        self.assertIsNone(images.get_derivative(self.name, 'tile', 200, 'jpeg'))
+        # the requested file is never served as is, it may not even be an image
+        response = self.client.get(reverse('image-derivative', args=['tile', 200, 'jpeg', self.name]))
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertFalse(default_storage.exists(target))
+
+    def test_unknown_presets_and_files_are_not_found(self):
+        for args in (['huge', 200, 'jpeg', self.name], ['tile', 300, 'jpeg', self.name],
+                     ['tile', 200, 'gif', self.name], ['tile', 200, 'jpeg', 'products/missing.png'],
+                     ['tile', 200, 'jpeg', '../secret.png']):
+            self.assertEqual(self.client.get(reverse('image-derivative', args=args)).status_code, 404)
+
+
+class RegenerateImagesCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.category = Category.objects.create(name='category', image=self.image('categories/category.png'))
+        Product.objects.create(category=self.category, name='product', main_image=self.image('products/product.png'), price=100)
+        site_settings = SiteSettings.objects.create(site_name='shop')
+        SliderBanners.objects.create(site_setting=site_settings, title='slider', image=self.image('banners/slider.png'))
+
+    def image(self, name):
+        # distinct content per name, identical files would share their derivatives
+        output = BytesIO()
+        Image.new('RGB', (900, 450), (len(name), ord(name[0]), ord(name[-5]))).save(output, 'PNG')
+        return default_storage.save(name, ContentFile(output.getvalue()))
+
+    def regenerate(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('regenerate_images', '--workers', '1', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_regenerates_every_image_field(self):
+        out, _ = self.regenerate('--preset', 'tile')
+        self.assertIn('3 images processed (0 skipped), 12 derivatives written', out)
+        out, _ = self.regenerate('--preset', 'tile')
+        self.assertIn('0 derivatives written', out)
+        out, _ = self.regenerate('--preset', 'tile', '--format', 'webp', '--force')
+        self.assertIn('6 derivatives written', out)
+
+    def test_worker_pool(self):
+        out = StringIO()
+        call_command('regenerate_images', '--workers', '2', '--batch-size', '2', '--preset', 'tile', stdout=out)
+        self.assertIn('3 images processed (0 skipped), 12 derivatives written', out.getvalue())
+        self.assertTrue(default_storage.exists(images.derivative_name(
+            images.source_hash(self.category.image.name), 'tile', 400, 'webp')))
+
+    def test_resumes_from_checkpoint_and_keeps_failures(self):
+        checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        with open(checkpoint, 'w') as checkpoint_file:
+            json.dump({'last_name': 'banners/slider.png', 'failures': {}}, checkpoint_file)
+        default_storage.delete(self.category.image.name)
+        default_storage.save(self.category.image.name, ContentFile(b'not an image'))
+
+        out, err = self.regenerate('--preset', 'tile', '--checkpoint', checkpoint)
+        self.assertIn('Resuming after banners/slider.png', out)
+        self.assertIn('2 images processed (1 skipped)', out)
+        self.assertIn('1 failed', out)
+        self.assertIn('categories/category.png: UnidentifiedImageError', err)
+        with open(checkpoint) as checkpoint_file:
+            self.assertIn('categories/category.png', json.load(checkpoint_file)['failures'])
+
+        self.category.image = self.image('categories/fixed.png')
+        self.category.save()
+        out, _ = self.regenerate('--preset', 'tile', '--checkpoint', checkpoint)
+        self.assertIn('0 failed', out)
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_process_local_cache_fails_the_deploy_check(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}):
+            self.assertEqual(check_shared_cache(None), [])
@@ -5,4 +5,5 @@ from . import views
 urlpatterns = [
     path('dashboard/', views.user_dashboard_view, name='user-dashboard'),
     path('register/', views.SignUPView.as_view(), name='signup'),
+    path('images/<str:preset>/<int:width>/<str:fmt>/<path:name>', views.image_derivative_view, name='image-derivative'),
 ]
@@ -2,13 +2,23 @@ from django.views import generic
 from django.shortcuts import render, reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from PIL import Image
 
 from orders.models import Order
 from .forms import *
+from .services.images import DERIVATIVES_DIR, IMAGE_FORMATS, IMAGE_PRESETS, get_derivative
+
+def user_orders_queryset(user):
+    return Order.objects.filter(user=user).order_by('-created_at')
+
 
 @login_required
 def user_dashboard_view(request):
-    user_orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    user_orders = user_orders_queryset(request.user)
     for order in user_orders:
         if order.time_left() ==0 and order.status == Order.OrderStatus.PENDING_PAYMENT:
             order.status = Order.OrderStatus.CANCELLED
@@ -31,3 +41,25 @@ class SignUPView(generic.CreateView):
     def form_valid(self, form):
         messages.success(self.request, 'خوش آمدید')
         return super().form_valid(form)
+
+
+def image_derivative_view(request, preset, width, fmt, name):
+    """Serve a derivative of a media image, generating it on first request."""
+    if (width not in IMAGE_PRESETS.get(preset, ())
+            or fmt not in IMAGE_FORMATS
+            or name.startswith(f'{DERIVATIVES_DIR}/')):
+        raise Http404
+    try:
+        target = get_derivative(name, preset, width, fmt)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        raise Http404
+    if target is None:
+        # still being generated by another request; the name isn't known to be an image
+        # until that one opened it, so nothing under it is served meanwhile
+        response = HttpResponse(status=503)
+        response['Retry-After'] = 1
+        patch_cache_control(response, no_store=True)
+        return response
+    response = FileResponse(default_storage.open(target), content_type=IMAGE_FORMATS[fmt][1])
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 30)
+    return response
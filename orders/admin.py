@@ -1,10 +1,23 @@
 from django.contrib import admin
 
+from core.services.exports import export_actions
 from .models import *
+from .services.exports import export_orders
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
 
+
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    fields = ['product', 'quantity', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrdersAdmin(admin.ModelAdmin):
     list_display = [
@@ -24,9 +37,10 @@ class OrdersAdmin(admin.ModelAdmin):
     ]
     list_per_page = 20
     list_max_show_all = 30
+    actions = export_actions('orders', export_orders)
     inlines = [
         OrderItemInline,
-
+        StockReservationInline,
     ]
 
 
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from orders.services.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancel the orders left unpaid past their payment deadline and put the stock they reserved back. '
+        'Run it every few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Reserved stock of {released} orders released.'))
@@ -104,6 +104,10 @@ class Order(models.Model):
     class Meta:
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
+        indexes = [
+            # the sweep for pending orders past their payment deadline
+            models.Index(fields=['status', 'payment_deadline'], name='order_status_deadline_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -141,3 +145,26 @@ class OrderItem(models.Model):
     class Meta:
         verbose_name = _('Order item')
         verbose_name_plural = _('Order items')
+
+
+class StockReservation(models.Model):
+    """
+    Stock taken off a product for an order that isn't paid yet. Paying the order keeps the
+    stock sold, cancelling it or missing its payment deadline puts the stock back.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations',
+        verbose_name=_('product'),
+    )
+    quantity = models.PositiveIntegerField(_('quantity'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
+
+    class Meta:
+        verbose_name = _('Stock reservation')
+        verbose_name_plural = _('Stock reservations')
@@ -0,0 +1,38 @@
+from core.services.exports import EXPORT_CHUNK_SIZE, chunked_values
+from ..models import OrderItem
+
+
+# column: lookup from the order item, one row per order line
+ORDER_EXPORT_COLUMNS = {
+    'order_id': 'order_id',
+    'order_created_at': 'order__created_at',
+    'status': 'order__status',
+    'payment_method': 'order__payment_method',
+    'shipping_method': 'order__shipping_method',
+    'user': 'order__user__username',
+    'city': 'order__shipping_address__city',
+    'coupon_code': 'order__coupon_code',
+    'subtotal': 'order__subtotal',
+    'discount_total': 'order__discount_total',
+    'shipping_total': 'order__shipping_total',
+    'tax_total': 'order__tax_total',
+    'grand_total': 'order__grand_total',
+    'item_id': 'pk',
+    'product_id': 'product_id',
+    'product_name': 'product_name',
+    'quantity': 'quantity',
+    'item_price': 'item_price',
+    'total_discount': 'total_discount',
+    'final_price': 'final_price',
+}
+
+
+def export_orders(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    (columns, rows) of the lines of the orders of the queryset, the order columns repeated
+    on each of its lines. Rows are fetched lazily by order and then item, along the index of the
+    order foreign key, so the lines of an order always come together even when checkouts interleaved.
+    """
+    items = OrderItem.objects.filter(order__in=queryset.values('pk'))
+    return list(ORDER_EXPORT_COLUMNS), chunked_values(
+        items, ORDER_EXPORT_COLUMNS.values(), chunk_size, key=('order_id', 'pk'))
@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.services.home_cache import invalidate_home_sections, sections_showing
+from products.services.product_cards import refresh_product_cards, shown_stock
+from products.services.product_page import invalidate_product_pages
+from ..models import Order, StockReservation
+
+
+# statuses that keep the reserved stock sold
+SOLD_STATUSES = (
+    Order.OrderStatus.PAID,
+    Order.OrderStatus.SHIPPED,
+    Order.OrderStatus.DELIVERED,
+    Order.OrderStatus.FULFILLED,
+)
+# statuses that put the reserved stock back
+RELEASED_STATUSES = (Order.OrderStatus.CANCELLED, Order.OrderStatus.REFUNDED)
+
+
+class OutOfStock(Exception):
+    """A product has less stock left than an order asks for."""
+
+    def __init__(self, product_id):
+        super().__init__(f'product {product_id} is out of stock')
+        self.product_id = product_id
+
+
+def reserve_stock(order, quantities):
+    """
+    Take {product_id: quantity} off the stock of the products for the order, with one
+    conditional UPDATE per product so two checkouts can never both get the last item.
+    Must run inside the transaction that creates the order and as late in it as possible:
+    each UPDATE holds the product row until that transaction commits. Raises OutOfStock,
+    which rolls the transaction back, when a product has too little left.
+    """
+    now = timezone.now()
+    # always lock the products in the same order, so two checkouts can't deadlock
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        taken = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity,
+            updated_at=now,
+        )
+        if not taken:
+            raise OutOfStock(product_id)
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity)
+        for product_id, quantity in quantities.items()
+    ])
+
+
+def keep_reserved_stock(order_ids):
+    """The orders are paid, their stock stays sold and the reservations are dropped."""
+    StockReservation.objects.filter(order__in=order_ids).delete()
+
+
+def release_reserved_stock(order_ids):
+    """
+    Put the reserved stock of the orders back with a single UPDATE and drop the reservations.
+    Reservations another transaction is releasing right now are skipped rather than waited for,
+    so a sweep and a cancellation can't return the same stock twice. Returns the product ids.
+    """
+    with transaction.atomic():
+        rows = list(StockReservation.objects.select_for_update(skip_locked=True)
+                    .filter(order__in=order_ids)
+                    .values_list('pk', 'product_id', 'quantity'))
+        if not rows:
+            return set()
+        returned = {}
+        for _pk, product_id, quantity in rows:
+            returned[product_id] = returned.get(product_id, 0) + quantity
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        Product.objects.filter(pk__in=returned).update(
+            stock=F('stock') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in returned.items()],
+                output_field=PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+    return set(returned)
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Cancel the pending orders past their payment deadline and put their stock back, then settle
+    the reservations of orders paid or cancelled without their signals (e.g. a queryset update).
+    Returns the number of orders released.
+    """
+    now = now or timezone.now()
+    released = 0
+    changed_products = set()
+    while True:
+        with transaction.atomic():
+            order_ids = list(Order.objects.select_for_update(skip_locked=True)
+                             .filter(status=Order.OrderStatus.PENDING_PAYMENT, payment_deadline__lte=now)
+                             .order_by('payment_deadline')
+                             .values_list('pk', flat=True)[:batch_size])
+            if not order_ids:
+                break
+            Order.objects.filter(pk__in=order_ids).update(status=Order.OrderStatus.CANCELLED, updated_at=now)
+            changed_products |= release_reserved_stock(order_ids)
+        released += len(order_ids)
+
+    # keyset on the order, reservations skipped as locked by someone else are left to them
+    last_order_id = 0
+    while True:
+        order_ids = list(StockReservation.objects
+                         .filter(order__gt=last_order_id, order__status__in=SOLD_STATUSES + RELEASED_STATUSES)
+                         .order_by('order')
+                         .values_list('order', flat=True).distinct()[:batch_size])
+        if not order_ids:
+            break
+        sold = set(Order.objects.filter(pk__in=order_ids, status__in=SOLD_STATUSES).values_list('pk', flat=True))
+        keep_reserved_stock(sold)
+        changed_products |= release_reserved_stock([pk for pk in order_ids if pk not in sold])
+        released += len(order_ids) - len(sold)
+        last_order_id = order_ids[-1]
+
+    stock_changed(changed_products)
+    return released
+
+
+def stock_changed(product_ids):
+    """
+    Stock updates skip the product signals. Refresh the cards, pages and home sections of the
+    products whose tile shows something else now, e.g. when they sell out or get low on stock.
+    Routine changes are left to the page and section timeouts and the next save of the product.
+    """
+    if not product_ids:
+        return
+    changed = [
+        product_id
+        for product_id, stock, card_stock in Product.objects.filter(pk__in=product_ids)
+        .values_list('pk', 'stock', 'card__stock')
+        if card_stock is None or shown_stock(stock) != shown_stock(card_stock)
+    ]
+    if not changed:
+        return
+    refresh_product_cards(Product.objects.filter(pk__in=changed))
+    invalidate_product_pages(changed)
+    invalidate_home_sections(*sections_showing(changed))
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Order
+from .services.reservations import (
+    RELEASED_STATUSES, SOLD_STATUSES, keep_reserved_stock, release_reserved_stock, stock_changed,
+)
+
+
+@receiver(post_save, sender=Order)
+def settle_stock_reservations(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    if instance.status in SOLD_STATUSES:
+        keep_reserved_stock([instance.pk])
+    elif instance.status in RELEASED_STATUSES:
+        stock_changed(release_reserved_stock([instance.pk]))
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_stock(sender, instance, **kwargs):
+    # the reservations go with the order, their stock has to be back before that
+    stock_changed(release_reserved_stock([instance.pk]))
@@ -1,4 +1,10 @@
+import csv
+import json
+from io import StringIO
+
 from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.shortcuts import reverse
@@ -8,8 +14,11 @@ from django.shortcuts import reverse
 
 from cart.models import Cart, CartItem
 from categories.models import Category
-from orders.models import Address, Order
-from products.models import Product, Discount
+from orders.models import Address, Order, OrderItem, StockReservation
+from orders.services.reservations import stock_changed
+from products.models import Product, Discount, ProductCard, ProductTrend
+from products.services.home_cache import PRODUCT_SECTIONS, get_home_section, get_home_section_versions
+from products.services.product_page import get_product_page_version
 
 
 class OrderViewsTest(TestCase):
@@ -72,6 +81,20 @@ class OrderViewsTest(TestCase):
         self.assertEqual(order.user, self.user)
         self.assertEqual(order.items.count(), 1)
 
+    def test_order_create_records_trending_sales(self):
+        self.client.login(username='test_user124', password='123pass')
+        self.client.post(reverse('checkout-cart'), {
+            'shipping_address':self.address.id,
+            'payment_method':Order.PaymentMethodChoices.CARD,
+            'shipping_method':Order.ShippingMethod.FAST,
+        })
+        # the checkout only buffers the sale, the flush feeds it to the trends
+        self.assertFalse(ProductTrend.objects.exists())
+        call_command('flush_sales_counters', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.trend.sales_24h, 1)
+        self.assertGreater(self.product.trending_score, 0)
+
     def test_order_detail_view_requires_login(self):
         response = self.client.get(reverse('order-detail'))
         self.assertRedirects(response, f'/accounts/login/?next={reverse("order-detail")}')
@@ -92,3 +115,177 @@ class OrderViewsTest(TestCase):
         response = self.client.get(reverse('order-detail'))
         self.assertEqual(response.status_code, 200)
 
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(username='admin', password='123pass')
+        category = Category.objects.create(name='test category', image='test.jpg')
+        self.products = [
+            Product.objects.create(category=category, name=name, main_image='test.jpg', price=price, stock=3)
+            for name, price in (('first', 100), ('second', 250))
+        ]
+        address = Address.objects.create(
+            user=self.admin, full_name='admin', phone='0', city='tehran', postal_code='0', full_address='address')
+        self.orders = []
+        for quantity in (1, 2):
+            order = Order.objects.create(
+                user=self.admin, shipping_address=address, subtotal=350 * quantity, discount_total=0,
+                shipping_total=0, tax_total=0, grand_total=350 * quantity)
+            for product in self.products:
+                OrderItem.objects.create(
+                    order=order, user=self.admin, product=product, quantity=quantity,
+                    total_discount=0, final_price=product.price * quantity)
+            self.orders.append(order)
+
+    def test_admin_action_streams_selected_orders(self):
+        self.client.login(username='admin', password='123pass')
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'export_orders_csv',
+            '_selected_action': [self.orders[1].pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual([(row['order_id'], row['product_name'], row['quantity'], row['final_price']) for row in rows], [
+            (str(self.orders[1].pk), 'first', '2', '200'),
+            (str(self.orders[1].pk), 'second', '2', '500'),
+        ])
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_data', 'orders', '--format', 'jsonl', '--chunk-size', '1', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(row['order_id'], row['product_id'], row['grand_total']) for row in rows], [
+            (order.pk, product.pk, order.grand_total) for order in self.orders for product in self.products
+        ])
+
+        # lines of orders checked out at the same time interleave by pk, the export still groups them
+        first, second = self.orders
+        OrderItem.objects.create(order=first, user=self.admin, product=self.products[0], quantity=5,
+                                 total_discount=0, final_price=500)
+        out = StringIO()
+        call_command('export_data', 'orders', '--format', 'jsonl', '--chunk-size', '1', stdout=out)
+        order_ids = [json.loads(line)['order_id'] for line in out.getvalue().splitlines()]
+        self.assertEqual(order_ids, [first.pk] * 3 + [second.pk] * 2)
+
+        out = StringIO()
+        call_command('export_data', 'products', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([(row['slug'], row['effective_price'], row['stock']) for row in rows], [
+            ('first', '100', '3'), ('second', '250', '3'),
+        ])
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', password='123pass')
+        category = Category.objects.create(name='test category', image='test.jpg')
+        self.product = Product.objects.create(category=category, name='phone', main_image='test.jpg', price=1000, stock=3)
+        self.address = Address.objects.create(
+            user=self.user, full_name='buyer', phone='0', city='tehran', postal_code='0', full_address='address')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.login(username='buyer', password='123pass')
+
+    def checkout(self, quantity):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=quantity)
+        return self.client.post(reverse('checkout-cart'), {
+            'shipping_address': self.address.id,
+            'payment_method': Order.PaymentMethodChoices.CARD,
+            'shipping_method': Order.ShippingMethod.FAST,
+        })
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_checkout_reserves_stock(self):
+        self.checkout(2)
+        order = Order.objects.get()
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(self.product.card.stock, 1)
+        self.assertEqual(list(order.reservations.values_list('product', 'quantity')), [(self.product.pk, 2)])
+
+    def test_checkout_buffers_sales_counts(self):
+        self.checkout(2)
+        self.checkout(1)
+        updated_at = Product.objects.get().updated_at
+        self.assertEqual(self.product.pending_sales.count(), 2)
+        self.assertEqual(self.product.total_sell, 0)
+
+        best_sellers = get_home_section_versions()['best_sell_products']
+        out = StringIO()
+        call_command('flush_sales_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('3 sold units', out.getvalue())
+        # one invalidation for the whole flush, not one per batch or sale
+        self.assertEqual(get_home_section_versions()['best_sell_products'], best_sellers + 1)
+        self.assertAlmostEqual(ProductTrend.objects.get(product=self.product).sales_24h, 3, places=3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_sell, 3)
+        self.assertEqual(self.product.updated_at, updated_at)
+        self.assertFalse(self.product.pending_sales.exists())
+
+    def test_only_visible_stock_changes_refresh_the_tiles(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=13)
+        self.product.card.stock = 13
+        self.product.card.save()
+        versions = get_home_section_versions()
+        for section in PRODUCT_SECTIONS:
+            get_home_section(section, versions[section])
+        page_version = get_product_page_version(self.product.pk)
+
+        Product.objects.filter(pk=self.product.pk).update(stock=12)
+        stock_changed([self.product.pk])
+        self.assertEqual(ProductCard.objects.get(pk=self.product.pk).stock, 13)
+        self.assertEqual(get_home_section_versions(), versions)
+        self.assertEqual(get_product_page_version(self.product.pk), page_version)
+
+        # down to the stock a tile spells out, only the sections listing the product follow
+        Product.objects.filter(pk=self.product.pk).update(stock=10)
+        stock_changed([self.product.pk])
+        self.assertEqual(ProductCard.objects.get(pk=self.product.pk).stock, 10)
+        changed = {section for section, version in get_home_section_versions().items() if version != versions[section]}
+        self.assertEqual(changed, {'newest_products', 'best_sell_products'})
+        self.assertNotEqual(get_product_page_version(self.product.pk), page_version)
+
+    def test_checkout_beyond_stock_is_refused(self):
+        response = self.checkout(4)
+        self.assertRedirects(response, reverse('cart-detail'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(self.product.pending_sales.exists())
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(self.cart.items.count(), 1)
+
+    def test_paying_keeps_and_cancelling_releases_stock(self):
+        self.checkout(2)
+        order = Order.objects.get()
+        order.status = Order.OrderStatus.PAID
+        order.save()
+        self.assertFalse(order.reservations.exists())
+        self.assertEqual(self.stock(), 1)
+
+        self.checkout(1)
+        order = Order.objects.latest('pk')
+        self.assertEqual(self.stock(), 0)
+        order.status = Order.OrderStatus.CANCELLED
+        order.save()
+        self.assertFalse(order.reservations.exists())
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(self.product.card.stock, 1)
+
+    def test_expired_orders_are_released(self):
+        self.checkout(1)
+        self.checkout(1)
+        expired, cancelled = Order.objects.order_by('pk')
+        Order.objects.filter(pk=expired.pk).update(payment_deadline=timezone.now() - timezone.timedelta(minutes=1))
+        Order.objects.filter(pk=cancelled.pk).update(status=Order.OrderStatus.CANCELLED)
+        self.assertEqual(self.stock(), 1)
+
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('2 orders', out.getvalue())
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, Order.OrderStatus.CANCELLED)
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(StockReservation.objects.exists())
@@ -2,10 +2,14 @@ from django.views import generic
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from collections import Counter
 from decimal import Decimal
 
 from cart.models import Cart
+from products.services.sales_counters import record_sales_counts
 from .models import Order, OrderItem, Address
+from .services.reservations import OutOfStock, reserve_stock, stock_changed
 from .forms import OrderForm, AddressForm
 
 
@@ -30,20 +34,32 @@ class OrderCreateView(LoginRequiredMixin, generic.View):
                 obj.tax_total = int(Decimal(obj.subtotal - obj.discount_total) * Decimal(0.12))
                 obj.grand_total = cart.cart_final_price() + obj.shipping_total + obj.tax_total
                 obj.status = Order.OrderStatus.PENDING_PAYMENT
-                obj.save()
 
-                for item in cart.items.all():
-                    OrderItem.objects.create(
-                        order=obj,
-                        user=request.user,
-                        product=item.product,
-                        quantity=item.quantity,
-                        total_discount=item.item_discount(),
-                        final_price=item.item_final_price(),
-                    )
-                    item.product.total_sell += item.quantity
-                    item.product.save()
-                cart.items.all().delete()
+                items = list(cart.items.select_related('product__discount'))
+                quantities = Counter()
+                for item in items:
+                    quantities[item.product_id] += item.quantity
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                        for item in items:
+                            OrderItem.objects.create(
+                                order=obj,
+                                user=request.user,
+                                product=item.product,
+                                quantity=item.quantity,
+                                total_discount=item.item_discount(),
+                                final_price=item.item_final_price(),
+                            )
+                        cart.items.all().delete()
+                        record_sales_counts(quantities)
+                        # last, the stock rows stay locked until the commit
+                        reserve_stock(obj, quantities)
+                except OutOfStock as error:
+                    name = next(item.product.name for item in items if item.product_id == error.product_id)
+                    messages.error(request, f"موجودی {name} کافی نیست")
+                    return redirect('cart-detail')
+                stock_changed(quantities)
             messages.success(request, "!فاکتور شما آماده پرداخت است")
             return redirect('order-detail', obj.id)
         return redirect('home')
@@ -54,9 +70,12 @@ class OrderDetailView(LoginRequiredMixin, generic.DetailView):
     template_name = 'orders/order_detail.html'
     context_object_name = 'order'
 
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user)
+
     def get_object(self, queryset=None):
-        order_obj = get_object_or_404(Order, user=self.request.user, pk=self.kwargs['pk'])
-        if order_obj.time_left == 0 and order_obj.status == Order.OrderStatus.PENDING_PAYMENT:
+        order_obj = get_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
+        if order_obj.time_left() == 0 and order_obj.status == Order.OrderStatus.PENDING_PAYMENT:
             order_obj.status=Order.OrderStatus.CANCELLED
             order_obj.save()
         return order_obj
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
+from core.services.exports import export_actions
 from .models import *
+from .services.exports import export_products
 
 class ProductOptionsInline(admin.TabularInline):
     model = FeatureOption
@@ -48,6 +50,8 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ['name', 'short_description', 'id']
     ordering = ['-created_at', 'stock']
+    # select all matching products to export more than a page
+    actions = export_actions('products', export_products)
 
     inlines = [
         ProductOptionsInline,
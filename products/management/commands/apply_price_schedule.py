@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.services.pricing import apply_due_price_changes, next_price_change
+
+
+class Command(BaseCommand):
+    help = 'Apply discount start/expire price changes that are due, optionally waiting for the next ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and apply every price change at the moment it becomes due.',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=60,
+            help='Longest time in seconds to sleep before looking for newly scheduled changes.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            changed = apply_due_price_changes()
+            if changed:
+                self.stdout.write(f'{timezone.now():%Y-%m-%d %H:%M:%S} {changed} product prices updated.')
+            if not options['watch']:
+                break
+            time.sleep(self.seconds_until_next_change(options['max_sleep']))
+
+    def seconds_until_next_change(self, max_sleep):
+        next_change = next_price_change()
+        if next_change is None:
+            return max_sleep
+        return min(max(0.0, (next_change - timezone.now()).total_seconds()), max_sleep)
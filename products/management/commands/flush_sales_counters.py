@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.services.sales_counters import flush_sales_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Add the sales buffered by the checkouts to the total_sell and trending scores of the products. '
+        'Run it every minute or so, both lag behind the orders until then.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        flushed = flush_sales_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{flushed} sold units added to the product totals.'))
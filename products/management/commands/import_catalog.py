@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.services.catalog_import import CATALOG_READERS, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products with their images, specifications, colors and sizes from a CSV or JSONL file. '
+        'The file is streamed and written in batches, so any size of file imports in constant memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=list(CATALOG_READERS),
+                            help='File format, guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--upsert', action='store_true',
+                            help='Update the products whose slug already exists instead of rejecting them.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in CATALOG_READERS:
+            raise CommandError(f'Unknown format "{file_format}", use --format {"/".join(CATALOG_READERS)}.')
+
+        def progress(report):
+            self.stdout.write(f"{report['created']} created, {report['updated']} updated, {report['failed']} failed")
+
+        # utf-8-sig drops the byte order mark spreadsheet programs put in front of CSV files
+        with open(options['path'], encoding='utf-8-sig', newline='') as catalog_file:
+            report = import_catalog(
+                CATALOG_READERS[file_format](catalog_file),
+                upsert=options['upsert'],
+                batch_size=options['batch_size'],
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+
+        for line, error in report['errors']:
+            self.stderr.write(self.style.ERROR(f'line {line}: {error}'))
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(self.style.ERROR(f"... and {report['failed'] - len(report['errors'])} more."))
+        summary = f"{report['created']} products created, {report['updated']} updated, {report['failed']} failed."
+        self.stdout.write(self.style.WARNING(summary) if report['failed'] else self.style.SUCCESS(summary))
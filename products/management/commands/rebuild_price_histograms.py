@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.services.price_histograms import rebuild_price_histograms
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per category price histograms behind the price slider of the product list.'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_price_histograms()
+        self.stdout.write(self.style.SUCCESS(f'{rebuilt} price histograms rebuilt.'))
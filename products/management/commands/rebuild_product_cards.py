@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.services.product_cards import refresh_product_cards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed product cards used by the listing and home pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        refreshed = refresh_product_cards(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{refreshed} product cards rebuilt.'))
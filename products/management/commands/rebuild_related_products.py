@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.services.related_products import RELATED_PRODUCTS_LIMIT, rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the co-purchased related products of every product from the order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=RELATED_PRODUCTS_LIMIT)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_related_products(top_n=options['top_n'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Related products rebuilt for {rebuilt} products.'))
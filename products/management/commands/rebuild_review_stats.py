@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.services.reviews import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the review stats (approved and recommending reviews) of every product from its comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_review_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Review stats rebuilt for {rebuilt} products.'))
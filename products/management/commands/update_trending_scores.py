@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from products.services.trending import decay_trending_scores, rebuild_trending_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Age the trending sales windows of every product to now. Run it every hour or so '
+        'to keep the scores of products that sold at different times comparable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every score from the recent order history instead of aging the current ones.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuilt = rebuild_trending_scores(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Trending scores rebuilt for {rebuilt} products.'))
+            return
+        decayed = decay_trending_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Trending scores of {decayed} products decayed.'))
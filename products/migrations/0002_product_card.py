@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product', verbose_name='product')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('url', models.CharField(max_length=300, verbose_name='url')),
+                ('thumbnail_url', models.CharField(blank=True, max_length=300, verbose_name='thumbnail url')),
+                ('status', models.CharField(choices=[('a', 'Available'), ('s', 'Coming Soon'), ('na', 'Not Available')], max_length=2, verbose_name='status')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='stock')),
+                ('price', models.PositiveIntegerField(default=0, verbose_name='price')),
+                ('final_price', models.PositiveIntegerField(default=0, verbose_name='final price')),
+                ('discount_percent', models.PositiveSmallIntegerField(default=0, verbose_name='discount percent')),
+                ('has_discount', models.BooleanField(default=False, verbose_name='has discount')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated_at')),
+            ],
+            options={
+                'verbose_name': 'Product card',
+                'verbose_name_plural': 'Product cards',
+            },
+        ),
+    ]
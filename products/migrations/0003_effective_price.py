@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:53
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    now = timezone.now()
+    Product.objects.update(effective_price=models.F('price'))
+    for product in Product.objects.filter(discount__is_active=True).select_related('discount'):
+        discount = product.discount
+        started = discount.start_date is None or discount.start_date <= now
+        running = started and (discount.expire_date is None or discount.expire_date >= now)
+        if running:
+            product.effective_price = int(max(product.price * (1 - discount.value / 100), 0))
+        if not started:
+            product.price_changes_at = discount.start_date
+        elif running and discount.expire_date:
+            product.price_changes_at = discount.expire_date + timezone.timedelta(microseconds=1)
+        product.save(update_fields=['effective_price', 'price_changes_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('products', '0002_product_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Price after the currently running discount, kept up to date automatically.', verbose_name='effective price'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_changes_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='price changes at'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price'], name='product_active_price_idx'),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
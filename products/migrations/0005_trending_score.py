@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_closure'),
+        ('products', '0004_related_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTrend',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='products.product', verbose_name='product')),
+                ('sales_24h', models.FloatField(default=0, verbose_name='sales in 24 hours')),
+                ('sales_7d', models.FloatField(default=0, verbose_name='sales in 7 days')),
+                ('sales_30d', models.FloatField(default=0, verbose_name='sales in 30 days')),
+                ('decayed_at', models.DateTimeField(verbose_name='decayed at')),
+            ],
+            options={
+                'verbose_name': 'Product trend',
+                'verbose_name_plural': 'Product trends',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='trending score'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'trending_score'], name='product_active_trending_idx'),
+        ),
+    ]
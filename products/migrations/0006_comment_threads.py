@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_threads_and_counts(apps, schema_editor):
+    Comment = apps.get_model('products', 'Comment')
+    Product = apps.get_model('products', 'Product')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    for comment_id, parent_id in parents.items():
+        if parent_id is None:
+            continue
+        root = parent_id
+        while parents.get(root) is not None:
+            root = parents[root]
+        Comment.objects.filter(pk=comment_id).update(thread_id=root)
+
+    counts = (Comment.objects.filter(status='aprv', parent__isnull=True, product__isnull=False)
+              .values_list('product').annotate(count=Count('pk')).order_by())
+    for product_id, count in counts:
+        Product.objects.filter(pk=product_id).update(approved_comment_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_trending_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='products.comment'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of approved top-level comments, kept up to date automatically.', verbose_name='approved comments'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', 'parent', 'status', 'created_at'], name='comment_product_thread_idx'),
+        ),
+        migrations.RunPython(fill_threads_and_counts, migrations.RunPython.noop),
+    ]
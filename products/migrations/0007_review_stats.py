@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:09
+
+import django.db.models.deletion
+import math
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def fill_review_stats(apps, schema_editor):
+    Comment = apps.get_model('products', 'Comment')
+    Product = apps.get_model('products', 'Product')
+    ProductReviewStats = apps.get_model('products', 'ProductReviewStats')
+    aggregates = {
+        row['product']: row
+        for row in Comment.objects.filter(status='aprv', parent__isnull=True, product__isnull=False)
+        .values('product')
+        .annotate(approved=Count('pk'), recommending=Count('pk', filter=Q(recommend=True)), last=Max('created_at'))
+        .order_by()
+    }
+    stats = []
+    z = 1.96
+    for product_id in Product.objects.values_list('pk', flat=True):
+        row = aggregates.get(product_id, {})
+        approved, recommending = row.get('approved', 0), row.get('recommending', 0)
+        ratio = recommending / approved if approved else 0
+        satisfaction = 0
+        if approved:
+            spread = z * math.sqrt((ratio * (1 - ratio) + z * z / (4 * approved)) / approved)
+            satisfaction = (ratio + z * z / (2 * approved) - spread) / (1 + z * z / approved)
+        stats.append(ProductReviewStats(
+            product_id=product_id,
+            approved_count=approved,
+            recommend_count=recommending,
+            recommend_ratio=ratio,
+            satisfaction=satisfaction,
+            last_review_at=row.get('last'),
+        ))
+    ProductReviewStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductReviewStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='products.product', verbose_name='product')),
+                ('approved_count', models.PositiveIntegerField(default=0, verbose_name='approved reviews')),
+                ('recommend_count', models.PositiveIntegerField(default=0, verbose_name='recommending reviews')),
+                ('recommend_ratio', models.FloatField(default=0, verbose_name='recommend ratio')),
+                ('satisfaction', models.FloatField(db_index=True, default=0, verbose_name='satisfaction')),
+                ('last_review_at', models.DateTimeField(blank=True, null=True, verbose_name='last review at')),
+            ],
+            options={
+                'verbose_name': 'Product review stats',
+                'verbose_name_plural': 'Product review stats',
+            },
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    apps.get_model('products', 'Discount').objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discount',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated_at'),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
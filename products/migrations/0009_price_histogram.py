@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:27
+
+import django.db.models.deletion
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+# the bucket edges of products.services.price_histograms at the time of this migration
+HISTOGRAM_EDGES = (
+    0, 100_000, 200_000, 500_000,
+    1_000_000, 2_000_000, 5_000_000,
+    10_000_000, 20_000_000, 50_000_000,
+    100_000_000, 200_000_000, 500_000_000,
+    1_000_000_000,
+)
+
+
+def fill_price_histograms(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    PriceHistogram = apps.get_model('products', 'PriceHistogram')
+    CategoryClosure = apps.get_model('categories', 'CategoryClosure')
+    ancestors = defaultdict(list)
+    for ancestor_id, descendant_id in CategoryClosure.objects.values_list('ancestor_id', 'descendant_id'):
+        ancestors[descendant_id].append(ancestor_id)
+
+    histograms = {}
+    for category_id, price in Product.objects.filter(is_active=True).values_list('category_id', 'effective_price').iterator():
+        for scope in [None, *ancestors[category_id]]:
+            histogram = histograms.get(scope)
+            if histogram is None:
+                histogram = histograms[scope] = PriceHistogram(category_id=scope, counts=[0] * len(HISTOGRAM_EDGES))
+            histogram.counts[bisect_right(HISTOGRAM_EDGES, price) - 1] += 1
+            histogram.min_price = price if histogram.min_price is None else min(histogram.min_price, price)
+            histogram.max_price = price if histogram.max_price is None else max(histogram.max_price, price)
+    histograms.setdefault(None, PriceHistogram(counts=[0] * len(HISTOGRAM_EDGES)))
+    PriceHistogram.objects.bulk_create(histograms.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_updated_at'),
+        ('products', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counts', models.JSONField(default=list, verbose_name='counts')),
+                ('min_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='min price')),
+                ('max_price', models.PositiveIntegerField(blank=True, null=True, verbose_name='max price')),
+                ('category', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_histogram', to='categories.category', verbose_name='category')),
+            ],
+            options={
+                'verbose_name': 'Price histogram',
+                'verbose_name_plural': 'Price histograms',
+            },
+        ),
+        migrations.RunPython(fill_price_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_price_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='quantity')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='pending_sales', to='products.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'Sales count',
+                'verbose_name_plural': 'Sales counts',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.urls import reverse
+
+
+def fill_product_cards(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductCard = apps.get_model('products', 'ProductCard')
+    cards = []
+    for product in Product.objects.filter(card__isnull=True).select_related('discount').iterator(chunk_size=500):
+        has_discount = product.effective_price < product.price
+        cards.append(ProductCard(
+            product=product,
+            name=product.name,
+            url=reverse('product-detail', args=[product.slug]),
+            thumbnail_url=product.main_image.url if product.main_image else '',
+            status=product.status,
+            stock=product.stock,
+            price=product.price,
+            final_price=product.effective_price,
+            discount_percent=int(product.discount.value) if has_discount else 0,
+            has_discount=has_discount,
+        ))
+        if len(cards) >= 500:
+            ProductCard.objects.bulk_create(cards)
+            cards = []
+    ProductCard.objects.bulk_create(cards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_sales_count'),
+    ]
+
+    operations = [
+        # cards only appear for products saved after 0002_product_card, build the missing ones
+        migrations.RunPython(fill_product_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:51
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def drop_duplicate_catalog_histograms(apps, schema_editor):
+    # concurrent saves could each create the catalog row before the constraint,
+    # the counts of the one kept are fixed by the rebuild_price_histograms command
+    PriceHistogram = apps.get_model('products', 'PriceHistogram')
+    first = PriceHistogram.objects.filter(category__isnull=True).order_by('pk').first()
+    if first:
+        PriceHistogram.objects.filter(category__isnull=True).exclude(pk=first.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_updated_at'),
+        ('products', '0011_fill_product_cards'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_catalog_histograms, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pricehistogram',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('category', 0), name='price_histogram_unique_scope'),
+        ),
+    ]
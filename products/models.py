@@ -1,12 +1,13 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.utils.text import gettext_lazy as _, slugify
 from django.shortcuts import reverse
 
-from categories.models import Category, Brand
+from categories.models import Category, Brand, CategoryClosure
 
 class ProductManager(models.Manager):
     def active(self):
@@ -16,32 +17,26 @@ class ProductManager(models.Manager):
         return self.active().order_by('-created_at').select_related('discount')
 
     def with_discount(self):
-        now = timezone.now()
-        return self.active().filter(
-            Q(discount__start_date__lte=now) | Q(discount__start_date__isnull=True),
-            Q(discount__expire_date__gte=now) | Q(discount__expire_date__isnull=True),
-            discount__is_active=True,
-        ).select_related('discount').order_by('-discount__value')
+        # effective_price only drops below price while the discount is running
+        return self.active().filter(effective_price__lt=F('price'))\
+            .select_related('discount').order_by('-discount__value')
 
     def by_category(self, category_slug):
-
-        return self.active().filter(Q(category__slug=category_slug) | Q(category__parent__slug=category_slug))\
-            .select_related('category')
+        return self.active().filter(category__in=CategoryClosure.objects.filter(
+            ancestor__slug=category_slug).values('descendant')).select_related('category')
 
     def by_brand(self, brand_slug):
         return self.active().filter(brand__slug=brand_slug)
 
     def search(self, query):
-        return self.active().filter(
-            Q(name__icontains=query) |
-            Q(short_description__icontains=query) | Q(description__icontains=query)
-        )
+        from search.backends import get_backend
+        return get_backend().filter(self.active(), query).order_by('-search_rank', '-created_at')
 
     def most_expensive(self):
-        return self.active().order_by('-price')
+        return self.active().order_by('-effective_price')
 
     def cheapest(self):
-        return self.active().order_by('price')
+        return self.active().order_by('effective_price')
 
 
 class FeatureOption(models.Model):
@@ -190,6 +185,19 @@ class Product(models.Model):
     short_description = models.CharField(_('short description'),max_length=155)
     description = models.TextField(_('description'))
     price = models.PositiveIntegerField(_('price'), default=0)
+    effective_price = models.PositiveIntegerField(
+        _('effective price'),
+        default=0,
+        editable=False,
+        help_text=_('Price after the currently running discount, kept up to date automatically.'),
+    )
+    price_changes_at = models.DateTimeField(
+        _('price changes at'),
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     discount = models.OneToOneField(
         'Discount',
         on_delete=models.SET_NULL,
@@ -200,6 +208,13 @@ class Product(models.Model):
     )
     stock = models.PositiveIntegerField(_('stock'), default=0)
     total_sell = models.PositiveIntegerField(_('total_sell'), default=0)
+    trending_score = models.FloatField(_('trending score'), default=0, editable=False)
+    approved_comment_count = models.PositiveIntegerField(
+        _('approved comments'),
+        default=0,
+        editable=False,
+        help_text=_('Number of approved top-level comments, kept up to date automatically.'),
+    )
     status = models.CharField(
         _('status'),
         max_length=2,
@@ -210,13 +225,51 @@ class Product(models.Model):
     created_at = models.DateTimeField(_('created_at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated_at'), auto_now=True)
 
+    # what places a product in the price histograms
+    PRICE_HISTOGRAM_FIELDS = ('category_id', 'effective_price', 'is_active')
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored values, so a save can move the product between price histogram buckets
+        instance._loaded_values = {
+            field: value for field, value in zip(field_names, values) if field in cls.PRICE_HISTOGRAM_FIELDS
+        }
+        return instance
+
+    def _load_price_histogram_values(self):
+        """Read the stored histogram fields of a product loaded without them, e.g. with .only()."""
+        if self._state.adding or set(self.PRICE_HISTOGRAM_FIELDS) <= getattr(self, '_loaded_values', {}).keys():
+            return
+        self._loaded_values = Product.objects.filter(pk=self.pk).values(*self.PRICE_HISTOGRAM_FIELDS).first()
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name, allow_unicode=True)
+        self.update_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount'}.intersection(update_fields):
+            kwargs['update_fields'] = update_fields = {*update_fields, 'effective_price', 'price_changes_at'}
+        if update_fields is None or {'category', 'category_id', 'is_active', 'effective_price'}.intersection(update_fields):
+            self._load_price_histogram_values()
         super().save(*args, **kwargs)
+        self._loaded_values = {field: getattr(self, field) for field in self.PRICE_HISTOGRAM_FIELDS}
+
+    def delete(self, *args, **kwargs):
+        self._load_price_histogram_values()
+        return super().delete(*args, **kwargs)
+
+    def update_effective_price(self, now=None):
+        now = now or timezone.now()
+        discount = self.discount
+        if discount and discount.is_valid(now):
+            self.effective_price = int(discount.apply_discount(self.price, now))
+        else:
+            self.effective_price = self.price
+        self.price_changes_at = discount.next_change(now) if discount else None
 
     def get_final_price(self):
         if self.has_valid_discount():
@@ -231,29 +284,218 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'effective_price'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'trending_score'], name='product_active_trending_idx'),
+        ]
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
 
     objects = ProductManager()
 
 
+class ProductCard(models.Model):
+    """
+    Flat, precomputed projection of a product tile for the listing and home pages.
+    Kept in sync by the signals in products/signals.py.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+        verbose_name=_('product'),
+    )
+    name = models.CharField(_('name'), max_length=255)
+    url = models.CharField(_('url'), max_length=300)
+    thumbnail_url = models.CharField(_('thumbnail url'), max_length=300, blank=True)
+    status = models.CharField(_('status'), max_length=2, choices=Product.ProductStatus.choices)
+    stock = models.PositiveIntegerField(_('stock'), default=0)
+    price = models.PositiveIntegerField(_('price'), default=0)
+    final_price = models.PositiveIntegerField(_('final price'), default=0)
+    discount_percent = models.PositiveSmallIntegerField(_('discount percent'), default=0)
+    has_discount = models.BooleanField(_('has discount'), default=False)
+    updated_at = models.DateTimeField(_('updated_at'), auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _("Product card")
+        verbose_name_plural = _("Product cards")
+
+
+class ProductTrend(models.Model):
+    """
+    Exponentially decayed sales of a product over the trending windows, as of `decayed_at`.
+    Fed by the flush_sales_counters command and aged by the update_trending_scores command.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name=_('product'),
+    )
+    sales_24h = models.FloatField(_('sales in 24 hours'), default=0)
+    sales_7d = models.FloatField(_('sales in 7 days'), default=0)
+    sales_30d = models.FloatField(_('sales in 30 days'), default=0)
+    decayed_at = models.DateTimeField(_('decayed at'))
+
+    def __str__(self):
+        return f'{self.product_id}: {self.sales_24h:.2f} / {self.sales_7d:.2f} / {self.sales_30d:.2f}'
+
+    class Meta:
+        verbose_name = _("Product trend")
+        verbose_name_plural = _("Product trends")
+
+
+class SalesCount(models.Model):
+    """
+    Units of a product sold and not yet added to its total_sell. Checkouts only append these
+    rows, the flush_sales_counters command folds them into the products.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        # a foreign key check would share lock the product row these rows keep checkouts off
+        db_constraint=False,
+        related_name='pending_sales',
+        verbose_name=_('product'),
+    )
+    quantity = models.PositiveIntegerField(_('quantity'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.product_id}: +{self.quantity}'
+
+    class Meta:
+        verbose_name = _("Sales count")
+        verbose_name_plural = _("Sales counts")
+
+
+class ProductReviewStats(models.Model):
+    """
+    Aggregates of the approved top-level comments of a product, updated by the difference
+    every comment save makes and rebuilt from scratch by the rebuild_review_stats command.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='review_stats',
+        verbose_name=_('product'),
+    )
+    approved_count = models.PositiveIntegerField(_('approved reviews'), default=0)
+    recommend_count = models.PositiveIntegerField(_('recommending reviews'), default=0)
+    recommend_ratio = models.FloatField(_('recommend ratio'), default=0)
+    # lower bound of the recommend ratio, so a few reviews don't outrank many good ones
+    satisfaction = models.FloatField(_('satisfaction'), default=0, db_index=True)
+    last_review_at = models.DateTimeField(_('last review at'), null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.product_id}: {self.recommend_count}/{self.approved_count}'
+
+    @property
+    def recommend_percent(self):
+        return round(self.recommend_ratio * 100)
+
+    class Meta:
+        verbose_name = _("Product review stats")
+        verbose_name_plural = _("Product review stats")
+
+
+class PriceHistogram(models.Model):
+    """
+    Active products per effective price bucket of a category and everything under it,
+    or of the whole catalog for the row without a category. Kept up to date by the
+    difference every product change makes, rebuilt by the rebuild_price_histograms command.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='price_histogram',
+        verbose_name=_('category'),
+    )
+    # product count of every bucket of products.services.price_histograms.HISTOGRAM_EDGES
+    counts = models.JSONField(_('counts'), default=list)
+    min_price = models.PositiveIntegerField(_('min price'), null=True, blank=True)
+    max_price = models.PositiveIntegerField(_('max price'), null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.category_id or "all"}: {self.min_price} - {self.max_price}'
+
+    class Meta:
+        constraints = [
+            # a single row for the whole catalog, the unique category allows any number of NULLs
+            models.UniqueConstraint(Coalesce('category', 0), name='price_histogram_unique_scope'),
+        ]
+        verbose_name = _("Price histogram")
+        verbose_name_plural = _("Price histograms")
+
+
+class RelatedProduct(models.Model):
+    """
+    Top co-purchased products of a product, rebuilt offline from the order history
+    by the rebuild_related_products command.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_entries',
+        verbose_name=_('product'),
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='neighbour_of',
+        verbose_name=_('related product'),
+    )
+    rank = models.PositiveSmallIntegerField(_('rank'))
+    score = models.FloatField(_('score'))
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id}'
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ('product', 'rank')
+        verbose_name = _("Related product")
+        verbose_name_plural = _("Related products")
+
+
 class Discount(models.Model):
     value = models.DecimalField(_("value"), max_digits=5, decimal_places=2)
     is_active = models.BooleanField(_("is active"), default=True)
     start_date = models.DateTimeField(_("start date"), null=True, blank=True)
     expire_date = models.DateTimeField(_("expire date"), null=True, blank=True)
     created_at = models.DateTimeField(_("created_at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated_at"), auto_now=True)
 
     def __str__(self):
         status = "Active" if self.is_valid() else "InActive"
         return f"{self.value}% ({status})"
 
-    def is_valid(self):
-        now = timezone.now()
+    def is_valid(self, now=None):
+        now = now or timezone.now()
         return self.is_active and (self.start_date is None or self.start_date <= now) and (self.expire_date is None or self.expire_date >= now)
 
-    def apply_discount(self, price):
-        if not self.is_valid():
+    def next_change(self, now=None):
+        """The next moment this discount starts or stops applying, None if it never will."""
+        now = now or timezone.now()
+        if not self.is_active:
+            return None
+        if self.start_date and self.start_date > now:
+            return self.start_date
+        if self.expire_date and self.expire_date >= now:
+            # is_valid() still holds at expire_date itself
+            return self.expire_date + timezone.timedelta(microseconds=1)
+        return None
+
+    def apply_discount(self, price, now=None):
+        if not self.is_valid(now):
             return price
         return max(price * (1 - self.value / 100), 0)
 
@@ -274,6 +516,8 @@ class Comment(models.Model):
         REJECTED = 'rjk', _('rejected')
 
     parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='replies', null=True, blank=True)
+    # the top-level comment of the thread, so a whole thread is loaded in one query
+    thread = models.ForeignKey('self', on_delete=models.CASCADE, related_name='thread_comments', null=True, blank=True, editable=False)
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='user_comments', null=True, blank=True)
     display_name = models.CharField(max_length=55)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_comments', null=True, blank=True)
@@ -285,5 +529,44 @@ class Comment(models.Model):
 
     objects = CommentManager()
 
+    # fields that decide what a comment adds to the review stats of its product
+    REVIEW_FIELDS = ('product_id', 'parent_id', 'status', 'recommend')
+
     def __str__(self):
         return f"comment by: {self.display_name} on {self.product} - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored values, so a save can update the review stats by what it changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        old_thread_id = self.thread_id
+        self.thread_id = (self.parent.thread_id or self.parent_id) if self.parent_id else None
+        moved = not self._state.adding and old_thread_id != self.thread_id
+        if moved:
+            descendants = self._descendant_ids(old_thread_id)
+        super().save(*args, **kwargs)
+        self._loaded_values = {field: getattr(self, field) for field in self.REVIEW_FIELDS}
+        if moved and descendants:
+            # the replies under a moved comment follow it to its new thread
+            Comment.objects.filter(pk__in=descendants).update(thread_id=self.thread_id or self.pk)
+
+    def _descendant_ids(self, thread_id):
+        """The ids of the replies nested under this comment, all of which sit in its (old) thread."""
+        children = {}
+        for pk, parent_id in Comment.objects.filter(thread_id=thread_id or self.pk).values_list('pk', 'parent_id'):
+            children.setdefault(parent_id, []).append(pk)
+        descendants, pending = [], [self.pk]
+        while pending:
+            replies = children.get(pending.pop(), [])
+            descendants.extend(replies)
+            pending.extend(replies)
+        return descendants
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'parent', 'status', 'created_at'], name='comment_product_thread_idx'),
+        ]
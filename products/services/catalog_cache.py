@@ -0,0 +1,34 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def get_catalog_version():
+    """
+    Version number of the catalog, part of the key of every cached catalog read.
+    Bumping it makes all of them stale at once without having to know their keys.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # start from the clock so a version evicted from the cache is never reused
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def catalog_cache_key(prefix, params=()):
+    """Cache key of a catalog read for the given (name, value) pairs, bound to the catalog version."""
+    digest = hashlib.md5(urlencode(sorted(params)).encode()).hexdigest()
+    return f'{prefix}:{get_catalog_version()}:{digest}'
@@ -0,0 +1,262 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from categories.models import Category, Brand
+from search.backends import get_backend as get_search_backend
+from search.suggestions import invalidate_suggestions
+from ..models import Product, ProductImage, ProductSpecification, FeatureOption, ProductReviewStats
+from .catalog_cache import bump_catalog_version
+from .home_cache import invalidate_home_sections, PRODUCT_SECTIONS
+from .price_histograms import update_price_histograms
+from .product_cards import refresh_product_cards
+from .product_page import invalidate_product_pages, forget_missing_product
+
+
+# product columns copied as they are, the model fields convert and validate them
+PRODUCT_FIELDS = ['name', 'short_description', 'description', 'price', 'stock', 'status', 'is_active', 'main_image']
+# columns holding the related rows of a product, present ones replace the existing rows
+RELATED_COLUMNS = ['images', 'specifications', 'colors', 'sizes']
+# only the first errors are kept in the report, the others are just counted
+MAX_REPORTED_ERRORS = 100
+
+
+def _split(value):
+    return [item.strip() for item in value.split('|') if item.strip()]
+
+
+def read_csv(file):
+    """
+    (line, row) of a CSV file with a header. images, colors and sizes are `|` separated lists,
+    specifications `|` separated key=value pairs.
+    """
+    reader = csv.DictReader(file)
+    for row in reader:
+        for column in ('images', 'colors', 'sizes'):
+            if column in row:
+                row[column] = _split(row[column] or '')
+        if 'specifications' in row:
+            row['specifications'] = dict(
+                (key.strip(), value.strip()) for key, _sep, value in
+                (item.partition('=') for item in _split(row['specifications'] or ''))
+            )
+        yield reader.line_num, row
+
+
+def read_jsonl(file):
+    """(line, row) of a file with one JSON object per line, rows that don't parse are ValidationErrors."""
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as error:
+            row = ValidationError(f'Invalid JSON: {error}')
+        if not isinstance(row, (dict, ValidationError)):
+            row = ValidationError('Every line must be a JSON object.')
+        yield line, row
+
+
+CATALOG_READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def describe_error(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+class _Lookup:
+    """slug -> pk of the categories or brands of the file, fetched once per new batch of slugs."""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def load(self, slugs):
+        missing = set(slugs) - self.ids.keys()
+        if missing:
+            self.ids.update(dict.fromkeys(missing))
+            self.ids.update(self.model.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+
+    def __getitem__(self, slug):
+        pk = self.ids.get(slug)
+        if pk is None:
+            raise ValidationError({self.model._meta.model_name: f'Unknown {self.model._meta.model_name} "{slug}".'})
+        return pk
+
+
+def _related_rows(row):
+    """{column: unsaved related objects} of the related columns present in the row."""
+    related = {}
+    if 'images' in row:
+        if not isinstance(row['images'], list):
+            raise ValidationError({'images': 'Must be a list.'})
+        related['images'] = [ProductImage(image=name) for name in row['images']]
+    if 'specifications' in row:
+        if not isinstance(row['specifications'], dict):
+            raise ValidationError({'specifications': 'Must be an object.'})
+        related['specifications'] = [
+            ProductSpecification(key=key, value=value) for key, value in row['specifications'].items()
+        ]
+    for column, feature, field in (('colors', FeatureOption.Feature.Color, 'color'),
+                                   ('sizes', FeatureOption.Feature.Size, 'value')):
+        if column in row:
+            if not isinstance(row[column], list):
+                raise ValidationError({column: 'Must be a list.'})
+            related[column] = [FeatureOption(feature=feature, **{field: value}) for value in row[column]]
+    for objects in related.values():
+        for obj in objects:
+            obj.clean_fields(exclude=['product'])
+            obj.clean()
+    return related
+
+
+class CatalogImporter:
+    """
+    Writes the products of a stream of rows in batches, each with one bulk insert, one bulk
+    update and one bulk replace per related table inside a transaction. Products are matched
+    on their slug, existing ones are only updated with `upsert`. Bulk writes skip the model
+    signals, so the cards, search entries and caches they maintain are refreshed per batch.
+    """
+
+    def __init__(self, upsert=False, batch_size=1000):
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.categories = _Lookup(Category)
+        self.brands = _Lookup(Brand)
+        self.report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def run(self, rows, progress=None):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+            if progress:
+                progress(self.report)
+        if self.report['created'] or self.report['updated']:
+            bump_catalog_version()
+            invalidate_home_sections(*PRODUCT_SECTIONS)
+            invalidate_suggestions()
+        return self.report
+
+    def fail(self, line, error):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append((line, describe_error(error)))
+
+    def import_batch(self, batch):
+        parsed = []
+        for line, row in batch:
+            if isinstance(row, ValidationError):
+                self.fail(line, row)
+                continue
+            slug = str(row.get('slug') or '').strip() or slugify(str(row.get('name') or ''), allow_unicode=True)
+            parsed.append((line, row, slug))
+        existing = {
+            product.slug: product
+            for product in Product.objects.filter(slug__in=[slug for _line, _row, slug in parsed])
+            .select_related('discount')
+        }
+        self.categories.load(row['category'] for _line, row, _slug in parsed if row.get('category'))
+        self.brands.load(row['brand'] for _line, row, _slug in parsed if row.get('brand'))
+
+        now = timezone.now()
+        created, updated, related, update_fields = [], [], {}, set()
+        for line, row, slug in parsed:
+            try:
+                product, changed = self.build_product(row, slug, existing, related, now)
+                related[slug] = _related_rows(row)
+            except ValidationError as error:
+                self.fail(line, error)
+                continue
+            if product.pk:
+                updated.append(product)
+                update_fields.update(changed)
+            else:
+                created.append(product)
+        if created or updated:
+            self.write(created, updated, update_fields, related)
+
+    def build_product(self, row, slug, existing, seen, now):
+        """The product of a row, new or existing, with the row applied and validated."""
+        if not slug:
+            raise ValidationError({'slug': 'A slug or a name is required.'})
+        if slug in seen:
+            raise ValidationError({'slug': f'"{slug}" appears more than once in the same batch.'})
+        product = existing.get(slug)
+        if product is not None and not self.upsert:
+            raise ValidationError({'slug': f'A product with the slug "{slug}" already exists.'})
+        if product is None:
+            product = Product(slug=slug)
+
+        # empty cells leave the field as it is
+        changed = {field for field in PRODUCT_FIELDS if row.get(field) not in (None, '')}
+        for field in changed:
+            setattr(product, field, row[field])
+        if row.get('category'):
+            product.category_id = self.categories[row['category']]
+            changed.add('category')
+        elif product.category_id is None:
+            raise ValidationError({'category': 'This field is required.'})
+        if 'brand' in row:
+            product.brand_id = self.brands[row['brand']] if row['brand'] else None
+            changed.add('brand')
+        # foreign keys were resolved above, the per row existence queries are not needed
+        product.clean_fields(exclude=['category', 'brand', 'discount'])
+        product.update_effective_price(now)
+        product.updated_at = now
+        return product, changed
+
+    @transaction.atomic
+    def write(self, created, updated, update_fields, related):
+        Product.objects.bulk_create(created)
+        if updated:
+            Product.objects.bulk_update(
+                updated,
+                [*sorted(update_fields), 'effective_price', 'price_changes_at', 'updated_at'],
+            )
+        # bulk_create doesn't set primary keys on every backend
+        ids = dict(Product.objects.filter(slug__in=related).values_list('slug', 'pk'))
+        new_ids = [ids[product.slug] for product in created]
+
+        self.replace_related(ids, related, 'images', ProductImage)
+        self.replace_related(ids, related, 'specifications', ProductSpecification)
+        self.replace_related(ids, related, 'colors', FeatureOption, feature=FeatureOption.Feature.Color)
+        self.replace_related(ids, related, 'sizes', FeatureOption, feature=FeatureOption.Feature.Size)
+        ProductReviewStats.objects.bulk_create(
+            [ProductReviewStats(product_id=pk) for pk in new_ids], ignore_conflicts=True)
+        update_price_histograms(created, created=True)
+        update_price_histograms(updated)
+
+        products = Product.objects.filter(pk__in=ids.values())
+        refresh_product_cards(products, batch_size=self.batch_size)
+        get_search_backend().index_products(products.select_related('brand'))
+        invalidate_product_pages(ids.values())
+        for product in created:
+            forget_missing_product(product.slug)
+
+        self.report['created'] += len(created)
+        self.report['updated'] += len(updated)
+
+    @staticmethod
+    def replace_related(ids, related, column, model, **filters):
+        replaced = {slug: rows[column] for slug, rows in related.items() if column in rows}
+        if not replaced:
+            return
+        model.objects.filter(product_id__in=[ids[slug] for slug in replaced], **filters).delete()
+        objects = []
+        for slug, rows in replaced.items():
+            for obj in rows:
+                obj.product_id = ids[slug]
+                objects.append(obj)
+        model.objects.bulk_create(objects)
+
+
+def import_catalog(rows, upsert=False, batch_size=1000, progress=None):
+    """Import (line, row) pairs as read by one of CATALOG_READERS. Returns the report."""
+    return CatalogImporter(upsert, batch_size).run(rows, progress)
@@ -0,0 +1,91 @@
+import math
+from collections import defaultdict
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ..models import Product, Comment
+
+
+COMMENTS_PER_PAGE = 10
+
+
+class CommentPage:
+    """
+    One page of top-level comments, each with its whole thread in `thread_replies`.
+    Plain data, so it can be cached along with the product page.
+    """
+
+    def __init__(self, object_list, number, total, per_page=COMMENTS_PER_PAGE):
+        self.object_list = object_list
+        self.number = number
+        self.total = total
+        self.num_pages = max(math.ceil(total / per_page), 1)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.number < self.num_pages
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def comments_queryset(product):
+    return (Comment.objects.active()
+            .filter(product=product, parent__isnull=True)
+            .select_related('user')
+            .order_by('-created_at', '-id'))
+
+
+def replies_queryset(comments):
+    """Replies at any depth to the given top level comments, oldest first."""
+    return (Comment.objects.active()
+            .filter(thread__in=comments)
+            .select_related('user')
+            .order_by('created_at', 'id'))
+
+
+def load_comment_page(product, number=1, per_page=COMMENTS_PER_PAGE):
+    """
+    The approved comments of a product on the given page with their replies at any depth,
+    in two queries whatever the size of the threads.
+    """
+    total = product.approved_comment_count
+    number = min(max(number, 1), max(math.ceil(total / per_page), 1))
+    start = (number - 1) * per_page
+    comments = list(comments_queryset(product)[start:start + per_page])
+
+    threads = defaultdict(list)
+    if comments:
+        for reply in replies_queryset(comments):
+            threads[reply.thread_id].append(reply)
+    for comment in comments:
+        comment.thread_replies = threads[comment.pk]
+    return CommentPage(comments, number, total, per_page)
+
+
+def refresh_comment_counts(product_ids):
+    approved = (Comment.objects.active()
+                .filter(product=OuterRef('pk'), parent__isnull=True)
+                .order_by()
+                .values('product')
+                .annotate(count=Count('pk'))
+                .values('count'))
+    Product.objects.filter(pk__in=product_ids).update(approved_comment_count=Coalesce(Subquery(approved), 0))
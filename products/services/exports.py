@@ -0,0 +1,24 @@
+from core.services.exports import EXPORT_CHUNK_SIZE, chunked_values
+
+
+# column: lookup
+PRODUCT_EXPORT_COLUMNS = {
+    'id': 'pk',
+    'slug': 'slug',
+    'name': 'name',
+    'category': 'category__slug',
+    'brand': 'brand__slug',
+    'price': 'price',
+    'effective_price': 'effective_price',
+    'stock': 'stock',
+    'status': 'status',
+    'is_active': 'is_active',
+    'total_sell': 'total_sell',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+def export_products(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """(columns, rows) of the products of the queryset, the rows are fetched lazily."""
+    return list(PRODUCT_EXPORT_COLUMNS), chunked_values(queryset, PRODUCT_EXPORT_COLUMNS.values(), chunk_size)
@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from categories.models import Category
+from ..models import Product, FeatureOption
+from .catalog_cache import catalog_cache_key
+
+
+FACETS_CACHE_TIMEOUT = 60 * 10
+
+# query string parameters of the product list that change the facet counts
+FILTER_PARAMS = (
+    'q',
+    'min_price',
+    'max_price',
+    'category_slug',
+    'brand_slug',
+    'available',
+    'special',
+    'color',
+    'size',
+)
+# sorts of the product list that also filter it, e.g. down to the discounted products
+FILTERING_SORTS = ('discounted',)
+
+# (min, max) in toman, max is exclusive and None means no upper bound
+PRICE_BUCKETS = (
+    (0, 1_000_000),
+    (1_000_000, 5_000_000),
+    (5_000_000, 20_000_000),
+    (20_000_000, 50_000_000),
+    (50_000_000, None),
+)
+
+
+def active_filters(params):
+    filters = [(name, params.get(name)) for name in FILTER_PARAMS if params.get(name)]
+    if params.get('sort_query') in FILTERING_SORTS:
+        filters.append(('sort_query', params.get('sort_query')))
+    return filters
+
+
+def get_product_facets(queryset, params):
+    """
+    Counts of the products in `queryset` per category, brand, color, size and price bucket.
+    Served from the cache for the same filters until the catalog changes.
+    """
+    key = catalog_cache_key('product_facets', active_filters(params))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_product_facets(queryset)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def compute_product_facets(queryset):
+    products = Product.objects.filter(pk__in=queryset.order_by().values('pk')).order_by()
+    return {
+        'categories': _category_facet(products),
+        'brands': _brand_facet(products),
+        **_feature_facets(products),
+        'prices': _price_facet(products),
+    }
+
+
+def _category_facet(products):
+    counts = dict(products.values_list('category').annotate(count=Count('pk')))
+    categories = list(Category.objects.values('id', 'parent_id', 'name', 'slug').order_by('name'))
+    parents = {category['id']: category['parent_id'] for category in categories}
+
+    # a product in a child category also counts for its parents
+    totals = {}
+    for category_id, count in counts.items():
+        while category_id is not None:
+            totals[category_id] = totals.get(category_id, 0) + count
+            category_id = parents.get(category_id)
+
+    return [
+        {'slug': category['slug'], 'name': category['name'], 'count': totals.get(category['id'], 0)}
+        for category in categories if category['parent_id'] is None
+    ]
+
+
+def _brand_facet(products):
+    return list(
+        products.filter(brand__isnull=False)
+        .values('brand__slug', 'brand__name')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'brand__name')
+    )
+
+
+def _feature_facets(products):
+    options = (FeatureOption.objects.filter(product__in=products)
+               .values('feature', 'color', 'value')
+               .annotate(count=Count('product', distinct=True))
+               .order_by('-count'))
+    colors, sizes = [], []
+    color_names = dict(FeatureOption.Color.choices)
+    for option in options:
+        if option['feature'] == FeatureOption.Feature.Color:
+            colors.append({
+                'code': option['color'],
+                'name': color_names.get(option['color'], option['color']),
+                'count': option['count'],
+            })
+        else:
+            sizes.append({'value': option['value'], 'count': option['count']})
+    return {'colors': colors, 'sizes': sizes}
+
+
+def _price_facet(products):
+    aggregates = {}
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(effective_price__gte=low)
+        if high is not None:
+            condition &= Q(effective_price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('pk', filter=condition)
+    counts = products.aggregate(**aggregates)
+    return [
+        {'min': low, 'max': high, 'count': counts[f'bucket_{index}']}
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
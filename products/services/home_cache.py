@@ -0,0 +1,85 @@
+import time
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from categories.models import Category
+from core.models import SiteSettings, SliderBanners, SideBanners, MiddleBanners
+from ..models import Product
+from .product_cards import with_cards
+
+
+HOME_CACHE_TIMEOUT = 60 * 15
+
+# each section of the home page is loaded, cached and invalidated on its own
+HOME_SECTIONS = {
+    'discounted_products': lambda: list(with_cards(Product.objects.with_discount())[:20]),
+    'newest_products': lambda: list(with_cards(Product.objects.newest())[:20]),
+    'best_sell_products': lambda: list(with_cards(Product.objects.active().order_by('-trending_score'))[:20]),
+    'top_categories': lambda: list(Category.objects.filter(parent__isnull=True)[:6]),
+    'site_settings': lambda: SiteSettings.objects.first(),
+    'slider_banners': lambda: list(SliderBanners.objects.all()),
+    'side_banners': lambda: list(SideBanners.objects.all()),
+    'middle_banners': lambda: list(MiddleBanners.objects.all()),
+}
+
+PRODUCT_SECTIONS = ('discounted_products', 'newest_products', 'best_sell_products')
+
+
+def _version_key(section):
+    return f'home_section_version:{section}'
+
+
+def get_home_section_versions():
+    """Current version of every home section, fetched with a single cache round trip."""
+    keys = {section: _version_key(section) for section in HOME_SECTIONS}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for section, key in keys.items():
+        if key not in found:
+            cache.add(key, int(time.time() * 1000), None)
+            found[key] = cache.get(key)
+        versions[section] = found[key]
+    return versions
+
+
+def invalidate_home_sections(*sections):
+    for section in sections:
+        try:
+            cache.incr(_version_key(section))
+        except ValueError:
+            pass
+
+
+def _section_key(section, version):
+    return f'home_section:{section}:{version}'
+
+
+def sections_showing(product_ids, sections=PRODUCT_SECTIONS):
+    """
+    The sections that list any of the products. A section whose data left the cache may
+    still live on in a rendered fragment, so it counts as showing them.
+    """
+    versions = get_home_section_versions()
+    keys = {_section_key(section, versions[section]): section for section in sections}
+    found = cache.get_many(keys)
+    product_ids = set(product_ids)
+    return [
+        section for key, section in keys.items()
+        if key not in found or any(product.pk in product_ids for product in found[key][0])
+    ]
+
+
+def get_home_section(section, version):
+    key = _section_key(section, version)
+    cached = cache.get(key)
+    if cached is None:
+        # wrapped in a tuple so an empty section (e.g. no site settings) is cached too
+        cached = (HOME_SECTIONS[section](),)
+        cache.set(key, cached, HOME_CACHE_TIMEOUT)
+    return cached[0]
+
+
+def lazy_home_section(section, version):
+    """The section data, only looked up if the template renders it (not a fragment cache hit)."""
+    return SimpleLazyObject(lambda: get_home_section(section, version))
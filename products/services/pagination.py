@@ -0,0 +1,131 @@
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+
+from .catalog_cache import catalog_cache_key
+from .facets import active_filters
+
+
+COUNT_CACHE_TIMEOUT = 60 * 10
+CURSOR_SALT = 'products.keyset-cursor'
+
+
+class KeysetPage:
+    """
+    One page of a keyset paginated queryset, iterable like a Django Page.
+    `total` is the cached, possibly slightly stale, number of matching products.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _nullable(model, path):
+    """Whether the field at the end of the lookup path can be NULL, e.g. across a reverse relation."""
+    for name in path.split(LOOKUP_SEP):
+        field = model._meta.get_field(name)
+        if field.null or not field.concrete:
+            return True
+        model = field.related_model
+    return False
+
+
+class KeysetPaginator:
+    """
+    Paginates on (sort field, id) instead of OFFSET, so every page costs the same
+    and no COUNT(*) runs per request.
+
+    Only querysets ordered by a single field that is never NULL can be paginated this way
+    (a NULL compares to nothing and would drop out of the pages); `supported` tells the
+    caller when to fall back to the regular paginator (e.g. relevance ordering).
+    """
+
+    def __init__(self, queryset, per_page, params=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.params = params or {}
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        self.supported = (
+            len(ordering) == 1
+            and ordering[0].lstrip('-') not in queryset.query.annotations
+            and not _nullable(queryset.model, ordering[0].lstrip('-'))
+        )
+        if self.supported:
+            self.descending = ordering[0].startswith('-')
+            self.field = ordering[0].lstrip('-')
+
+    def page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        backwards = bool(position and position[0] == 'prev')
+
+        queryset = self.queryset.annotate(keyset_value=F(self.field))
+        if position:
+            queryset = queryset.filter(self._after(position[1], position[2], backwards))
+        queryset = queryset.order_by(*self._ordering(backwards))
+
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else position is not None
+        return KeysetPage(
+            objects,
+            next_cursor=self.encode_cursor('next', objects[-1]) if objects and has_next else None,
+            previous_cursor=self.encode_cursor('prev', objects[0]) if objects and has_previous else None,
+            total=self.total(),
+        )
+
+    def total(self):
+        key = catalog_cache_key('product_count', active_filters(self.params))
+        total = cache.get(key)
+        if total is None:
+            total = self.queryset.order_by().count()
+            cache.set(key, total, COUNT_CACHE_TIMEOUT)
+        return total
+
+    def _ordering(self, backwards):
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field}', f'{prefix}id']
+
+    def _after(self, value, pk, backwards):
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        return (Q(**{f'{self.field}__{lookup}': value})
+                | Q(**{self.field: value, f'id__{lookup}': pk}))
+
+    def encode_cursor(self, direction, obj):
+        value = obj.keyset_value
+        if not isinstance(value, int):
+            value = str(value)
+        return signing.dumps([direction, value, obj.pk], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            direction, value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        return direction, value, pk
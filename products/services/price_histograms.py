@@ -0,0 +1,195 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+
+from categories.models import CategoryClosure
+from ..models import Product, PriceHistogram
+
+
+# lower edge of every bucket in toman, the last bucket has no upper edge
+HISTOGRAM_EDGES = (
+    0, 100_000, 200_000, 500_000,
+    1_000_000, 2_000_000, 5_000_000,
+    10_000_000, 20_000_000, 50_000_000,
+    100_000_000, 200_000_000, 500_000_000,
+    1_000_000_000,
+)
+HISTOGRAMS_CACHE_KEY = 'price_histograms'
+HISTOGRAMS_CACHE_TIMEOUT = 60 * 60
+
+
+def bucket_of(price):
+    return bisect_right(HISTOGRAM_EDGES, price) - 1
+
+
+def _bucket_condition(index):
+    condition = Q(effective_price__gte=HISTOGRAM_EDGES[index])
+    if index + 1 < len(HISTOGRAM_EDGES):
+        condition &= Q(effective_price__lt=HISTOGRAM_EDGES[index + 1])
+    return condition
+
+
+def _placement(values):
+    """(category_id, effective_price) of a product with these field values, None if it's in no histogram."""
+    if not values.get('is_active') or values.get('category_id') is None:
+        return None
+    return values['category_id'], values['effective_price']
+
+
+def product_price_changes(product, created=False, deleted=False):
+    """
+    [(category_id, price, +1 / -1), ...] a save or delete of the product makes to the histograms.
+    None when the values it was loaded with are unknown, so only a rebuild can tell.
+    """
+    loaded = getattr(product, '_loaded_values', None)
+    if created:
+        before = None
+    elif loaded is None or not set(Product.PRICE_HISTOGRAM_FIELDS) <= loaded.keys():
+        return None
+    else:
+        before = _placement(loaded)
+    after = None if deleted else _placement(
+        {field: getattr(product, field) for field in Product.PRICE_HISTOGRAM_FIELDS})
+    if before == after:
+        return []
+    return [(*placement, delta) for placement, delta in ((before, -1), (after, 1)) if placement]
+
+
+def update_price_histograms(products, created=False, deleted=False):
+    """Apply what saving or deleting the given products changed, rebuilding if that can't be known."""
+    changes = []
+    for product in products:
+        product_changes = product_price_changes(product, created, deleted)
+        if product_changes is None:
+            return rebuild_price_histograms()
+        changes.extend(product_changes)
+    if changes:
+        apply_price_changes(changes)
+
+
+def _empty_counts():
+    return [0] * len(HISTOGRAM_EDGES)
+
+
+def _scope_products(category_id):
+    products = Product.objects.active()
+    if category_id is None:
+        return products
+    return products.filter(category__in=CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant'))
+
+
+def apply_price_changes(changes):
+    """Add (category_id, price, delta) changes to the histograms of the categories, their ancestors and the catalog."""
+    ancestors = defaultdict(list)
+    for descendant_id, ancestor_id in CategoryClosure.objects.filter(
+            descendant_id__in={category_id for category_id, _price, _delta in changes}
+    ).values_list('descendant_id', 'ancestor_id'):
+        ancestors[descendant_id].append(ancestor_id)
+
+    scoped = defaultdict(list)
+    for category_id, price, delta in changes:
+        for scope in [None, *ancestors[category_id]]:
+            scoped[scope].append((price, delta))
+    category_ids = [scope for scope in scoped if scope is not None]
+
+    with transaction.atomic():
+        PriceHistogram.objects.bulk_create(
+            [PriceHistogram(category_id=category_id, counts=_empty_counts()) for category_id in [None, *category_ids]],
+            ignore_conflicts=True,
+        )
+        histograms = list(PriceHistogram.objects.select_for_update().filter(
+            Q(category__in=category_ids) | Q(category__isnull=True)))
+        for histogram in histograms:
+            _apply(histogram, scoped[histogram.category_id])
+        PriceHistogram.objects.bulk_update(histograms, ['counts', 'min_price', 'max_price'])
+    cache.delete(HISTOGRAMS_CACHE_KEY)
+
+
+def _apply(histogram, changes):
+    counts = histogram.counts or _empty_counts()
+    bounds_lost = False
+    for price, delta in changes:
+        bucket = bucket_of(price)
+        counts[bucket] = max(counts[bucket] + delta, 0)
+        if delta > 0:
+            histogram.min_price = price if histogram.min_price is None else min(histogram.min_price, price)
+            histogram.max_price = price if histogram.max_price is None else max(histogram.max_price, price)
+        elif price in (histogram.min_price, histogram.max_price):
+            bounds_lost = True
+    histogram.counts = counts
+    if not any(counts):
+        histogram.min_price = histogram.max_price = None
+    elif bounds_lost:
+        # the cheapest or dearest product left, only the products can tell the next one
+        bounds = _scope_products(histogram.category_id).aggregate(low=Min('effective_price'), high=Max('effective_price'))
+        histogram.min_price, histogram.max_price = bounds['low'], bounds['high']
+
+
+def rebuild_price_histograms():
+    """Recompute every histogram from the active products. Returns the number of histograms."""
+    aggregates = {
+        f'bucket_{index}': Count('pk', filter=_bucket_condition(index)) for index in range(len(HISTOGRAM_EDGES))
+    }
+    per_category = {
+        row['category']: row
+        for row in Product.objects.active().values('category')
+        .annotate(low=Min('effective_price'), high=Max('effective_price'), **aggregates)
+        .order_by()
+    }
+
+    histograms = {None: PriceHistogram(counts=_empty_counts())}
+    rows = [(None, category_id) for category_id in per_category]
+    rows += CategoryClosure.objects.filter(descendant__in=per_category).values_list('ancestor_id', 'descendant_id')
+    for scope, category_id in rows:
+        histogram = histograms.get(scope)
+        if histogram is None:
+            histogram = histograms[scope] = PriceHistogram(category_id=scope, counts=_empty_counts())
+        row = per_category[category_id]
+        for index in range(len(HISTOGRAM_EDGES)):
+            histogram.counts[index] += row[f'bucket_{index}']
+        histogram.min_price = row['low'] if histogram.min_price is None else min(histogram.min_price, row['low'])
+        histogram.max_price = row['high'] if histogram.max_price is None else max(histogram.max_price, row['high'])
+
+    with transaction.atomic():
+        PriceHistogram.objects.all().delete()
+        PriceHistogram.objects.bulk_create(histograms.values(), batch_size=500)
+    cache.delete(HISTOGRAMS_CACHE_KEY)
+    return len(histograms)
+
+
+def get_price_histograms():
+    """{category slug, '' for the whole catalog: histogram} from the cache, loaded with one query."""
+    histograms = cache.get(HISTOGRAMS_CACHE_KEY)
+    if histograms is None:
+        histograms = {
+            row['category__slug'] or '': _histogram(row)
+            for row in PriceHistogram.objects.values('category__slug', 'counts', 'min_price', 'max_price')
+        }
+        cache.set(HISTOGRAMS_CACHE_KEY, histograms, HISTOGRAMS_CACHE_TIMEOUT)
+    return histograms
+
+
+def _histogram(row):
+    counts = row['counts'] or _empty_counts()
+    highest = max(counts, default=0)
+    buckets = [
+        {
+            'min': low,
+            'max': HISTOGRAM_EDGES[index + 1] if index + 1 < len(HISTOGRAM_EDGES) else None,
+            'count': count,
+            # bar height for the slider, in percent of the fullest bucket
+            'height': round(count * 100 / highest) if highest else 0,
+        }
+        for index, (low, count) in enumerate(zip(HISTOGRAM_EDGES, counts))
+    ]
+    # leading and trailing empty buckets are outside the slider range anyway
+    filled = [index for index, count in enumerate(counts) if count]
+    buckets = buckets[filled[0]:filled[-1] + 1] if filled else []
+    return {'min': row['min_price'] or 0, 'max': row['max_price'] or 0, 'buckets': buckets}
+
+
+def get_price_histogram(category_slug=None):
+    return get_price_histograms().get(category_slug or '') or {'min': 0, 'max': 0, 'buckets': []}
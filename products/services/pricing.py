@@ -0,0 +1,53 @@
+from django.db.models import Q, F, Min
+from django.utils import timezone
+
+from ..models import Product
+from .catalog_cache import bump_catalog_version
+from .home_cache import invalidate_home_sections, PRODUCT_SECTIONS
+from .price_histograms import update_price_histograms
+from .product_cards import refresh_product_cards
+from .product_page import invalidate_product_pages
+
+
+def refresh_effective_prices(products, now=None):
+    """
+    Recompute the effective price of the given products and refresh their cards.
+    Returns the number of products updated.
+    """
+    now = now or timezone.now()
+    products = list(products.select_related('discount'))
+    if not products:
+        return 0
+    for product in products:
+        product.update_effective_price(now)
+        # bulk_update skips auto_now, and API clients revalidate on updated_at
+        product.updated_at = now
+    Product.objects.bulk_update(products, ['effective_price', 'price_changes_at', 'updated_at'], batch_size=500)
+    update_price_histograms(products)
+    refresh_product_cards(Product.objects.filter(pk__in=[product.pk for product in products]))
+    bump_catalog_version()
+    invalidate_home_sections(*PRODUCT_SECTIONS)
+    invalidate_product_pages([product.pk for product in products])
+    return len(products)
+
+
+def refresh_discount_prices(discount):
+    return refresh_effective_prices(Product.objects.filter(discount=discount))
+
+
+def refresh_orphan_prices():
+    """Products still priced after a discount that was deleted from under them."""
+    return refresh_effective_prices(Product.objects.filter(
+        Q(effective_price__lt=F('price')) | Q(price_changes_at__isnull=False),
+        discount__isnull=True,
+    ))
+
+
+def apply_due_price_changes(now=None):
+    """Flip the price of every product whose discount started or expired by `now`."""
+    now = now or timezone.now()
+    return refresh_effective_prices(Product.objects.filter(price_changes_at__lte=now), now)
+
+
+def next_price_change():
+    return Product.objects.aggregate(next_change=Min('price_changes_at'))['next_change']
@@ -0,0 +1,79 @@
+from django.db import connection
+
+from ..models import ProductCard
+
+
+# columns a product tile needs, everything else stays out of the listing queries
+CARD_FIELDS = [
+    'card__name',
+    'card__url',
+    'card__thumbnail_url',
+    'card__status',
+    'card__stock',
+    'card__price',
+    'card__final_price',
+    'card__discount_percent',
+    'card__has_discount',
+    'review_stats__approved_count',
+    'review_stats__recommend_ratio',
+]
+
+
+# the tiles show the exact stock up to this many, and only that it's available above
+STOCK_SHOWN_UP_TO = 10
+
+
+def shown_stock(stock):
+    """What a tile can tell of the stock, stock changes that keep it leave the tile as it was."""
+    return min(stock, STOCK_SHOWN_UP_TO + 1)
+
+
+def with_cards(queryset):
+    """Narrow a Product queryset down to the precomputed card and review stats of each product."""
+    return queryset.select_related(None).select_related('card', 'review_stats').only('id', *CARD_FIELDS)
+
+
+def build_product_card(product):
+    has_discount = product.effective_price < product.price
+    return ProductCard(
+        product=product,
+        name=product.name,
+        url=product.get_absolute_url(),
+        thumbnail_url=product.main_image.url if product.main_image else '',
+        status=product.status,
+        stock=product.stock,
+        price=product.price,
+        final_price=product.effective_price,
+        discount_percent=int(product.discount.value) if has_discount else 0,
+        has_discount=has_discount,
+    )
+
+
+def save_product_cards(cards):
+    """Insert or overwrite cards with a single upsert."""
+    ProductCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+        unique_fields=['product'] if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=[field.name for field in ProductCard._meta.concrete_fields if not field.primary_key],
+    )
+    return len(cards)
+
+
+def refresh_product_cards(products, batch_size=500):
+    """Rebuild the cards of the given products with one upsert per batch."""
+    refreshed = 0
+    cards = []
+    for product in products.select_related('discount').iterator(chunk_size=batch_size):
+        cards.append(build_product_card(product))
+        if len(cards) >= batch_size:
+            refreshed += save_product_cards(cards)
+            cards = []
+    refreshed += save_product_cards(cards)
+    return refreshed
+
+
+def refresh_product_card(product):
+    save_product_cards([build_product_card(product)])
+
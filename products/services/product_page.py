@@ -0,0 +1,90 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from ..models import Product, FeatureOption
+from .comments import load_comment_page
+from .related_products import get_related_products
+
+
+PRODUCT_PAGE_TIMEOUT = 60 * 15
+# unknown slugs are remembered briefly so crawlers hitting dead urls don't reach the database
+MISSING_PRODUCT_TIMEOUT = 60
+
+MISSING = 'missing'
+
+
+def _page_key(slug):
+    return f'product_page:{hashlib.md5(slug.encode()).hexdigest()}'
+
+
+def _version_key(product_id):
+    return f'product_page_version:{product_id}'
+
+
+def get_product_page_version(product_id):
+    key = _version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_product_pages(product_ids):
+    for product_id in product_ids:
+        try:
+            cache.incr(_version_key(product_id))
+        except ValueError:
+            pass
+
+
+def forget_missing_product(slug):
+    """Drop a negative cache entry, e.g. when a product is created under a slug that 404ed."""
+    if cache.get(_page_key(slug)) == MISSING:
+        cache.delete(_page_key(slug))
+
+
+def product_page_queryset():
+    return (Product.objects.active()
+            .select_related('discount', 'brand', 'category__parent')
+            .prefetch_related('images', 'specifications', 'feature_options'))
+
+
+def build_product_page(product):
+    """The parts of the product page that are the same for every visitor."""
+    color_options, size_options = [], []
+    for option in product.feature_options.all():
+        if option.feature == FeatureOption.Feature.Color:
+            color_options.append({'code': option.color, 'name': option.get_color_display()})
+        elif option.feature == FeatureOption.Feature.Size:
+            size_options.append(option.value)
+    return {
+        'product': product,
+        'comments': load_comment_page(product),
+        'related_products': get_related_products(product),
+        'color_options': color_options,
+        'size_options': size_options,
+    }
+
+
+def get_product_page(slug):
+    """
+    The cached page data of the active product with the given slug, or None if there is none.
+    An entry is served until the product's page version is bumped by one of its dependencies.
+    """
+    key = _page_key(slug)
+    cached = cache.get(key)
+    if cached == MISSING:
+        return None
+    if cached is not None and cached['version'] == get_product_page_version(cached['product'].pk):
+        return cached
+
+    product = product_page_queryset().filter(slug=slug).first()
+    if product is None:
+        cache.set(key, MISSING, MISSING_PRODUCT_TIMEOUT)
+        return None
+    page = {'version': get_product_page_version(product.pk), **build_product_page(product)}
+    cache.set(key, page, PRODUCT_PAGE_TIMEOUT)
+    return page
@@ -0,0 +1,94 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import transaction
+
+from orders.models import Order, OrderItem
+from ..models import Product, RelatedProduct
+from .product_cards import with_cards
+
+
+RELATED_PRODUCTS_LIMIT = 12
+# bigger baskets are bulk purchases and say little about which products go together
+MAX_BASKET_SIZE = 50
+IGNORED_ORDER_STATUSES = (Order.OrderStatus.CANCELLED, Order.OrderStatus.REFUNDED)
+
+
+def order_baskets(batch_size=2000):
+    """The distinct product ids of every order, streamed one order at a time."""
+    rows = (OrderItem.objects
+            .exclude(order__status__in=IGNORED_ORDER_STATUSES)
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+            .iterator(chunk_size=batch_size))
+    for _order_id, items in groupby(rows, key=itemgetter(0)):
+        yield {product_id for _order_id, product_id in items}
+
+
+def co_purchase_matrix(baskets):
+    """
+    Sparse, symmetric co-occurrence matrix of the baskets as {product_id: Counter({other_id: orders})},
+    along with the number of orders of every product.
+    """
+    matrix = defaultdict(Counter)
+    orders = Counter()
+    for basket in baskets:
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        orders.update(basket)
+        for first, second in combinations(basket, 2):
+            matrix[first][second] += 1
+            matrix[second][first] += 1
+    return matrix, orders
+
+
+def top_neighbours(matrix, orders, top_n=RELATED_PRODUCTS_LIMIT):
+    """
+    The top_n neighbours of every product as [(score, product_id), ...].
+    Scores are cosine normalized so best sellers don't end up related to everything.
+    """
+    return {
+        product_id: heapq.nlargest(top_n, (
+            (count / math.sqrt(orders[product_id] * orders[other_id]), other_id)
+            for other_id, count in row.items()
+        ))
+        for product_id, row in matrix.items()
+    }
+
+
+def rebuild_related_products(top_n=RELATED_PRODUCTS_LIMIT, batch_size=1000):
+    """Replace the related products table with the neighbours found in the order history."""
+    from .product_page import invalidate_product_pages
+
+    matrix, orders = co_purchase_matrix(order_baskets(batch_size))
+    neighbours = top_neighbours(matrix, orders, top_n)
+    entries = [
+        RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=score)
+        for product_id, row in neighbours.items()
+        for rank, (score, related_id) in enumerate(row, start=1)
+    ]
+    with transaction.atomic():
+        stale = set(RelatedProduct.objects.values_list('product_id', flat=True).distinct())
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=batch_size)
+    invalidate_product_pages(stale | neighbours.keys())
+    return len(neighbours)
+
+
+def related_products_queryset(product):
+    return with_cards(Product.objects.active().filter(neighbour_of__product=product).order_by('neighbour_of__rank'))
+
+
+def fallback_related_products_queryset(product):
+    return with_cards(Product.objects.by_category(product.category.slug).exclude(id=product.id))
+
+
+def get_related_products(product, limit=RELATED_PRODUCTS_LIMIT):
+    """Precomputed co-purchased products, or products of the same category for products nobody bought yet."""
+    related = list(related_products_queryset(product)[:limit])
+    if related:
+        return related
+    return list(fallback_related_products_queryset(product)[:limit])
@@ -0,0 +1,114 @@
+import math
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from ..models import Product, Comment, ProductReviewStats
+
+
+# z-score of the 95% confidence interval the satisfaction is the lower bound of
+SATISFACTION_Z = 1.96
+
+
+def satisfaction(approved, recommended, z=SATISFACTION_Z):
+    """Wilson score lower bound of the recommend ratio."""
+    if not approved:
+        return 0
+    ratio = recommended / approved
+    spread = z * math.sqrt((ratio * (1 - ratio) + z * z / (4 * approved)) / approved)
+    return (ratio + z * z / (2 * approved) - spread) / (1 + z * z / approved)
+
+
+def refresh_ratios(stats):
+    stats.recommend_ratio = stats.recommend_count / stats.approved_count if stats.approved_count else 0
+    stats.satisfaction = satisfaction(stats.approved_count, stats.recommend_count)
+
+
+def review_contribution(values):
+    """(approved, recommending) reviews a comment with these field values adds to its product."""
+    if (values.get('status') != Comment.CommentStatus.APPROVED
+            or values.get('parent_id') is not None
+            or values.get('product_id') is None):
+        return 0, 0
+    return 1, int(bool(values.get('recommend')))
+
+
+def update_review_stats(comment, deleted=False):
+    """Apply the difference a comment save or delete makes to the review stats of its product."""
+    current = {field: getattr(comment, field) for field in Comment.REVIEW_FIELDS}
+    loaded = getattr(comment, '_loaded_values', None)
+    if deleted:
+        before, after = loaded or current, {}
+    else:
+        before, after = loaded or {}, current
+
+    old_approved, old_recommending = review_contribution(before)
+    new_approved, new_recommending = review_contribution(after)
+    old_product, new_product = before.get('product_id'), after.get('product_id')
+    if old_product == new_product:
+        _apply(new_product, new_approved - old_approved, new_recommending - old_recommending, comment.created_at)
+    else:
+        _apply(old_product, -old_approved, -old_recommending, comment.created_at)
+        _apply(new_product, new_approved, new_recommending, comment.created_at)
+
+
+def _apply(product_id, approved, recommending, reviewed_at):
+    if product_id is None or not (approved or recommending):
+        return
+    with transaction.atomic():
+        if approved > 0:
+            ProductReviewStats.objects.bulk_create([ProductReviewStats(product_id=product_id)], ignore_conflicts=True)
+        # a missing row means the product itself is being deleted
+        stats = ProductReviewStats.objects.select_for_update().filter(pk=product_id).first()
+        if stats is None:
+            return
+        stats.approved_count = max(stats.approved_count + approved, 0)
+        stats.recommend_count = max(stats.recommend_count + recommending, 0)
+        if approved > 0:
+            stats.last_review_at = max(filter(None, [stats.last_review_at, reviewed_at]))
+        elif approved < 0:
+            stats.last_review_at = _approved_reviews().filter(product_id=product_id).aggregate(
+                last=Max('created_at'))['last']
+        refresh_ratios(stats)
+        stats.save()
+
+
+def _approved_reviews():
+    return Comment.objects.active().filter(parent__isnull=True)
+
+
+def rebuild_review_stats(batch_size=1000):
+    """Recompute the review stats of every product from its comments. Returns the number of products."""
+    aggregates = {
+        row['product']: row
+        for row in _approved_reviews()
+        .filter(product__isnull=False)
+        .values('product')
+        .annotate(
+            approved=Count('pk'),
+            recommending=Count('pk', filter=Q(recommend=True)),
+            last=Max('created_at'),
+        )
+        .order_by()
+    }
+    stats = []
+    for product_id in Product.objects.values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        row = aggregates.get(product_id, {})
+        product_stats = ProductReviewStats(
+            product_id=product_id,
+            approved_count=row.get('approved', 0),
+            recommend_count=row.get('recommending', 0),
+            last_review_at=row.get('last'),
+        )
+        refresh_ratios(product_stats)
+        stats.append(product_stats)
+
+    with transaction.atomic():
+        ProductReviewStats.objects.all().delete()
+        ProductReviewStats.objects.bulk_create(stats, batch_size=batch_size)
+    return len(stats)
+
+
+def create_review_stats(product):
+    """Every product has a row, so sorting on satisfaction never meets a NULL."""
+    ProductReviewStats.objects.bulk_create([ProductReviewStats(product=product)], ignore_conflicts=True)
@@ -0,0 +1,59 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from search.suggestions import refresh_suggestion_sales
+from ..models import Product, SalesCount
+from .home_cache import invalidate_home_sections
+from .trending import add_sales
+
+
+def record_sales_counts(sales):
+    """
+    Buffer {product_id: quantity} sold with a single INSERT. Unlike an update of the product,
+    it takes no lock on the product row, so checkouts of a best seller don't queue up on it.
+    """
+    SalesCount.objects.bulk_create([
+        SalesCount(product_id=product_id, quantity=quantity) for product_id, quantity in sales.items() if quantity
+    ])
+
+
+def flush_sales_counters(batch_size=1000):
+    """
+    Fold the buffered sales into Product.total_sell and the trending windows of the products
+    with one UPDATE per batch and drop them, so checkouts never lock a product or its trend.
+    Rows a concurrent flush is working on are skipped, so none is counted twice.
+    Returns the number of units flushed.
+    """
+    flushed, last_pk = 0, 0
+    sold_products = set()
+    while True:
+        with transaction.atomic():
+            rows = list(SalesCount.objects.select_for_update(skip_locked=True)
+                        .filter(pk__gt=last_pk)
+                        .order_by('pk')
+                        .values_list('pk', 'product_id', 'quantity', 'created_at')[:batch_size])
+            if not rows:
+                break
+            SalesCount.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            # without a foreign key a checkout racing a product delete can leave rows behind, they go unsold
+            existing = set(Product.objects.filter(pk__in={row[1] for row in rows}).values_list('pk', flat=True))
+            last_pk = rows[-1][0]
+            rows = [row for row in rows if row[1] in existing]
+            totals = Counter()
+            for _pk, product_id, quantity, _created_at in rows:
+                totals[product_id] += quantity
+            # a bare counter bump, the catalog caches and updated_at don't follow sales
+            Product.objects.filter(pk__in=totals).update(total_sell=F('total_sell') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+                output_field=PositiveIntegerField(),
+            ))
+            add_sales([row[1:] for row in rows])
+        flushed += sum(totals.values())
+        sold_products.update(totals)
+    if flushed:
+        # the best sellers and the suggestions rank by what the updates above changed without signals
+        invalidate_home_sections('best_sell_products')
+        refresh_suggestion_sales(sold_products)
+    return flushed
@@ -0,0 +1,130 @@
+import math
+
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from ..models import Product, ProductTrend
+from .home_cache import invalidate_home_sections
+
+
+TRENDING_WINDOWS = {
+    'sales_24h': timezone.timedelta(hours=24),
+    'sales_7d': timezone.timedelta(days=7),
+    'sales_30d': timezone.timedelta(days=30),
+}
+# share of every window in the score, each window is turned into sales per day first
+TRENDING_WEIGHTS = {'sales_24h': 0.5, 'sales_7d': 0.3, 'sales_30d': 0.2}
+# decayed sales below this are dropped to zero, so idle products stop being revisited
+NEGLIGIBLE_SALES = 0.01
+# order lines older than this add less than NEGLIGIBLE_SALES to the longest window
+REBUILD_HISTORY = TRENDING_WINDOWS['sales_30d'] * 5
+IGNORED_ORDER_STATUSES = (Order.OrderStatus.CANCELLED, Order.OrderStatus.REFUNDED)
+
+
+def decay(trend, now):
+    """Age the windows of the trend from its `decayed_at` to `now`."""
+    elapsed = (now - trend.decayed_at).total_seconds()
+    for field, window in TRENDING_WINDOWS.items():
+        sales = getattr(trend, field) * math.exp(-elapsed / window.total_seconds())
+        setattr(trend, field, sales if sales >= NEGLIGIBLE_SALES else 0)
+    trend.decayed_at = now
+
+
+def trending_score(trend):
+    return sum(
+        weight * getattr(trend, field) / (TRENDING_WINDOWS[field] / timezone.timedelta(days=1))
+        for field, weight in TRENDING_WEIGHTS.items()
+    )
+
+
+def save_trends(trends, batch_size=500):
+    ProductTrend.objects.bulk_update(trends, [*TRENDING_WINDOWS, 'decayed_at'], batch_size=batch_size)
+    copy_trending_scores(trends, batch_size)
+
+
+def copy_trending_scores(trends, batch_size=500):
+    """
+    Write the score of the trends onto the indexed product column the listings sort on.
+    The best sellers of the home page are left to the caller to invalidate, once it's done.
+    """
+    Product.objects.bulk_update(
+        [Product(pk=trend.pk, trending_score=trending_score(trend)) for trend in trends],
+        ['trending_score'],
+        batch_size=batch_size,
+    )
+
+
+def add_sales(rows):
+    """
+    Add (product_id, quantity, sold_at) rows to the trending windows of the products and copy
+    their scores. Must run inside a transaction, the trends stay locked until it commits.
+    """
+    rows = sorted(rows, key=lambda row: row[2])
+    if not rows:
+        return
+    ProductTrend.objects.bulk_create(
+        [ProductTrend(product_id=product_id, decayed_at=rows[0][2]) for product_id in {row[0] for row in rows}],
+        ignore_conflicts=True,
+    )
+    trends = ProductTrend.objects.select_for_update().in_bulk({row[0] for row in rows})
+    for product_id, quantity, sold_at in rows:
+        trend = trends[product_id]
+        # a decay job may have aged the trend past a sale that was still buffered
+        decay(trend, max(sold_at, trend.decayed_at))
+        for field in TRENDING_WINDOWS:
+            setattr(trend, field, getattr(trend, field) + quantity)
+    save_trends(list(trends.values()))
+
+
+def decay_trending_scores(now=None, batch_size=500):
+    """
+    Age every trend that still has sales to `now`, so scores of products that sold
+    at different times stay comparable. Returns the number of trends updated.
+    """
+    now = now or timezone.now()
+    updated, last_pk = 0, 0
+    while True:
+        with transaction.atomic():
+            trends = list(ProductTrend.objects.select_for_update()
+                          .filter(sales_30d__gt=0, pk__gt=last_pk)
+                          .order_by('pk')[:batch_size])
+            if not trends:
+                break
+            for trend in trends:
+                decay(trend, now)
+            save_trends(trends, batch_size)
+        updated += len(trends)
+        last_pk = trends[-1].pk
+    if updated:
+        invalidate_home_sections('best_sell_products')
+    return updated
+
+
+def rebuild_trending_scores(now=None, batch_size=500):
+    """Recompute every trend from the recent order history, for the first deploy or after a data fix."""
+    now = now or timezone.now()
+    trends = {}
+    rows = (OrderItem.objects
+            .filter(created_at__gte=now - REBUILD_HISTORY, created_at__lte=now)
+            .exclude(order__status__in=IGNORED_ORDER_STATUSES)
+            .order_by('created_at')
+            .values_list('product_id', 'quantity', 'created_at')
+            .iterator(chunk_size=batch_size))
+    for product_id, quantity, created_at in rows:
+        trend = trends.get(product_id)
+        if trend is None:
+            trend = trends[product_id] = ProductTrend(product_id=product_id, decayed_at=created_at)
+        decay(trend, created_at)
+        for field in TRENDING_WINDOWS:
+            setattr(trend, field, getattr(trend, field) + quantity)
+    for trend in trends.values():
+        decay(trend, now)
+
+    with transaction.atomic():
+        ProductTrend.objects.all().delete()
+        Product.objects.filter(trending_score__gt=0).update(trending_score=0)
+        ProductTrend.objects.bulk_create(trends.values(), batch_size=batch_size)
+        copy_trending_scores(list(trends.values()), batch_size)
+    invalidate_home_sections('best_sell_products')
+    return len(trends)
@@ -0,0 +1,180 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from categories.models import Category, Brand
+from categories.signals import subtree_moved
+from core.models import SiteSettings, SliderBanners, SideBanners, MiddleBanners
+from .models import Product, Discount, FeatureOption, ProductImage, ProductSpecification, Comment
+from .services.catalog_cache import bump_catalog_version
+from .services.home_cache import invalidate_home_sections, PRODUCT_SECTIONS
+from .services.comments import refresh_comment_counts
+from .services.reviews import create_review_stats, update_review_stats
+from .services.product_page import invalidate_product_pages, forget_missing_product
+from .services.price_histograms import rebuild_price_histograms, update_price_histograms
+from .services.pricing import refresh_discount_prices, refresh_orphan_prices
+from .services.product_cards import refresh_product_card
+
+
+# product fields that end up on its card
+CARD_SOURCE_FIELDS = {'name', 'slug', 'main_image', 'status', 'stock', 'price', 'effective_price', 'discount'}
+# product fields that place it in the price histograms
+PRICE_HISTOGRAM_SOURCE_FIELDS = {'category', 'is_active', 'price', 'effective_price', 'discount'}
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Discount)
+@receiver([post_save, post_delete], sender=FeatureOption)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def refresh_card(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not CARD_SOURCE_FIELDS.intersection(update_fields):
+        return
+    refresh_product_card(instance)
+
+
+@receiver(post_save, sender=Discount)
+def refresh_discounted_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_discount_prices(instance)
+
+
+@receiver(post_delete, sender=Discount)
+def refresh_undiscounted_products(sender, instance, **kwargs):
+    refresh_orphan_prices()
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Discount)
+def invalidate_home_product_sections(sender, **kwargs):
+    invalidate_home_sections(*PRODUCT_SECTIONS)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_home_categories(sender, **kwargs):
+    invalidate_home_sections('top_categories')
+
+
+@receiver([post_save, post_delete], sender=SiteSettings)
+def invalidate_home_site_settings(sender, **kwargs):
+    invalidate_home_sections('site_settings')
+
+
+HOME_BANNER_SECTIONS = {
+    SliderBanners: 'slider_banners',
+    SideBanners: 'side_banners',
+    MiddleBanners: 'middle_banners',
+}
+
+
+@receiver([post_save, post_delete], sender=SliderBanners)
+@receiver([post_save, post_delete], sender=SideBanners)
+@receiver([post_save, post_delete], sender=MiddleBanners)
+def invalidate_home_banners(sender, **kwargs):
+    invalidate_home_sections(HOME_BANNER_SECTIONS[sender])
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_page(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_product_pages([instance.pk])
+    forget_missing_product(instance.slug)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_page(sender, instance, **kwargs):
+    invalidate_product_pages([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def invalidate_brand_product_pages(sender, instance, raw=False, **kwargs):
+    # deleting a brand deletes its products, which invalidate their own pages
+    if raw:
+        return
+    invalidate_product_pages(instance.brand_products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_product_pages(sender, instance, raw=False, **kwargs):
+    # the page shows the product's category and its parent
+    if raw:
+        return
+    invalidate_product_pages(Product.objects.filter(
+        Q(category=instance) | Q(category__parent=instance)).values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductSpecification)
+@receiver([post_save, post_delete], sender=FeatureOption)
+def invalidate_product_page_content(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_product_pages([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_product_page_comments(sender, instance, raw=False, created=False, **kwargs):
+    # new comments wait for moderation, they can't be on the page yet
+    if raw or (created and instance.status != Comment.CommentStatus.APPROVED):
+        return
+    if instance.product_id:
+        invalidate_product_pages([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def refresh_approved_comment_count(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    if raw or instance.parent_id or not instance.product_id:
+        return
+    if created and instance.status != Comment.CommentStatus.APPROVED:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    refresh_comment_counts([instance.product_id])
+
+
+@receiver(post_save, sender=Comment)
+def update_saved_comment_review_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_review_stats(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def update_deleted_comment_review_stats(sender, instance, **kwargs):
+    update_review_stats(instance, deleted=True)
+
+
+@receiver(post_save, sender=Product)
+def create_product_review_stats(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        create_review_stats(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_saved_product_price_histograms(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not PRICE_HISTOGRAM_SOURCE_FIELDS.intersection(update_fields):
+        return
+    update_price_histograms([instance], created=created)
+
+
+@receiver(post_delete, sender=Product)
+def update_deleted_product_price_histograms(sender, instance, **kwargs):
+    update_price_histograms([instance], deleted=True)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(subtree_moved, sender=Category)
+def rebuild_category_price_histograms(sender, **kwargs):
+    # the ancestors of a whole subtree changed, which the per product differences can't follow
+    rebuild_price_histograms()
@@ -1,11 +1,36 @@
-from django.test import TestCase
+import json
+import math
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
 from django.utils import timezone
 from django.shortcuts import reverse
 from django.contrib.auth import get_user_model
 
 from categories.models import Category, Brand
 from core.models import SliderBanners, SideBanners, MiddleBanners, SiteSettings
-from .models import Product, Discount, FeatureOption, Comment
+from orders.models import Address, Order, OrderItem
+from .models import (
+    Product, Discount, FeatureOption, Comment, ProductCard, RelatedProduct, ProductTrend, ProductReviewStats, PriceHistogram,
+    SalesCount,
+)
+from .services.facets import compute_product_facets, get_product_facets
+from .services.comments import load_comment_page
+from .services.home_cache import get_home_section_versions, PRODUCT_SECTIONS
+from .services.pagination import KeysetPaginator
+from .services.price_histograms import get_price_histogram
+from .services.pricing import apply_due_price_changes
+from .services.product_cards import with_cards
+from .services.sales_counters import flush_sales_counters, record_sales_counts
+from .services.trending import decay_trending_scores
+from .services.related_products import co_purchase_matrix, get_related_products, top_neighbours
 
 
 class TestProductModel(TestCase):
@@ -80,6 +105,7 @@ class TestProductModel(TestCase):
 
 class TestHomeView(TestCase):
     def setUp(self):
+        cache.clear()
 
         self.parent_category = Category.objects.create(name='test category', image='test.jpg')
 
@@ -187,6 +213,7 @@ class TestProductListView(TestCase):
         self.assertEqual(prices, sorted(prices))
 class ProductDetailViewTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.category = Category.objects.create(name='test category', image='category.jpg')
         discount = Discount.objects.create(
             value=30,
@@ -272,6 +299,404 @@ class ProductDetailViewTest(TestCase):
         self.assertIn(self.comment, response.context['comments'])
 
 
+class ProductPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.product = Product.objects.create(
+            category=category,
+            name='cached product',
+            main_image='product.jpg',
+            price=100,
+            stock=10,
+        )
+        self.url = reverse('product-detail', args=[self.product.slug])
+
+    def product_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries.captured_queries if 'FROM "products_' in query['sql']]
+
+    def test_page_served_from_cache(self):
+        self.client.get(self.url)
+        response, queries = self.product_queries(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_approved_comment_invalidates_page(self):
+        self.client.get(self.url)
+        comment = Comment.objects.create(
+            product=self.product,
+            display_name='test name',
+            title='test title',
+            text='test text',
+            recommend=True,
+        )
+        self.assertNotIn(comment, self.client.get(self.url).context['comments'])
+        comment.status = Comment.CommentStatus.APPROVED
+        comment.save()
+        self.assertIn(comment, self.client.get(self.url).context['comments'])
+
+    def test_option_change_invalidates_page(self):
+        self.client.get(self.url)
+        FeatureOption.objects.create(product=self.product, feature=FeatureOption.Feature.Size, value=42)
+        self.assertEqual(self.client.get(self.url).context['size_options'], ['42'])
+
+    def test_discount_invalidates_page(self):
+        self.client.get(self.url)
+        self.product.discount = Discount.objects.create(
+            value=20,
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            expire_date=timezone.now() + timezone.timedelta(days=1),
+        )
+        self.product.save()
+        self.assertEqual(self.client.get(self.url).context['product'].effective_price, 80)
+
+    def test_brand_and_category_renames_invalidate_page(self):
+        parent = Category.objects.create(name='parent category', image='category.jpg')
+        self.product.category.parent = parent
+        self.product.category.save()
+        self.product.brand = Brand.objects.create(name='test brand')
+        self.product.save()
+        self.client.get(self.url)
+
+        self.product.brand.name = 'renamed brand'
+        self.product.brand.save()
+        parent.name = 'renamed parent'
+        parent.save()
+        product = self.client.get(self.url).context['product']
+        self.assertEqual(product.brand.name, 'renamed brand')
+        self.assertEqual(product.category.parent.name, 'renamed parent')
+
+    def test_unknown_slug_is_negative_cached(self):
+        url = reverse('product-detail', args=['missing-product'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response, queries = self.product_queries(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(queries, [])
+
+    def test_created_product_clears_negative_cache(self):
+        url = reverse('product-detail', args=['new-product'])
+        self.client.get(url)
+        Product.objects.create(
+            category=self.product.category,
+            name='new product',
+            slug='new-product',
+            main_image='product.jpg',
+            price=100,
+        )
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_deactivated_product_is_not_served(self):
+        self.client.get(self.url)
+        self.product.is_active = False
+        self.product.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class RelatedProductsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', password='pass123')
+        self.address = Address.objects.create(
+            user=self.user, full_name='buyer', phone='0', city='city', postal_code='0', full_address='address')
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.phone, self.case, self.charger, self.sibling = [
+            Product.objects.create(category=category, name=name, main_image='product.jpg', price=100)
+            for name in ('phone', 'case', 'charger', 'sibling')
+        ]
+
+    def order(self, *products, status=Order.OrderStatus.PAID):
+        order = Order.objects.create(
+            user=self.user,
+            shipping_address=self.address,
+            status=status,
+            subtotal=0,
+            discount_total=0,
+            shipping_total=0,
+            tax_total=0,
+            grand_total=0,
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, user=self.user, product=product, total_discount=0, final_price=100)
+
+    def test_co_purchase_matrix(self):
+        matrix, orders = co_purchase_matrix([{1, 2}, {1, 2, 3}, {1}])
+        self.assertEqual(matrix[1], {2: 2, 3: 1})
+        self.assertEqual(matrix[3], {1: 1, 2: 1})
+        self.assertEqual(orders, {1: 3, 2: 2, 3: 1})
+
+    def test_top_neighbours_are_bounded_and_ranked(self):
+        matrix, orders = co_purchase_matrix([{1, 2}, {1, 2}, {1, 3}, {1, 4}])
+        neighbours = top_neighbours(matrix, orders, top_n=2)
+        self.assertEqual([product_id for _score, product_id in neighbours[1]][0], 2)
+        self.assertEqual(len(neighbours[1]), 2)
+
+    def test_rebuild_command(self):
+        self.order(self.phone, self.case)
+        self.order(self.phone, self.case, self.charger)
+        self.order(self.phone, self.sibling, status=Order.OrderStatus.CANCELLED)
+        out = StringIO()
+        call_command('rebuild_related_products', stdout=out)
+        self.assertIn('3 products', out.getvalue())
+        self.assertEqual(
+            list(RelatedProduct.objects.filter(product=self.phone).values_list('related', flat=True)),
+            [self.case.pk, self.charger.pk],
+        )
+        self.assertEqual(get_related_products(self.phone), [self.case, self.charger])
+
+    def test_cold_product_falls_back_to_category(self):
+        related = get_related_products(self.sibling, limit=2)
+        self.assertEqual(len(related), 2)
+        self.assertNotIn(self.sibling, related)
+
+    def test_detail_page_shows_related_products(self):
+        self.order(self.phone, self.case)
+        call_command('rebuild_related_products', stdout=StringIO())
+        response = self.client.get(reverse('product-detail', args=[self.phone.slug]))
+        self.assertEqual(response.context['related_products'], [self.case])
+        self.assertContains(response, self.case.card.url)
+
+
+class TrendingScoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', password='pass123')
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.old_hit, self.new_hit, self.idle = [
+            Product.objects.create(category=category, name=name, main_image='product.jpg', price=100)
+            for name in ('old hit', 'new hit', 'idle')
+        ]
+
+    def sell(self, sales, sold_at=None):
+        record_sales_counts(sales)
+        if sold_at:
+            SalesCount.objects.update(created_at=sold_at)
+        flush_sales_counters()
+
+    def test_recent_sales_outrank_older_ones(self):
+        now = timezone.now()
+        self.sell({self.old_hit.pk: 10}, now - timezone.timedelta(days=10))
+        self.sell({self.new_hit.pk: 5}, now)
+        decay_trending_scores(now)
+        self.old_hit.refresh_from_db()
+        self.new_hit.refresh_from_db()
+        self.assertGreater(self.new_hit.trending_score, self.old_hit.trending_score)
+        self.assertGreater(self.old_hit.trending_score, 0)
+
+    def test_sales_decay_per_window(self):
+        now = timezone.now()
+        self.sell({self.new_hit.pk: 10}, now - timezone.timedelta(days=1))
+        self.sell({self.new_hit.pk: 2}, now)
+        trend = ProductTrend.objects.get(product=self.new_hit)
+        self.assertAlmostEqual(trend.sales_24h, 10 * math.exp(-1) + 2)
+        self.assertAlmostEqual(trend.sales_7d, 10 * math.exp(-1 / 7) + 2)
+        self.assertAlmostEqual(trend.sales_30d, 10 * math.exp(-1 / 30) + 2)
+
+    def test_rebuild_matches_incremental_scores(self):
+        address = Address.objects.create(
+            user=self.user, full_name='buyer', phone='0', city='city', postal_code='0', full_address='address')
+        order = Order.objects.create(
+            user=self.user,
+            shipping_address=address,
+            subtotal=0,
+            discount_total=0,
+            shipping_total=0,
+            tax_total=0,
+            grand_total=0,
+        )
+        OrderItem.objects.create(
+            order=order, user=self.user, product=self.new_hit, quantity=3, total_discount=0, final_price=300)
+        call_command('update_trending_scores', '--rebuild', stdout=StringIO())
+        self.new_hit.refresh_from_db()
+        rebuilt = self.new_hit.trending_score
+        self.assertGreater(rebuilt, 0)
+
+        ProductTrend.objects.all().delete()
+        self.sell({self.new_hit.pk: 3}, OrderItem.objects.get().created_at)
+        self.new_hit.refresh_from_db()
+        self.assertAlmostEqual(self.new_hit.trending_score, rebuilt, places=3)
+
+    def test_best_sell_sort_and_home_rail(self):
+        self.sell({self.new_hit.pk: 5, self.old_hit.pk: 1})
+        response = self.client.get(reverse('product-list'), {'sort_query': 'best-sell'})
+        self.assertEqual(list(response.context['object_list'])[:2], [self.new_hit, self.old_hit])
+        response = self.client.get(reverse('home'))
+        self.assertEqual(list(response.context['best_sell_products'])[:2], [self.new_hit, self.old_hit])
+
+    def test_sales_of_deleted_products_are_dropped(self):
+        # a checkout that raced the delete of the product, no foreign key stops its row
+        SalesCount.objects.create(product_id=self.idle.pk + 1000, quantity=2)
+        record_sales_counts({self.new_hit.pk: 1})
+        self.assertEqual(flush_sales_counters(), 1)
+        self.assertFalse(SalesCount.objects.exists())
+        self.new_hit.refresh_from_db()
+        self.assertEqual(self.new_hit.total_sell, 1)
+        self.assertGreater(self.new_hit.trending_score, 0)
+
+    def test_decay_command(self):
+        self.sell({self.new_hit.pk: 1}, timezone.now() - timezone.timedelta(days=365))
+        out = StringIO()
+        call_command('update_trending_scores', stdout=out)
+        self.assertIn('1 products', out.getvalue())
+        self.new_hit.refresh_from_db()
+        self.assertEqual(self.new_hit.trending_score, 0)
+
+
+class CommentThreadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='test category', image='category.jpg')
+        self.product = Product.objects.create(category=category, name='product', main_image='product.jpg', price=100)
+
+    def comment(self, parent=None, status=Comment.CommentStatus.APPROVED):
+        return Comment.objects.create(
+            product=self.product,
+            parent=parent,
+            display_name='name',
+            title='title',
+            text='text',
+            recommend=True,
+            status=status,
+        )
+
+    def test_nested_replies_load_in_fixed_queries(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        nested = self.comment(parent=reply)
+        self.comment(parent=nested, status=Comment.CommentStatus.DRAFT)
+        self.assertEqual(nested.thread, root)
+        self.product.refresh_from_db()
+        with self.assertNumQueries(2):
+            page = load_comment_page(self.product)
+            self.assertEqual(list(page), [root])
+            self.assertEqual(page[0].thread_replies, [reply, nested])
+
+    def test_moved_reply_takes_its_replies_along(self):
+        first, second = self.comment(), self.comment()
+        reply, sibling = self.comment(parent=first), self.comment(parent=first)
+        nested = self.comment(parent=reply)
+        deeper = self.comment(parent=nested)
+
+        reply.parent = second
+        reply.save()
+        threads = dict(Comment.objects.values_list('pk', 'thread_id'))
+        self.assertEqual([threads[c.pk] for c in (reply, nested, deeper, sibling)], [second.pk] * 3 + [first.pk])
+
+        # a top-level comment moved under another brings its whole thread
+        second.parent = first
+        second.save()
+        threads = dict(Comment.objects.values_list('pk', 'thread_id'))
+        self.assertEqual({threads[c.pk] for c in (second, reply, nested, deeper, sibling)}, {first.pk})
+
+    def test_approved_comment_count_follows_status(self):
+        comment = self.comment(status=Comment.CommentStatus.DRAFT)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.approved_comment_count, 0)
+
+        comment.status = Comment.CommentStatus.APPROVED
+        comment.save()
+        self.comment(parent=comment)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.approved_comment_count, 1)
+
+        comment.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.approved_comment_count, 0)
+
+    def test_comments_are_paginated(self):
+        comments = [self.comment() for _ in range(12)]
+        url = reverse('product-detail', args=[self.product.slug])
+        first = self.client.get(url).context['comments']
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next())
+        second = self.client.get(url, {'comments_page': 2}).context['comments']
+        self.assertEqual(list(second), comments[1::-1])
+        self.assertFalse(second.has_next())
+
+
+class ReviewStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='test category', image='category.jpg')
+        self.product = Product.objects.create(category=self.category, name='product', main_image='product.jpg', price=100)
+
+    def comment(self, product=None, recommend=True, status=Comment.CommentStatus.DRAFT, parent=None):
+        return Comment.objects.create(
+            product=product or self.product,
+            parent=parent,
+            display_name='name',
+            title='title',
+            text='text',
+            recommend=recommend,
+            status=status,
+        )
+
+    def stats(self, product=None):
+        return ProductReviewStats.objects.get(product=product or self.product)
+
+    def test_new_product_has_empty_stats(self):
+        stats = self.stats()
+        self.assertEqual((stats.approved_count, stats.recommend_count, stats.satisfaction), (0, 0, 0))
+
+    def test_stats_follow_moderation(self):
+        disliked = self.comment(recommend=False, status=Comment.CommentStatus.APPROVED)
+        liked = self.comment()
+        self.comment(parent=disliked, status=Comment.CommentStatus.APPROVED)
+        self.assertEqual((self.stats().approved_count, self.stats().recommend_count), (1, 0))
+
+        liked.status = Comment.CommentStatus.APPROVED
+        liked.save()
+        stats = self.stats()
+        self.assertEqual((stats.approved_count, stats.recommend_count), (2, 1))
+        self.assertEqual(stats.recommend_percent, 50)
+        self.assertEqual(stats.last_review_at, liked.created_at)
+
+        liked = Comment.objects.get(pk=liked.pk)
+        liked.status = Comment.CommentStatus.REJECTED
+        liked.save()
+        stats = self.stats()
+        self.assertEqual((stats.approved_count, stats.recommend_count), (1, 0))
+        self.assertEqual(stats.last_review_at, disliked.created_at)
+
+        disliked.recommend = True
+        disliked.save()
+        self.assertEqual(self.stats().recommend_count, 1)
+
+        disliked.delete()
+        stats = self.stats()
+        self.assertEqual((stats.approved_count, stats.recommend_count, stats.last_review_at), (0, 0, None))
+
+    def test_rebuild_command(self):
+        self.comment(status=Comment.CommentStatus.APPROVED)
+        self.comment(recommend=False, status=Comment.CommentStatus.APPROVED)
+        incremental = self.stats()
+        ProductReviewStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_review_stats', stdout=out)
+        self.assertIn('1 products', out.getvalue())
+        rebuilt = self.stats()
+        self.assertEqual(
+            (rebuilt.approved_count, rebuilt.recommend_count, rebuilt.last_review_at),
+            (incremental.approved_count, incremental.recommend_count, incremental.last_review_at),
+        )
+        self.assertAlmostEqual(rebuilt.satisfaction, incremental.satisfaction)
+
+    def test_top_rated_sort_prefers_more_evidence(self):
+        popular = Product.objects.create(category=self.category, name='popular', main_image='product.jpg', price=100)
+        for _ in range(10):
+            self.comment(product=popular, status=Comment.CommentStatus.APPROVED)
+        self.comment(status=Comment.CommentStatus.APPROVED)
+        response = self.client.get(reverse('product-list'), {'sort_query': 'top-rated'})
+        self.assertEqual(list(response.context['object_list'])[:2], [popular, self.product])
+        self.assertContains(response, '100% از 10')
+
+    def test_product_with_reviews_can_be_deleted(self):
+        self.comment(status=Comment.CommentStatus.APPROVED)
+        self.product.delete()
+        self.assertFalse(ProductReviewStats.objects.exists())
+
+
 class CommentCreateView(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -322,4 +747,480 @@ class CommentCreateView(TestCase):
         )
         comment = Comment.objects.get()
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(comment.title, 'nice')
\ No newline at end of file
+        self.assertEqual(comment.title, 'nice')
+
+class TestProductFacets(TestCase):
+    def setUp(self):
+        self.parent = Category.objects.create(name='digital', image='test.jpg')
+        self.child = Category.objects.create(name='mobile', parent=self.parent, image='test.jpg')
+        self.brand = Brand.objects.create(name='test brand')
+        self.product1 = Product.objects.create(
+            category=self.child,
+            brand=self.brand,
+            name='test product1',
+            price=500_000,
+        )
+        self.product2 = Product.objects.create(
+            category=self.parent,
+            name='test product2',
+            price=30_000_000,
+        )
+        FeatureOption.objects.create(
+            product=self.product1,
+            feature=FeatureOption.Feature.Color,
+            color=FeatureOption.Color.RED,
+        )
+        FeatureOption.objects.create(
+            product=self.product2,
+            feature=FeatureOption.Feature.Size,
+            value='XL',
+        )
+
+    def test_facet_counts(self):
+        facets = compute_product_facets(Product.objects.active())
+        self.assertEqual(facets['categories'], [{'slug': 'digital', 'name': 'digital', 'count': 2}])
+        self.assertEqual(facets['brands'], [{'brand__slug': 'test-brand', 'brand__name': 'test brand', 'count': 1}])
+        self.assertEqual(facets['colors'], [{'code': 'red', 'name': 'red', 'count': 1}])
+        self.assertEqual(facets['sizes'], [{'value': 'XL', 'count': 1}])
+        self.assertEqual([bucket['count'] for bucket in facets['prices']], [1, 0, 0, 1, 0])
+
+    def test_facet_queries_are_bounded(self):
+        with self.assertNumQueries(5):
+            compute_product_facets(Product.objects.active())
+
+    def test_facets_are_cached_until_catalog_changes(self):
+        get_product_facets(Product.objects.active(), {})
+        with self.assertNumQueries(0):
+            get_product_facets(Product.objects.active(), {})
+        self.product2.is_active = False
+        self.product2.save()
+        facets = get_product_facets(Product.objects.active(), {})
+        self.assertEqual(facets['categories'][0]['count'], 1)
+
+    def test_filtering_sort_has_its_own_facets(self):
+        cache.clear()
+        self.product1.discount = Discount.objects.create(value=10, start_date=timezone.now() - timezone.timedelta(days=1))
+        self.product1.save()
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.context['facets']['categories'][0]['count'], 2)
+        response = self.client.get(reverse('product-list'), {'sort_query': 'discounted'})
+        self.assertEqual(list(response.context['object_list']), [self.product1])
+        self.assertEqual(response.context['facets']['categories'][0]['count'], 1)
+
+    def test_product_list_view_filter_by_color(self):
+        response = self.client.get(reverse('product-list'), {'color': 'red'})
+        self.assertEqual(list(response.context['object_list']), [self.product1])
+        self.assertEqual(response.context['facets']['colors'][0]['count'], 1)
+
+
+class TestProductCard(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='test category', image='test.jpg')
+        self.discount = Discount.objects.create(
+            value=20,
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            expire_date=timezone.now() + timezone.timedelta(days=1),
+        )
+        self.product = Product.objects.create(
+            category=self.category,
+            name='test product',
+            main_image='product.jpg',
+            price=1000,
+            stock=3,
+            discount=self.discount,
+            status=Product.ProductStatus.AVAILABLE,
+        )
+
+    def test_card_created_on_save(self):
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual(card.final_price, 800)
+        self.assertEqual(card.discount_percent, 20)
+        self.assertTrue(card.has_discount)
+        self.assertEqual(card.url, self.product.get_absolute_url())
+        self.assertEqual(card.thumbnail_url, self.product.main_image.url)
+
+    def test_card_refreshed_on_discount_change(self):
+        self.discount.is_active = False
+        self.discount.save()
+        card = ProductCard.objects.get(product=self.product)
+        self.assertFalse(card.has_discount)
+        self.assertEqual(card.final_price, 1000)
+
+    def test_card_refreshed_on_discount_delete(self):
+        self.discount.delete()
+        card = ProductCard.objects.get(product=self.product)
+        self.assertFalse(card.has_discount)
+        self.assertEqual(card.final_price, 1000)
+
+    def test_rebuild_product_cards_command(self):
+        ProductCard.objects.all().delete()
+        call_command('rebuild_product_cards', stdout=StringIO())
+        self.assertEqual(ProductCard.objects.get(product=self.product).final_price, 800)
+
+    def test_listing_reads_cards_in_one_query(self):
+        products = with_cards(Product.objects.active())
+        with self.assertNumQueries(1):
+            cards = [product.card.final_price for product in products]
+        self.assertEqual(cards, [800])
+
+    def test_home_and_list_render_cards(self):
+        for url in (reverse('home'), reverse('product-list')):
+            response = self.client.get(url)
+            self.assertContains(response, self.product.get_absolute_url())
+            self.assertContains(response, '20%')
+
+
+class TestEffectivePrice(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='test category', image='test.jpg')
+        self.discount = Discount.objects.create(
+            value=50,
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            expire_date=timezone.now() + timezone.timedelta(days=1),
+        )
+        self.discounted = Product.objects.create(
+            category=self.category,
+            name='discounted product',
+            price=1000,
+            discount=self.discount,
+        )
+        self.regular = Product.objects.create(
+            category=self.category,
+            name='regular product',
+            price=700,
+        )
+
+    def test_effective_price_on_save(self):
+        self.assertEqual(self.discounted.effective_price, 500)
+        self.assertEqual(self.regular.effective_price, 700)
+        self.assertEqual(self.discounted.price_changes_at, self.discount.expire_date + timezone.timedelta(microseconds=1))
+
+    def test_effective_price_follows_discount(self):
+        self.discount.value = 10
+        self.discount.save()
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 900)
+        self.discount.delete()
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 1000)
+        self.assertIsNone(self.discounted.price_changes_at)
+
+    def test_price_sorting_and_filter_use_effective_price(self):
+        self.assertEqual(list(Product.objects.cheapest()), [self.discounted, self.regular])
+        response = self.client.get(reverse('product-list'), {'max_price': '600'})
+        self.assertEqual(list(response.context['object_list']), [self.discounted])
+
+    def test_scheduled_discount_start_and_expire(self):
+        start = timezone.now() + timezone.timedelta(hours=1)
+        expire = start + timezone.timedelta(hours=1)
+        self.discount.start_date = start
+        self.discount.expire_date = expire
+        self.discount.save()
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 1000)
+        self.assertEqual(self.discounted.price_changes_at, start)
+
+        self.assertEqual(apply_due_price_changes(now=start), 1)
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 500)
+        self.assertEqual(ProductCard.objects.get(product=self.discounted).final_price, 500)
+
+        apply_due_price_changes(now=expire + timezone.timedelta(seconds=1))
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 1000)
+        self.assertIsNone(self.discounted.price_changes_at)
+
+    def test_apply_price_schedule_command(self):
+        Product.objects.filter(pk=self.discounted.pk).update(
+            effective_price=1000,
+            price_changes_at=timezone.now() - timezone.timedelta(seconds=1),
+        )
+        call_command('apply_price_schedule', stdout=StringIO())
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, 500)
+
+
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='test category', image='test.jpg')
+        self.products = [
+            Product.objects.create(
+                category=category,
+                name=f'test product {index}',
+                price=100 * (index % 3),
+                total_sell=index % 2,
+            )
+            for index in range(7)
+        ]
+
+    def walk(self, queryset, per_page=3):
+        paginator = KeysetPaginator(queryset, per_page)
+        self.assertTrue(paginator.supported)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_pages_follow_each_ordering(self):
+        for queryset in (
+            Product.objects.active(),
+            Product.objects.newest(),
+            Product.objects.cheapest(),
+            Product.objects.most_expensive(),
+            Product.objects.active().order_by('total_sell'),
+        ):
+            paginator, pages = self.walk(queryset)
+            walked = [product for page in pages for product in page]
+            self.assertEqual(walked, list(queryset.order_by(*paginator._ordering(False))))
+
+    def test_previous_cursor(self):
+        paginator, pages = self.walk(Product.objects.cheapest())
+        previous = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertFalse(pages[0].has_previous())
+
+    def test_total_is_cached(self):
+        paginator = KeysetPaginator(Product.objects.active(), 3)
+        self.assertEqual(paginator.page().total, 7)
+        with self.assertNumQueries(1):
+            paginator.page()
+
+    def test_relevance_ordering_not_supported(self):
+        self.assertFalse(KeysetPaginator(Product.objects.search('test'), 3).supported)
+
+    @override_settings(PRODUCT_LIST_KEYSET_PAGINATION=True)
+    def test_nullable_ordering_not_supported(self):
+        # bulk imported products have no review stats row to sort on
+        ProductReviewStats.objects.filter(product=self.products[0]).delete()
+        self.assertFalse(KeysetPaginator(Product.objects.active().order_by('-review_stats__satisfaction'), 3).supported)
+        response = self.client.get(reverse('product-list'), {'sort_query': 'top-rated'})
+        self.assertIn(self.products[0], response.context['object_list'])
+
+    def test_filtering_sort_has_its_own_total(self):
+        cache.clear()
+        discount = Discount.objects.create(value=10, start_date=timezone.now() - timezone.timedelta(days=1))
+        self.products[1].discount = discount
+        self.products[1].save()
+        self.assertEqual(KeysetPaginator(Product.objects.active(), 3, params={}).total(), 7)
+        discounted = KeysetPaginator(Product.objects.with_discount(), 3, params={'sort_query': 'discounted'})
+        self.assertEqual(discounted.total(), 1)
+
+    def test_tampered_cursor_starts_over(self):
+        paginator = KeysetPaginator(Product.objects.active(), 3)
+        self.assertEqual(list(paginator.page('garbage')), list(paginator.page()))
+
+    @override_settings(PRODUCT_LIST_KEYSET_PAGINATION=True)
+    def test_product_list_view(self):
+        response = self.client.get(reverse('product-list'), {'sort_query': 'cheapest'})
+        self.assertTrue(response.context['keyset_pagination'])
+        self.assertEqual(len(response.context['object_list']), 7)
+        self.assertIsNone(response.context['next_page_url'])
+
+
+class TestProductsByCategoryDepth(TestCase):
+    def setUp(self):
+        root = Category.objects.create(name='root', image='test.jpg')
+        child = Category.objects.create(name='child', parent=root, image='test.jpg')
+        grandchild = Category.objects.create(name='grandchild', parent=child, image='test.jpg')
+        self.product = Product.objects.create(category=grandchild, name='deep product', price=100)
+
+    def test_by_category_any_depth(self):
+        self.assertIn(self.product, Product.objects.by_category('root'))
+
+    def test_product_list_category_filter_any_depth(self):
+        response = self.client.get(reverse('product-list'), {'category_slug': 'root'})
+        self.assertEqual(list(response.context['object_list']), [self.product])
+
+
+class TestHomeSectionCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.site_setting = SiteSettings.objects.create(site_name='Test Shop name')
+        self.banner = SliderBanners.objects.create(site_setting=self.site_setting, title='slider', image='slider.jpg')
+        category = Category.objects.create(name='test category', image='test.jpg')
+        self.product = Product.objects.create(
+            category=category,
+            name='cached product',
+            main_image='product.jpg',
+            price=100,
+        )
+
+    def test_sections_cached_between_requests(self):
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'))
+        section_tables = ('products_', 'categories_', 'core_')
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if any(f'FROM "{table}' in query['sql'] for table in section_tables)
+        ])
+
+    def test_banner_edit_keeps_product_sections(self):
+        self.client.get(reverse('home'))
+        versions = get_home_section_versions()
+        self.banner.title = 'new title'
+        self.banner.save()
+        new_versions = get_home_section_versions()
+        self.assertNotEqual(new_versions['slider_banners'], versions['slider_banners'])
+        for section in PRODUCT_SECTIONS:
+            self.assertEqual(new_versions[section], versions[section])
+
+    def test_product_change_refreshes_rails(self):
+        self.client.get(reverse('home'))
+        self.product.name = 'renamed product'
+        self.product.save()
+        self.assertContains(self.client.get(reverse('home')), 'renamed product')
+
+
+class CatalogImportTest(TestCase):
+    CSV = (
+        'slug,name,short_description,description,price,stock,status,category,brand,main_image,images,specifications,colors,sizes\n'
+        'phone,phone,short,long,1000,5,a,phones,acme,products/phone.jpg,products/a.jpg|products/b.jpg,ram=8GB|cpu=8 cores,red|blue,\n'
+        ',cheap phone,short,long,200,0,na,phones,,products/cheap.jpg,,,black,\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='phones', slug='phones', image='category.jpg')
+        self.brand = Brand.objects.create(name='acme', slug='acme')
+
+    def write_file(self, suffix, content):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), f'catalog.{suffix}')
+        with open(path, 'w', encoding='utf-8') as catalog_file:
+            catalog_file.write(content)
+        return path
+
+    def import_catalog(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        out, _ = self.import_catalog(self.write_file('csv', self.CSV), '--batch-size', '1')
+        self.assertIn('2 products created, 0 updated, 0 failed.', out)
+
+        phone = Product.objects.get(slug='phone')
+        self.assertEqual((phone.brand, phone.category, phone.price, phone.effective_price), (self.brand, self.category, 1000, 1000))
+        self.assertEqual(sorted(phone.images.values_list('image', flat=True)), ['products/a.jpg', 'products/b.jpg'])
+        self.assertEqual(dict(phone.specifications.values_list('key', 'value')), {'ram': '8GB', 'cpu': '8 cores'})
+        self.assertEqual(sorted(phone.feature_options.values_list('color', flat=True)), ['blue', 'red'])
+        self.assertEqual(phone.card.final_price, 1000)
+        self.assertTrue(ProductReviewStats.objects.filter(product=phone).exists())
+        self.assertEqual(list(Product.objects.search('phone').order_by('slug')), [Product.objects.get(slug='cheap-phone'), phone])
+
+    def test_existing_slugs_need_upsert(self):
+        self.import_catalog(self.write_file('csv', self.CSV))
+        update = self.write_file('csv', 'slug,price,colors\nphone,800,green\n')
+
+        out, err = self.import_catalog(update)
+        self.assertIn('0 updated, 1 failed.', out)
+        self.assertIn('line 2: slug: A product with the slug "phone" already exists.', err)
+
+        out, _ = self.import_catalog(update, '--upsert')
+        self.assertIn('0 products created, 1 updated, 0 failed.', out)
+        phone = Product.objects.get(slug='phone')
+        self.assertEqual((phone.name, phone.price, phone.card.price), ('phone', 800, 800))
+        self.assertEqual(list(phone.feature_options.values_list('color', flat=True)), ['green'])
+        # columns missing from the file leave the related rows alone
+        self.assertEqual(phone.images.count(), 2)
+
+    def test_invalid_rows_are_reported(self):
+        rows = [
+            {'slug': 'ok', 'name': 'ok', 'short_description': 's', 'description': 'd', 'price': 10,
+             'status': 'a', 'category': 'phones', 'main_image': 'products/ok.jpg', 'sizes': ['XL']},
+            {'slug': 'bad-price', 'name': 'bad', 'short_description': 's', 'description': 'd', 'price': -1,
+             'status': 'a', 'category': 'phones', 'main_image': 'products/bad.jpg'},
+            {'slug': 'no-category', 'name': 'bad', 'short_description': 's', 'description': 'd', 'price': 1,
+             'status': 'a', 'category': 'tablets', 'main_image': 'products/bad.jpg'},
+            {'slug': 'bad-color', 'name': 'bad', 'short_description': 's', 'description': 'd', 'price': 1,
+             'status': 'a', 'category': 'phones', 'main_image': 'products/bad.jpg', 'colors': ['plaid']},
+        ]
+        content = '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n'
+        out, err = self.import_catalog(self.write_file('jsonl', content), '--batch-size', '2')
+        self.assertIn('1 products created, 0 updated, 4 failed.', out)
+        self.assertIn('line 2: price:', err)
+        self.assertIn('line 3: category: Unknown category "tablets".', err)
+        self.assertIn('line 4: color:', err)
+        self.assertIn('line 5: Invalid JSON', err)
+        self.assertEqual(list(Product.objects.values_list('slug', flat=True)), ['ok'])
+        self.assertEqual(list(Product.objects.get().feature_options.values_list('value', flat=True)), ['XL'])
+
+
+class PriceHistogramTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = Category.objects.create(name='electronics', slug='electronics', image='category.jpg')
+        self.child = Category.objects.create(name='phones', slug='phones', parent=self.parent, image='category.jpg')
+        self.other = Category.objects.create(name='books', slug='books', image='category.jpg')
+        self.cheap, self.mid, self.dear = [
+            Product.objects.create(category=self.child, name=name, main_image='product.jpg', price=price)
+            for name, price in (('cheap', 150_000), ('mid', 3_000_000), ('dear', 60_000_000))
+        ]
+        self.book = Product.objects.create(category=self.other, name='book', main_image='product.jpg', price=90_000)
+
+    def histogram(self, slug=None):
+        histogram = get_price_histogram(slug)
+        return histogram['min'], histogram['max'], [(bucket['min'], bucket['count']) for bucket in histogram['buckets']]
+
+    def snapshot(self):
+        return {slug: self.histogram(slug) for slug in (None, 'electronics', 'phones', 'books')}
+
+    def test_histograms_per_category_subtree(self):
+        self.assertEqual(self.histogram('electronics'), (150_000, 60_000_000, [
+            (100_000, 1), (200_000, 0), (500_000, 0), (1_000_000, 0), (2_000_000, 1), (5_000_000, 0),
+            (10_000_000, 0), (20_000_000, 0), (50_000_000, 1),
+        ]))
+        self.assertEqual(self.histogram('phones'), self.histogram('electronics'))
+        self.assertEqual(self.histogram('books'), (90_000, 90_000, [(0, 1)]))
+        self.assertEqual(self.histogram()[:2], (90_000, 60_000_000))
+        self.assertEqual(self.histogram('missing'), (0, 0, []))
+
+    def test_product_changes_update_incrementally(self):
+        self.dear.is_active = False
+        self.dear.save()
+        self.assertEqual(self.histogram('electronics'), (150_000, 3_000_000, [(100_000, 1), (200_000, 0), (500_000, 0), (1_000_000, 0), (2_000_000, 1)]))
+
+        self.cheap.category = self.other
+        self.cheap.save()
+        self.assertEqual(self.histogram('books')[:2], (90_000, 150_000))
+        self.assertEqual(self.histogram('electronics')[:2], (3_000_000, 3_000_000))
+
+        discount = Discount.objects.create(value=50, start_date=timezone.now() - timezone.timedelta(days=1))
+        self.mid.discount = discount
+        self.mid.save()
+        self.assertEqual(self.histogram('phones'), (1_500_000, 1_500_000, [(1_000_000, 1)]))
+        discount.delete()
+        self.assertEqual(self.histogram('phones'), (3_000_000, 3_000_000, [(2_000_000, 1)]))
+
+        self.book.delete()
+        self.assertEqual(self.histogram('books'), (150_000, 150_000, [(100_000, 1)]))
+
+        incremental = self.snapshot()
+        call_command('rebuild_price_histograms', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_partially_loaded_products_update_incrementally(self):
+        product = Product.objects.only('pk', 'name').get(pk=self.dear.pk)
+        self.assertEqual(product._loaded_values, {})
+        product.is_active = False
+        with mock.patch('products.services.price_histograms.rebuild_price_histograms') as rebuild:
+            product.save()
+            Product.objects.only('pk').get(pk=self.book.pk).delete()
+        rebuild.assert_not_called()
+        self.assertEqual(self.histogram('electronics')[:2], (150_000, 3_000_000))
+        self.assertEqual(self.histogram()[:2], (150_000, 3_000_000))
+        self.assertEqual(PriceHistogram.objects.filter(category__isnull=True).count(), 1)
+
+    def test_moving_a_category_rebuilds(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(self.histogram('electronics'), (0, 0, []))
+        self.assertEqual(self.histogram('books')[:2], (90_000, 60_000_000))
+
+    def test_product_list_slider_bounds(self):
+        get_price_histogram()
+        with self.assertNumQueries(0):
+            get_price_histogram('phones')
+        response = self.client.get(reverse('product-list'), {'category_slug': 'phones'})
+        self.assertEqual(response.context['price_histogram']['max'], 60_000_000)
+        self.assertContains(response, 'data-max="60000000"')
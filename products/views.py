@@ -1,33 +1,47 @@
-from django.db.models import Q
-from django.utils import timezone
+from django.conf import settings
+from django.db.models import F
 from django.views import generic
 from django.contrib import messages
+from django.http import Http404
 from django.shortcuts import redirect
 
-from core.models import SliderBanners, SideBanners, MiddleBanners, SiteSettings
-from core.services.site_cache import get_site_context
-from categories.models import Category
+from categories.models import Category, CategoryClosure
+from search.backends import get_backend as get_search_backend
 from cart.forms import AddToCartForm
 from .models import Product, FeatureOption, Comment
 from .forms import CommentForm
+from .services.facets import get_product_facets
+from .services.price_histograms import get_price_histogram
+from .services.home_cache import (
+    HOME_CACHE_TIMEOUT,
+    get_home_section,
+    get_home_section_versions,
+    lazy_home_section,
+)
+from .services.comments import load_comment_page
+from .services.product_page import get_product_page, product_page_queryset
+from .services.pagination import KeysetPaginator, KeysetPage
+from .services.product_cards import with_cards
 
 class HomeView(generic.TemplateView):
     template_name = 'products/home.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        site_context = get_site_context(self.request)
+        versions = get_home_section_versions()
         context.update({
-            'discounted_products':Product.objects.with_discount()[:20],
-            'newest_products':Product.objects.newest().select_related('discount')[:20],
-            'top_categories':site_context['categories'].filter(parent__isnull=True)[:6],
-            'best_sell_products':Product.objects.active().select_related('discount').order_by('total_sell')[:20],
+            'home_versions': versions,
+            'home_cache_timeout': HOME_CACHE_TIMEOUT,
+            'discounted_products': lazy_home_section('discounted_products', versions['discounted_products']),
+            'newest_products': lazy_home_section('newest_products', versions['newest_products']),
+            'top_categories': lazy_home_section('top_categories', versions['top_categories']),
+            'best_sell_products': lazy_home_section('best_sell_products', versions['best_sell_products']),
         })
-        if SiteSettings.objects.all().first():
+        if get_home_section('site_settings', versions['site_settings']):
             context.update({
-            'slider_banners': SliderBanners.objects.all(),
-            'side_banners': SideBanners.objects.all(),
-            'middleBanners':MiddleBanners.objects.all(),
+            'slider_banners': lazy_home_section('slider_banners', versions['slider_banners']),
+            'side_banners': lazy_home_section('side_banners', versions['side_banners']),
+            'middleBanners': lazy_home_section('middle_banners', versions['middle_banners']),
             })
         messages.success(self.request, 'توسعه دهنده بک اند: Anes')
         return context
@@ -40,10 +54,11 @@ class ProductListView(generic.ListView):
     def get_queryset(self):
         sort_query_map = {
             'newest': lambda: Product.objects.newest(),
-            'best-sell': lambda: Product.objects.active().order_by('total_sell'),
+            'best-sell': lambda: Product.objects.active().order_by('-trending_score'),
             'most-expensive': lambda: Product.objects.most_expensive(),
             'cheapest': lambda: Product.objects.cheapest(),
             'discounted': lambda: Product.objects.with_discount(),
+            'top-rated': lambda: Product.objects.active().order_by('-review_stats__satisfaction'),
         }
         queryset = Product.objects.active()
         min_price = self.request.GET.get('min_price')
@@ -52,45 +67,68 @@ class ProductListView(generic.ListView):
         brand_slug = self.request.GET.get('brand_slug')
         available = self.request.GET.get('available')
         special = self.request.GET.get('special')
+        color = self.request.GET.get('color')
+        size = self.request.GET.get('size')
 
         sort_query = self.request.GET.get('sort_query')
         search_query = self.request.GET.get('q')
 
         if sort_query in sort_query_map:
             queryset = sort_query_map[sort_query]()
-        if min_price and max_price:
-            queryset = queryset.filter(price__gte=min_price, price__lte=max_price)
+        if min_price:
+            queryset = queryset.filter(effective_price__gte=min_price)
+        if max_price:
+            queryset = queryset.filter(effective_price__lte=max_price)
         if category_slug:
-            queryset = queryset.filter(Q(category__slug=category_slug) | Q(category__parent__slug=category_slug))\
-            .select_related('category')
+            queryset = queryset.filter(category__in=CategoryClosure.objects.filter(
+                ancestor__slug=category_slug).values('descendant'))
         if brand_slug:
             queryset = queryset.filter(brand__slug=brand_slug)
+        if color:
+            queryset = queryset.filter(pk__in=FeatureOption.objects.filter(
+                feature=FeatureOption.Feature.Color, color=color).values('product'))
+        if size:
+            queryset = queryset.filter(pk__in=FeatureOption.objects.filter(
+                feature=FeatureOption.Feature.Size, value=size).values('product'))
         if available:
             queryset = queryset.filter(status=Product.ProductStatus.AVAILABLE)
         if special:
-            now = timezone.now()
-            queryset = queryset.filter(
-            Q(discount__start_date__lte=now) | Q(discount__start_date__isnull=True),
-            Q(discount__expire_date__gte=now) | Q(discount__expire_date__isnull=True),
-            discount__is_active=True,
-        ).select_related('discount').order_by('-discount__value')
+            queryset = queryset.filter(effective_price__lt=F('price')).order_by('-discount__value')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(brand__name__icontains=search_query)|
-                Q(name__icontains=search_query) |
-                Q(short_description__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-
-
-
-        return queryset.select_related('discount')
+            queryset = get_search_backend().filter(queryset, search_query)
+            if sort_query not in sort_query_map and not special:
+                queryset = queryset.order_by('-search_rank', '-created_at')
+
+        return with_cards(queryset)
+
+    def paginate_queryset(self, queryset, page_size):
+        if getattr(settings, 'PRODUCT_LIST_KEYSET_PAGINATION', False):
+            paginator = KeysetPaginator(queryset, page_size, params=self.request.GET)
+            if paginator.supported:
+                page = paginator.page(self.request.GET.get('cursor'))
+                return paginator, page, page.object_list, page.has_other_pages()
+        return super().paginate_queryset(queryset, page_size)
+
+    def get_cursor_url(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
+        page = context['page_obj']
+        if isinstance(page, KeysetPage):
+            context.update({
+                'keyset_pagination': True,
+                'next_page_url': self.get_cursor_url(page.next_cursor) if page.has_next() else None,
+                'previous_page_url': self.get_cursor_url(page.previous_cursor) if page.has_previous() else None,
+            })
         context.update({
             'parent_categories': Category.objects.filter(parent__isnull=True).select_related('parent').prefetch_related('children'),
+            'facets': get_product_facets(self.object_list, self.request.GET),
+            'price_histogram': get_price_histogram(self.request.GET.get('category_slug')),
             'search_form':True,
         })
         return context
@@ -102,34 +140,31 @@ class ProductDetailView(generic.DetailView):
     slug_url_kwarg = 'slug'
 
     def get_queryset(self):
-        return (Product.objects.active().select_related('discount', 'brand')
-                .prefetch_related('images', 'specifications', 'feature_options', 'product_comments'))
-
+        return product_page_queryset()
+
+    def get_object(self, queryset=None):
+        self.page = get_product_page(self.kwargs[self.slug_url_kwarg])
+        if self.page is None:
+            raise Http404('No product found matching the query')
+        return self.page['product']
+
+    def get_comment_page(self):
+        try:
+            number = int(self.request.GET.get('comments_page', 1))
+        except ValueError:
+            number = 1
+        # the first page is cached with the product page
+        if number == 1:
+            return self.page['comments']
+        return load_comment_page(self.object, number)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        related_products = Product.objects.by_category(category_slug=self.object.category.slug).exclude(id=self.object.id)
-        comments = Comment.objects.active().filter(product=self.object, parent__isnull=True).prefetch_related('replies').\
-            select_related('user').order_by('-created_at')
-
-        color_qs = (self.object.feature_options
-                    .filter(feature=FeatureOption.Feature.Color))
-        color_options = [
-            {'code': option.color, 'name': option.get_color_display()}
-            for option in color_qs
-        ]
-
-        size_options = list(
-            self.object.feature_options
-            .filter(feature=FeatureOption.Feature.Size)
-            .values_list('value', flat=True)
-        )
-
         context.update({
-            'related_products':related_products,
-            'color_options':color_options,
-            'size_options':size_options,
-            'comments':comments,
+            'related_products':self.page['related_products'],
+            'color_options':self.page['color_options'],
+            'size_options':self.page['size_options'],
+            'comments':self.get_comment_page(),
             'comment_form':CommentForm,
             'cart_form':AddToCartForm,
         })
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.text import gettext_lazy as _
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'search'
+    verbose_name = _("search")
+
+    def ready(self):
+        from . import signals
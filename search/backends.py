@@ -0,0 +1,130 @@
+import operator
+from collections import Counter
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, Max, Sum, OuterRef, Subquery, IntegerField
+from django.utils.module_loading import import_string
+
+from .models import SearchEntry
+from .normalizer import tokenize
+
+
+DEFAULT_BACKEND = 'search.backends.DatabaseSearchBackend'
+
+# how much a single occurrence of a term is worth in each part of the product
+FIELD_WEIGHTS = (
+    ('name', 8),
+    ('brand', 4),
+    ('short_description', 2),
+    ('description', 1),
+)
+
+
+def get_backend():
+    return import_string(getattr(settings, 'SEARCH_BACKEND', DEFAULT_BACKEND))()
+
+
+def product_terms(product):
+    """Return a Counter of weighted terms for the searchable text of a product."""
+    texts = {
+        'name': product.name,
+        'brand': product.brand.name if product.brand_id else '',
+        'short_description': product.short_description,
+        'description': product.description,
+    }
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(texts[field]):
+            terms[term] += weight
+    return terms
+
+
+class BaseSearchBackend:
+    def index_product(self, product):
+        raise NotImplementedError
+
+    def remove_product(self, product_id):
+        raise NotImplementedError
+
+    def index_products(self, products):
+        """(Re)index a batch of products, e.g. after they were written in bulk without signals."""
+        for product in products:
+            self.index_product(product)
+
+    def rebuild(self, products, batch_size=500):
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """
+        Narrow a Product queryset down to the products matching every term of the query
+        and annotate it with a `search_rank` (higher is more relevant).
+        """
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Inverted index stored in the SearchEntry table.
+
+    Every query term is matched as a prefix of an indexed term (`LIKE 'term%'`),
+    which the (term, product) index serves as a range scan on MySQL and SQLite alike,
+    so the product text columns are never scanned.
+    """
+
+    def _entries(self, product):
+        return [
+            SearchEntry(term=term, product_id=product.pk, weight=weight)
+            for term, weight in product_terms(product).items()
+        ]
+
+    @transaction.atomic
+    def index_product(self, product):
+        SearchEntry.objects.filter(product_id=product.pk).delete()
+        SearchEntry.objects.bulk_create(self._entries(product))
+
+    def remove_product(self, product_id):
+        SearchEntry.objects.filter(product_id=product_id).delete()
+
+    @transaction.atomic
+    def index_products(self, products):
+        products = list(products)
+        SearchEntry.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        SearchEntry.objects.bulk_create([entry for product in products for entry in self._entries(product)])
+
+    @transaction.atomic
+    def rebuild(self, products, batch_size=500):
+        SearchEntry.objects.all().delete()
+        indexed = 0
+        entries = []
+        for product in products.select_related('brand').iterator(chunk_size=batch_size):
+            entries.extend(self._entries(product))
+            indexed += 1
+            if len(entries) >= batch_size:
+                SearchEntry.objects.bulk_create(entries, batch_size=batch_size)
+                entries = []
+        SearchEntry.objects.bulk_create(entries, batch_size=batch_size)
+        return indexed
+
+    def filter(self, queryset, query):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return queryset.none()
+
+        entries = SearchEntry.objects.filter(
+            reduce(operator.or_, [Q(term__startswith=term) for term in terms])
+        )
+        matched_terms = reduce(operator.add, [
+            Max(Case(When(term__startswith=term, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for term in terms
+        ])
+        hits = (entries.values('product')
+                .annotate(matched_terms=matched_terms)
+                .filter(matched_terms=len(terms))
+                .values('product'))
+        rank = (entries.filter(product=OuterRef('pk'))
+                .values('product')
+                .annotate(rank=Sum('weight'))
+                .values('rank'))
+        return queryset.filter(pk__in=hits).annotate(search_rank=Subquery(rank, output_field=IntegerField()))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from search.backends import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = get_backend().rebuild(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{indexed} products indexed.'))
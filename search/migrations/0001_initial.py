@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='term')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='weight')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'Search entry',
+                'verbose_name_plural': 'Search entries',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+    ]
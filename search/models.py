@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils.text import gettext_lazy as _
+
+from products.models import Product
+
+
+class SearchEntry(models.Model):
+    """
+    One row of the inverted index: a normalized term and the weighted number of times
+    it appears in the text of a product.
+    """
+    term = models.CharField(_('term'), max_length=64)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('product'),
+    )
+    weight = models.PositiveIntegerField(_('weight'), default=1)
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id} ({self.weight})"
+
+    class Meta:
+        unique_together = ('term', 'product')
+        verbose_name = _('Search entry')
+        verbose_name_plural = _('Search entries')
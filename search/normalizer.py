@@ -0,0 +1,41 @@
+import re
+
+
+ZWNJ = '\u200c'
+
+CHARACTER_MAP = str.maketrans({
+    # arabic letters that are typed instead of the persian ones
+    '\u064a': '\u06cc',  # ي -> ی
+    '\u0649': '\u06cc',  # ى -> ی
+    '\u0626': '\u06cc',  # ئ -> ی
+    '\u0643': '\u06a9',  # ك -> ک
+    '\u0629': '\u0647',  # ة -> ه
+    '\u06c0': '\u0647',  # ۀ -> ه
+    '\u0623': '\u0627',  # أ -> ا
+    '\u0625': '\u0627',  # إ -> ا
+    '\u0622': '\u0627',  # آ -> ا
+    '\u0624': '\u0648',  # ؤ -> و
+    # persian and arabic-indic digits
+    **{chr(0x06f0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    # zero width non-joiner glues the parts of a word together: «لپ‌تاپ» == «لپتاپ»
+    ZWNJ: '',
+    # tatweel
+    '\u0640': '',
+})
+
+DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670]')
+TOKEN_RE = re.compile(r'\w+')
+
+MAX_TERM_LENGTH = 64
+
+
+def normalize(text):
+    if not text:
+        return ''
+    text = DIACRITICS_RE.sub('', str(text).translate(CHARACTER_MAP))
+    return text.casefold()
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalize(text))]
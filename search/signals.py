@@ -0,0 +1,63 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from categories.models import Category, Brand
+from products.models import Product
+from .backends import get_backend
+from .suggestions import suggestion_index, product_suggestion, brand_suggestion, category_suggestion
+
+
+INDEXED_FIELDS = {'name', 'brand', 'short_description', 'description'}
+SUGGESTED_FIELDS = {'name', 'slug', 'is_active', 'total_sell'}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    get_backend().index_product(instance)
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    backend = get_backend()
+    for product in instance.brand_products.select_related('brand').iterator():
+        backend.index_product(product)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_suggestion(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not SUGGESTED_FIELDS.intersection(update_fields):
+        return
+    suggestion = None
+    if instance.is_active:
+        suggestion = product_suggestion(instance.pk, instance.name, instance.slug, instance.total_sell)
+    suggestion_index.replace('products', instance.pk, suggestion)
+
+
+SUGGESTION_BUILDERS = {Brand: ('brands', brand_suggestion), Category: ('categories', category_suggestion)}
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def refresh_group_suggestion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    kind, build = SUGGESTION_BUILDERS[sender]
+    # renames don't change the sales, they are recounted on the next rebuild
+    old = suggestion_index.suggestions.get((kind, instance.pk))
+    suggestion_index.replace(kind, instance.pk, build(instance.pk, instance.name, instance.slug, old.sales if old else 0))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    kind = 'products' if sender is Product else SUGGESTION_BUILDERS[sender][0]
+    suggestion_index.replace(kind, instance.pk)
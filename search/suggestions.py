@@ -0,0 +1,259 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.shortcuts import reverse
+
+from categories.models import Category, Brand
+from products.models import Product
+from .normalizer import tokenize
+
+
+SUGGESTION_KINDS = ('products', 'brands', 'categories')
+# suggestions returned per kind
+SUGGESTION_LIMITS = {'products': 6, 'brands': 3, 'categories': 3}
+# how often a process checks whether another one changed the catalog, in seconds
+SUGGEST_SYNC_INTERVAL = 10
+SUGGEST_VERSION_KEY = 'search_suggest_version'
+# what changed at every version, so the other processes patch their index instead of rebuilding it
+SUGGEST_CHANGES_KEY = 'search_suggest_changes:{}'
+SUGGEST_CHANGES_TIMEOUT = 60 * 10
+# a process further behind than this rebuilds rather than replaying the changes
+MAX_REPLAYED_CHANGES = 100
+# a single letter matches too much of the catalog to be worth an answer
+MIN_QUERY_LENGTH = 2
+# answers kept per prefix, dropped on every change of the index
+MAX_MEMOIZED_QUERIES = 5000
+
+Suggestion = namedtuple('Suggestion', ['kind', 'pk', 'name', 'url', 'sales', 'keys'])
+
+
+def suggestion_keys(name):
+    """The normalized name from every one of its words on, so a query matches any word of it."""
+    terms = tokenize(name)
+    return [' '.join(terms[start:]) for start in range(len(terms))]
+
+
+def _suggestion(kind, pk, name, url, sales):
+    return Suggestion(kind, pk, name, url, sales, suggestion_keys(name))
+
+
+def _list_url(**params):
+    return f"{reverse('product-list')}?{urlencode(params)}"
+
+
+def product_suggestion(pk, name, slug, sales):
+    return _suggestion('products', pk, name, reverse('product-detail', args=[slug]), sales)
+
+
+def brand_suggestion(pk, name, slug, sales):
+    return _suggestion('brands', pk, name, _list_url(brand_slug=slug), sales)
+
+
+def category_suggestion(pk, name, slug, sales):
+    return _suggestion('categories', pk, name, _list_url(category_slug=slug), sales)
+
+
+def _active_sales(relation):
+    return Coalesce(Sum(f'{relation}__total_sell', filter=Q(**{f'{relation}__is_active': True})), 0)
+
+
+def load_suggestions():
+    """Every suggestion of the catalog, from three narrow queries."""
+    for row in Product.objects.active().values_list('pk', 'name', 'slug', 'total_sell').iterator(chunk_size=2000):
+        yield product_suggestion(*row)
+    for row in Brand.objects.annotate(sales=_active_sales('brand_products')).values_list('pk', 'name', 'slug', 'sales'):
+        yield brand_suggestion(*row)
+    for row in Category.objects.annotate(sales=_active_sales('category_products')).values_list('pk', 'name', 'slug', 'sales'):
+        yield category_suggestion(*row)
+
+
+def get_suggest_version():
+    version = cache.get(SUGGEST_VERSION_KEY)
+    if version is None:
+        cache.add(SUGGEST_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(SUGGEST_VERSION_KEY)
+    return version
+
+
+class SuggestionIndex:
+    """
+    Typeahead index of one process: a sorted list of (key, kind, pk) searched with bisect,
+    so a prefix is a contiguous slice. Built on first use, patched by the catalog signals of
+    this process and by the changes other processes announce with the shared version, and
+    rebuilt when those changes are no longer in the cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.keys = None
+        self.suggestions = {}
+        self.memo = {}
+        self.version = None
+        self.synced_at = 0
+
+    def build(self):
+        with self.lock:
+            version = get_suggest_version()
+            suggestions = {(suggestion.kind, suggestion.pk): suggestion for suggestion in load_suggestions()}
+            self.keys = sorted(
+                (key, suggestion.kind, suggestion.pk)
+                for suggestion in suggestions.values() for key in suggestion.keys
+            )
+            self.suggestions = suggestions
+            self.memo = {}
+            self.version, self.synced_at = version, time.monotonic()
+
+    def sync(self):
+        if self.keys is None:
+            self.build()
+        elif time.monotonic() - self.synced_at > SUGGEST_SYNC_INTERVAL:
+            version = get_suggest_version()
+            if version != self.version and not self._catch_up(version):
+                self.build()
+            self.synced_at = time.monotonic()
+
+    def _catch_up(self, version):
+        """Replay the changes announced since the version of the index, False if some are gone."""
+        if self.version is None or not self.version < version <= self.version + MAX_REPLAYED_CHANGES:
+            return False
+        keys = [SUGGEST_CHANGES_KEY.format(number) for number in range(self.version + 1, version + 1)]
+        found = cache.get_many(keys)
+        if len(found) != len(keys):
+            return False
+        with self.lock:
+            for key in keys:
+                for change in found[key]:
+                    self._apply(*change)
+            self.memo = {}
+            self.version = version
+        return True
+
+    def suggest(self, query):
+        """{kind: [suggestion, ...]} of the names with a word starting with the query, best sellers first."""
+        prefix = ' '.join(tokenize(query))
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return {kind: [] for kind in SUGGESTION_KINDS}
+        # the signals patch the lists in place, never search them half patched
+        with self.lock:
+            self.sync()
+            found = self.memo.get(prefix)
+            if found is None:
+                found = self.memo[prefix] = self._search(prefix)
+                if len(self.memo) > MAX_MEMOIZED_QUERIES:
+                    self.memo = {prefix: found}
+        return found
+
+    def _search(self, prefix):
+        keys, suggestions = self.keys, self.suggestions
+        matches = set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            matches.add(keys[position][1:])
+            position += 1
+        found = {kind: [] for kind in SUGGESTION_KINDS}
+        for match in matches:
+            suggestion = suggestions.get(match)
+            if suggestion:
+                found[suggestion.kind].append(suggestion)
+        for kind, kind_suggestions in found.items():
+            kind_suggestions.sort(key=lambda suggestion: (-suggestion.sales, suggestion.name))
+            del kind_suggestions[SUGGESTION_LIMITS[kind]:]
+        return found
+
+    def replace(self, kind, pk, suggestion=None):
+        """
+        Swap the suggestion of (kind, pk) for a new one, or drop it, and tell the other processes.
+        Saves that leave the name, url and sales as they were change nothing and announce nothing;
+        a process that hasn't built its index can't tell and always announces.
+        """
+        with self.lock:
+            if self.keys is not None:
+                if self.suggestions.get((kind, pk)) == suggestion:
+                    return
+                self._apply('replace', kind, pk, suggestion)
+                self.memo = {}
+            self.announce_change([('replace', kind, pk, suggestion)])
+
+    def update_sales(self, sales):
+        """Set the sales of {(kind, pk): sales} on the suggestions in place and tell the other processes."""
+        with self.lock:
+            if self.keys is not None:
+                sales = {
+                    (kind, pk): value for (kind, pk), value in sales.items()
+                    if (kind, pk) in self.suggestions and self.suggestions[kind, pk].sales != value
+                }
+                for (kind, pk), value in sales.items():
+                    self._apply('sales', kind, pk, value)
+                self.memo = {}
+            if sales:
+                self.announce_change([('sales', kind, pk, value) for (kind, pk), value in sales.items()])
+
+    def _apply(self, change, kind, pk, value):
+        """Patch one change into the lists, replaying the same change again leaves them as they are."""
+        old = self.suggestions.get((kind, pk))
+        if change == 'sales':
+            if old:
+                self.suggestions[kind, pk] = old._replace(sales=value)
+            return
+        self.suggestions.pop((kind, pk), None)
+        if old:
+            for key in old.keys:
+                position = bisect_left(self.keys, (key, kind, pk))
+                if position < len(self.keys) and self.keys[position] == (key, kind, pk):
+                    del self.keys[position]
+        if value:
+            self.suggestions[kind, pk] = value
+            for key in value.keys:
+                insort(self.keys, (key, kind, pk))
+
+    def announce_change(self, changes):
+        try:
+            version = cache.incr(SUGGEST_VERSION_KEY)
+        except ValueError:
+            version = get_suggest_version()
+        else:
+            cache.set(SUGGEST_CHANGES_KEY.format(version), changes, SUGGEST_CHANGES_TIMEOUT)
+        # nobody else changed the catalog in between, this index is still current
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+
+suggestion_index = SuggestionIndex()
+
+
+def suggest(query):
+    return suggestion_index.suggest(query)
+
+
+def refresh_suggestion_sales(product_ids):
+    """After total_sell of the products changed without signals, move them and their brands and categories."""
+    sales = {}
+    brand_ids, category_ids = set(), set()
+    for pk, total_sell, brand_id, category_id in (Product.objects.active().filter(pk__in=product_ids)
+                                                  .values_list('pk', 'total_sell', 'brand', 'category')):
+        sales['products', pk] = total_sell
+        brand_ids.add(brand_id)
+        category_ids.add(category_id)
+    for pk, value in Brand.objects.filter(pk__in=brand_ids).annotate(
+            sales=_active_sales('brand_products')).values_list('pk', 'sales'):
+        sales['brands', pk] = value
+    for pk, value in Category.objects.filter(pk__in=category_ids).annotate(
+            sales=_active_sales('category_products')).values_list('pk', 'sales'):
+        sales['categories', pk] = value
+    suggestion_index.update_sales(sales)
+
+
+def invalidate_suggestions():
+    """After bulk writes that send no signals, every process rebuilds its index on its next sync."""
+    with suggestion_index.lock:
+        suggestion_index.keys = None
+    try:
+        cache.incr(SUGGEST_VERSION_KEY)
+    except ValueError:
+        get_suggest_version()
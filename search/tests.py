@@ -0,0 +1,172 @@
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.shortcuts import reverse
+
+from categories.models import Category, Brand
+from products.models import Product
+from products.services.sales_counters import flush_sales_counters, record_sales_counts
+from .models import SearchEntry
+from .normalizer import normalize, tokenize
+from .suggestions import (
+    SUGGEST_SYNC_INTERVAL,
+    SUGGEST_VERSION_KEY,
+    SuggestionIndex,
+    get_suggest_version,
+    invalidate_suggestions,
+    suggest,
+    suggestion_index,
+)
+
+
+class TestNormalizer(TestCase):
+    def test_arabic_letters(self):
+        self.assertEqual(normalize('كيف'), normalize('کیف'))
+
+    def test_zwnj(self):
+        self.assertEqual(tokenize('لپ\u200cتاپ'), ['لپتاپ'])
+
+    def test_digits(self):
+        self.assertEqual(tokenize('گلکسی ۱۲ ٣'), ['گلکسی', '12', '3'])
+
+    def test_case_insensitive(self):
+        self.assertEqual(tokenize('Galaxy S24'), ['galaxy', 's24'])
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='test category', image='test.jpg')
+        self.brand = Brand.objects.create(name='samsung')
+        self.phone = Product.objects.create(
+            category=self.category,
+            brand=self.brand,
+            name='گوشی گلکسی',
+            short_description='گوشی هوشمند',
+            description='صفحه نمایش بزرگ',
+            price=100,
+        )
+        self.case = Product.objects.create(
+            category=self.category,
+            name='قاب گوشی',
+            short_description='قاب محافظ',
+            description='مناسب گوشی گلکسی',
+            price=10,
+        )
+
+    def test_product_indexed_on_save(self):
+        self.assertTrue(SearchEntry.objects.filter(product=self.phone, term='گلکسی').exists())
+
+    def test_search_matches_all_terms(self):
+        result = list(Product.objects.search('قاب گوشی'))
+        self.assertEqual(result, [self.case])
+
+    def test_search_prefix(self):
+        self.assertIn(self.phone, Product.objects.search('گلک'))
+
+    def test_search_ranks_name_above_description(self):
+        result = list(Product.objects.search('گلکسی'))
+        self.assertEqual(result, [self.phone, self.case])
+
+    def test_search_arabic_input(self):
+        self.assertIn(self.phone, Product.objects.search('گوشي'))
+
+    def test_search_excludes_inactive(self):
+        self.phone.is_active = False
+        self.phone.save()
+        self.assertNotIn(self.phone, Product.objects.search('گلکسی'))
+
+    def test_brand_rename_reindexes_products(self):
+        self.brand.name = 'apple'
+        self.brand.save()
+        self.assertIn(self.phone, Product.objects.search('apple'))
+        self.assertNotIn(self.phone, Product.objects.search('samsung'))
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertIn(self.phone, Product.objects.search('samsung'))
+
+    def test_product_list_view_search(self):
+        response = self.client.get(reverse('product-list'), {'q': 'قاب'})
+        self.assertEqual(list(response.context['object_list']), [self.case])
+
+
+class TestSuggestions(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_suggestions()
+        self.category = Category.objects.create(name='گوشی موبایل', image='test.jpg')
+        self.brand = Brand.objects.create(name='samsung')
+        self.phone = Product.objects.create(
+            category=self.category, brand=self.brand, name='گوشی گلکسی', price=100, total_sell=5)
+        self.case = Product.objects.create(
+            category=self.category, name='قاب گوشی', price=10, total_sell=50)
+
+    def names(self, query, kind='products'):
+        return [suggestion.name for suggestion in suggest(query)[kind]]
+
+    def test_prefix_of_any_word_ranked_by_sales(self):
+        self.assertEqual(self.names('گو'), ['قاب گوشی', 'گوشی گلکسی'])
+        self.assertEqual(self.names('گوشي گل'), ['گوشی گلکسی'])
+        self.assertEqual(self.names('SAM', 'brands'), ['samsung'])
+        self.assertEqual(self.names('موب', 'categories'), ['گوشی موبایل'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_lookups_skip_the_database(self):
+        suggest('گو')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(suggest('گلک')['products']), 1)
+            response = self.client.get(reverse('search-suggest'), {'q': 'قا'})
+        self.assertEqual(response.json()['products'], [{'name': 'قاب گوشی', 'url': self.case.get_absolute_url()}])
+
+    def test_catalog_signals_patch_the_index(self):
+        suggest('گو')
+        self.phone.name = 'تبلت گلکسی'
+        self.phone.save()
+        self.case.is_active = False
+        self.case.save()
+        self.brand.name = 'apple'
+        self.brand.save()
+        self.assertEqual(self.names('گو'), [])
+        self.assertEqual(self.names('تب'), ['تبلت گلکسی'])
+        self.assertEqual(self.names('app', 'brands'), ['apple'])
+        self.category.delete()
+        self.assertEqual(self.names('موب', 'categories'), [])
+        # the index followed its own changes without a rebuild
+        self.assertEqual(suggestion_index.version, get_suggest_version())
+
+    def test_unchanged_saves_announce_nothing(self):
+        suggest('گو')
+        version = get_suggest_version()
+        self.phone.description = 'new description'
+        self.phone.save()
+        self.brand.save()
+        self.assertEqual(get_suggest_version(), version)
+
+    def test_flushed_sales_rerank_the_suggestions_in_place(self):
+        self.assertEqual(self.names('گو'), ['قاب گوشی', 'گوشی گلکسی'])
+        other_process = SuggestionIndex()
+        other_process.build()
+
+        record_sales_counts({self.phone.pk: 100})
+        with mock.patch.object(SuggestionIndex, 'build') as build:
+            flush_sales_counters()
+            self.assertEqual(self.names('گو'), ['گوشی گلکسی', 'قاب گوشی'])
+            self.assertEqual(suggestion_index.suggestions['brands', self.brand.pk].sales, 105)
+            # the other process replays the announced sales instead of rebuilding
+            other_process.synced_at -= SUGGEST_SYNC_INTERVAL + 1
+            self.assertEqual([suggestion.name for suggestion in other_process.suggest('گو')['products']],
+                             ['گوشی گلکسی', 'قاب گوشی'])
+        build.assert_not_called()
+        self.assertEqual(other_process.version, get_suggest_version())
+
+    def test_other_processes_rebuild_on_sync(self):
+        suggest('گو')
+        # a product created in another process only bumps the shared version
+        Product.objects.filter(pk=self.case.pk).update(name='گوشی تاشو')
+        cache.incr(SUGGEST_VERSION_KEY)
+        suggestion_index.synced_at -= SUGGEST_SYNC_INTERVAL + 1
+        self.assertEqual(self.names('گوشی'), ['گوشی تاشو', 'گوشی گلکسی'])
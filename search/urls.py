@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('suggest/', views.suggest_view, name='search-suggest'),
+]
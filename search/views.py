@@ -0,0 +1,14 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .suggestions import suggest
+
+
+@require_GET
+def suggest_view(request):
+    """Search-as-you-type suggestions, answered from the in-process index without touching the database."""
+    found = suggest(request.GET.get('q', ''))
+    return JsonResponse({
+        kind: [{'name': suggestion.name, 'url': suggestion.url} for suggestion in suggestions]
+        for kind, suggestions in found.items()
+    })
@@ -486,15 +486,21 @@ const shopPriceSliderMin = document.querySelectorAll("#shop-price-slider-min"),
   shopPriceSliderMax = document.querySelectorAll("#shop-price-slider-max");
 
 shopPriceSlider.forEach((item) => {
+  // bounds come from the price histogram of the category, the start from the current filter
+  const sliderMin = Number(item.dataset.min || 0),
+    sliderMax = Math.max(Number(item.dataset.max || 100_000_000), sliderMin + 1);
   noUiSlider.create(item, {
     cssPrefix: "range-slider-",
-    start: [0, 100_000_000],
+    start: [
+      Number(item.dataset.startMin || sliderMin),
+      Number(item.dataset.startMax || sliderMax),
+    ],
     direction: "rtl",
     margin: 1,
     connect: true,
     range: {
-      min: 0,
-      max: 100_000_000,
+      min: sliderMin,
+      max: sliderMax,
     },
     format: {
       to: function (value) {
@@ -509,6 +515,14 @@ shopPriceSlider.forEach((item) => {
     },
   });
 
+  item.noUiSlider.on("change", function (values) {
+    const form = item.closest("form");
+    if (form && form.min_price && form.max_price) {
+      form.min_price.value = parseFloat(values[0].replace(/,/g, ""));
+      form.max_price.value = parseFloat(values[1].replace(/,/g, ""));
+    }
+  });
+
   item.noUiSlider.on("update", function (values, handle) {
     if (handle) {
       shopPriceSliderMax.forEach((price_item) => {
@@ -0,0 +1,67 @@
+// Header Search Suggestions Start
+const SUGGESTION_TITLES = {
+  products: "محصولات",
+  brands: "برندها",
+  categories: "دسته بندی ها",
+};
+
+function initializeSearchSuggestions(searchId, suggestionsId) {
+  const search = document.getElementById(searchId);
+  const container = document.getElementById(suggestionsId);
+
+  if (!search || !container) {
+    return;
+  }
+
+  const list = container.querySelector("[data-suggestions]");
+  let timer = null;
+  let controller = null;
+
+  function render(data) {
+    list.replaceChildren();
+    Object.entries(SUGGESTION_TITLES).forEach(([kind, title]) => {
+      if (!data[kind] || !data[kind].length) {
+        return;
+      }
+      const heading = document.createElement("li");
+      heading.className = "pt-2 text-sm text-text/60";
+      heading.textContent = title;
+      list.append(heading);
+      data[kind].forEach((suggestion) => {
+        const item = document.createElement("li");
+        const link = document.createElement("a");
+        link.href = suggestion.url;
+        link.className =
+          "block rounded-xl border px-4 py-2 text-text/90 hover:border-border/50";
+        link.textContent = suggestion.name;
+        item.append(link);
+        list.append(item);
+      });
+    });
+  }
+
+  search.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      const query = search.value.trim();
+      if (controller) {
+        controller.abort();
+      }
+      if (!query) {
+        list.replaceChildren();
+        return;
+      }
+      controller = new AbortController();
+      fetch(`${container.dataset.suggestUrl}?q=${encodeURIComponent(query)}`, {
+        signal: controller.signal,
+      })
+        .then((response) => response.json())
+        .then(render)
+        .catch(() => {});
+    }, 150);
+  });
+}
+
+initializeSearchSuggestions("desktopHeaderSearch", "desktopHeaderSearchSuggestions");
+initializeSearchSuggestions("mobileHeaderSearch", "mobileHeaderSearchSuggestions");
+// Header Search Suggestions End